@@ -0,0 +1,63 @@
+"""create ticket reservations table
+
+Revision ID: 3f1c2a9b7d4e
+Revises: 535ee6749e6c
+Create Date: 2026-10-18 10:00:12.418203
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2a9b7d4e"
+down_revision: str | None = "535ee6749e6c"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_check_constraint("ck_event_ticket_types_stock", "event_ticket_types", "stock >= 0")
+    op.create_table(
+        "ticket_reservations",
+        sa.Column("reservation_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("ticket_type_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("status", sa.Integer(), server_default="1", nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["ticket_type_id"], ["event_ticket_types.ticket_type_id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.user_id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("reservation_id"),
+    )
+    op.create_index(
+        "ix_ticket_reservations_user_ticket_type",
+        "ticket_reservations",
+        ["user_id", "ticket_type_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_ticket_reservations_pending_expires_at",
+        "ticket_reservations",
+        ["expires_at"],
+        unique=False,
+        postgresql_where=sa.text("status = 1"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_ticket_reservations_pending_expires_at",
+        table_name="ticket_reservations",
+        postgresql_where=sa.text("status = 1"),
+    )
+    op.drop_index("ix_ticket_reservations_user_ticket_type", table_name="ticket_reservations")
+    op.drop_table("ticket_reservations")
+    op.drop_constraint("ck_event_ticket_types_stock", "event_ticket_types", type_="check")
@@ -0,0 +1,46 @@
+"""add reservation synced quantity
+
+Revision ID: 8a4e6d21c9f0
+Revises: 3f1c2a9b7d4e
+Create Date: 2026-10-18 11:00:41.902117
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8a4e6d21c9f0"
+down_revision: str | None = "3f1c2a9b7d4e"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+SYNCED_QUANTITY_TARGET_SQL = "CASE WHEN status IN (1, 2) THEN quantity ELSE 0 END"
+
+
+def upgrade() -> None:
+    op.add_column(
+        "ticket_reservations",
+        sa.Column("synced_quantity", sa.Integer(), server_default="0", nullable=False),
+    )
+    # Reservations made so far decremented the stock column directly.
+    op.execute(f"UPDATE ticket_reservations SET synced_quantity = {SYNCED_QUANTITY_TARGET_SQL}")
+    op.create_index(
+        "ix_ticket_reservations_unsynced",
+        "ticket_reservations",
+        ["reservation_id"],
+        unique=False,
+        postgresql_where=sa.text(f"synced_quantity <> {SYNCED_QUANTITY_TARGET_SQL}"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_ticket_reservations_unsynced",
+        table_name="ticket_reservations",
+        postgresql_where=sa.text(f"synced_quantity <> {SYNCED_QUANTITY_TARGET_SQL}"),
+    )
+    op.drop_column("ticket_reservations", "synced_quantity")
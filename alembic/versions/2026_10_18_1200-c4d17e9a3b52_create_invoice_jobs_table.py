@@ -0,0 +1,55 @@
+"""create invoice jobs table
+
+Revision ID: c4d17e9a3b52
+Revises: 8a4e6d21c9f0
+Create Date: 2026-10-18 12:00:41.207315
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c4d17e9a3b52"
+down_revision: str | None = "8a4e6d21c9f0"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "invoice_jobs",
+        sa.Column("job_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("order_id", sa.String(length=50), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("status", sa.Integer(), server_default="1", nullable=False),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column(
+            "next_attempt_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False
+        ),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("result", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("job_id"),
+        sa.UniqueConstraint("order_id"),
+    )
+    op.create_index(
+        "ix_invoice_jobs_claimable_next_attempt_at",
+        "invoice_jobs",
+        ["next_attempt_at"],
+        unique=False,
+        postgresql_where=sa.text("status IN (1, 2)"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_invoice_jobs_claimable_next_attempt_at",
+        table_name="invoice_jobs",
+        postgresql_where=sa.text("status IN (1, 2)"),
+    )
+    op.drop_table("invoice_jobs")
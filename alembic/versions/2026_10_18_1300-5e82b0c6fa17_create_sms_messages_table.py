@@ -0,0 +1,57 @@
+"""create sms messages table
+
+Revision ID: 5e82b0c6fa17
+Revises: c4d17e9a3b52
+Create Date: 2026-10-18 13:00:08.731946
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5e82b0c6fa17"
+down_revision: str | None = "c4d17e9a3b52"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sms_messages",
+        sa.Column("message_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("campaign", sa.String(length=100), nullable=False),
+        sa.Column("phone", sa.String(length=20), nullable=False),
+        sa.Column("body", sa.Text(), nullable=False),
+        sa.Column("status", sa.Integer(), server_default="1", nullable=False),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column(
+            "next_attempt_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False
+        ),
+        sa.Column("provider_msgid", sa.String(length=20), nullable=True),
+        sa.Column("status_code", sa.String(length=4), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("message_id"),
+        sa.UniqueConstraint("campaign", "phone", name="uq_sms_messages_campaign_phone"),
+    )
+    op.create_index(
+        "ix_sms_messages_claimable_next_attempt_at",
+        "sms_messages",
+        ["next_attempt_at"],
+        unique=False,
+        postgresql_where=sa.text("status IN (1, 2)"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_sms_messages_claimable_next_attempt_at",
+        table_name="sms_messages",
+        postgresql_where=sa.text("status IN (1, 2)"),
+    )
+    op.drop_table("sms_messages")
@@ -0,0 +1,70 @@
+"""create orders tables
+
+Revision ID: 9b3f5d7e2a61
+Revises: 5e82b0c6fa17
+Create Date: 2026-10-18 14:00:27.519064
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9b3f5d7e2a61"
+down_revision: str | None = "5e82b0c6fa17"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "orders",
+        sa.Column("order_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("order_no", sa.String(length=32), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("reservation_id", sa.Integer(), nullable=False),
+        sa.Column("amount", sa.Integer(), nullable=False),
+        sa.Column("status", sa.Integer(), server_default="1", nullable=False),
+        sa.Column("buyer_email", sa.String(length=255), nullable=True),
+        sa.Column("idempotency_key", sa.String(length=64), nullable=True),
+        sa.Column("request_fingerprint", sa.String(length=64), nullable=True),
+        sa.Column("payment_url", sa.Text(), nullable=True),
+        sa.Column("provider_transaction_id", sa.String(length=64), nullable=True),
+        sa.Column("paid_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["reservation_id"], ["ticket_reservations.reservation_id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.user_id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("order_id"),
+        sa.UniqueConstraint("order_no"),
+        sa.UniqueConstraint("provider_transaction_id"),
+        sa.UniqueConstraint("reservation_id"),
+        sa.UniqueConstraint("user_id", "idempotency_key", name="uq_orders_user_idempotency_key"),
+    )
+    op.create_table(
+        "payment_notifications",
+        sa.Column("notification_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("provider", sa.String(length=20), nullable=False),
+        sa.Column("transaction_id", sa.String(length=64), nullable=False),
+        sa.Column("status_code", sa.String(length=10), nullable=False),
+        sa.Column("order_no", sa.String(length=32), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("notification_id"),
+        sa.UniqueConstraint(
+            "provider",
+            "transaction_id",
+            "status_code",
+            name="uq_payment_notifications_provider_transaction_status",
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("payment_notifications")
+    op.drop_table("orders")
@@ -0,0 +1,49 @@
+"""add events keyset indexes
+
+Revision ID: d62a8f1e4b93
+Revises: 9b3f5d7e2a61
+Create Date: 2026-10-18 15:00:12.604381
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d62a8f1e4b93"
+down_revision: str | None = "9b3f5d7e2a61"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_events_created_at_event_id",
+        "events",
+        ["created_at", "event_id"],
+        unique=False,
+        postgresql_where=sa.text("is_deleted IS false"),
+    )
+    op.create_index(
+        "ix_events_updated_at_event_id",
+        "events",
+        ["updated_at", "event_id"],
+        unique=False,
+        postgresql_where=sa.text("is_deleted IS false"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_events_updated_at_event_id",
+        table_name="events",
+        postgresql_where=sa.text("is_deleted IS false"),
+    )
+    op.drop_index(
+        "ix_events_created_at_event_id",
+        table_name="events",
+        postgresql_where=sa.text("is_deleted IS false"),
+    )
@@ -0,0 +1,73 @@
+"""add catalogue indexes
+
+Revision ID: 7c5e9a2d0f48
+Revises: d62a8f1e4b93
+Create Date: 2026-10-18 16:00:45.218730
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c5e9a2d0f48"
+down_revision: str | None = "d62a8f1e4b93"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+NOT_DELETED = "is_deleted IS false"
+ON_SALE = "on_sale IS true AND is_deleted IS false"
+
+
+def upgrade() -> None:
+    # The catalogue loads pictures and ticket types by event_id, and deleting an event cascades
+    # through them: without these every page and every delete scans both tables.
+    op.create_index(
+        "ix_event_pictures_event_id_picture_order",
+        "event_pictures",
+        ["event_id", "picture_order"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_event_ticket_types_event_id", "event_ticket_types", ["event_id"], unique=False
+    )
+    op.create_index(
+        "ix_events_category_created_at_event_id",
+        "events",
+        ["category", "created_at", "event_id"],
+        unique=False,
+        postgresql_where=sa.text(NOT_DELETED),
+    )
+    op.create_index(
+        "ix_events_category_updated_at_event_id",
+        "events",
+        ["category", "updated_at", "event_id"],
+        unique=False,
+        postgresql_where=sa.text(NOT_DELETED),
+    )
+    op.create_index(
+        "ix_events_on_sale",
+        "events",
+        ["event_id"],
+        unique=False,
+        postgresql_where=sa.text(ON_SALE),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_events_on_sale", table_name="events", postgresql_where=sa.text(ON_SALE))
+    op.drop_index(
+        "ix_events_category_updated_at_event_id",
+        table_name="events",
+        postgresql_where=sa.text(NOT_DELETED),
+    )
+    op.drop_index(
+        "ix_events_category_created_at_event_id",
+        table_name="events",
+        postgresql_where=sa.text(NOT_DELETED),
+    )
+    op.drop_index("ix_event_ticket_types_event_id", table_name="event_ticket_types")
+    op.drop_index("ix_event_pictures_event_id_picture_order", table_name="event_pictures")
@@ -0,0 +1,66 @@
+"""add events search vector
+
+Revision ID: 4a7d3c9e1b25
+Revises: 7c5e9a2d0f48
+Create Date: 2026-10-18 17:00:08.447192
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4a7d3c9e1b25"
+down_revision: str | None = "7c5e9a2d0f48"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+EVENT_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', event_name), 'A') || "
+    "setweight(to_tsvector('simple', organizer || ' ' || location), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "events",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(EVENT_SEARCH_VECTOR_SQL, persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_events_search_vector",
+        "events",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    # Fuzzy matching of misspelled names, only where the server ships pg_trgm
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                CREATE INDEX IF NOT EXISTS ix_events_event_name_trgm
+                    ON events USING gin (event_name gin_trgm_ops)
+                    WHERE is_deleted IS false;
+            END IF;
+        END
+        $$;
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_events_event_name_trgm")
+    op.drop_index("ix_events_search_vector", table_name="events", postgresql_using="gin")
+    op.drop_column("events", "search_vector")
@@ -0,0 +1,27 @@
+"""add orders payment requested at
+
+Revision ID: e3b7a1c94d52
+Revises: 4a7d3c9e1b25
+Create Date: 2026-10-18 18:00:41.302856
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e3b7a1c94d52"
+down_revision: str | None = "4a7d3c9e1b25"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column("orders", sa.Column("payment_requested_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("orders", "payment_requested_at")
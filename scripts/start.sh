@@ -8,6 +8,11 @@ alembic upgrade head
 alembic check
 echo "Database migrations are successful"
 
+# Metrics of every worker are collected here, stale files of a previous run would be added up
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 # Start the application
 echo "Starting the application..."
 exec uvicorn src.main:app --host 0.0.0.0 --port 8000
\ No newline at end of file
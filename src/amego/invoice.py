@@ -5,13 +5,24 @@ import urllib.parse
 import httpx
 
 from src.amego.schemas import CreateAmegoInvoiceRequest
+from src.http_client import get_http_client
+from src.resilience import ProviderPolicy, get_provider_policy
 
 
 class InvoiceAPIClient:
-    def __init__(self, api_base_url: str, api_key: str, api_tax_id: str):
+    def __init__(
+        self,
+        api_base_url: str,
+        api_key: str,
+        api_tax_id: str,
+        http_client: httpx.AsyncClient | None = None,
+        policy: ProviderPolicy | None = None,
+    ):
         self.api_base_url = api_base_url
         self.api_key = api_key
         self.api_tax_id = api_tax_id
+        self.http_client = http_client
+        self.policy = policy
 
     def generate_signature(self, invoice_data: CreateAmegoInvoiceRequest, timestamp: int) -> str:
         """生成請求簽名"""
@@ -39,6 +50,9 @@ class InvoiceAPIClient:
         payload = urllib.parse.urlencode(post_data, doseq=True)
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url=crate_invoice_url, headers=headers, data=payload)
-            return response.json()
+        client = self.http_client or get_http_client("amego")
+        policy = self.policy or get_provider_policy("amego")
+        response = await policy.request(
+            client, "POST", crate_invoice_url, headers=headers, content=payload
+        )
+        return response.json()
@@ -0,0 +1,149 @@
+import asyncio
+import random
+from datetime import timedelta
+
+from sqlalchemy import Row, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from src.amego.invoice import InvoiceAPIClient
+from src.amego.schemas import CreateAmegoInvoiceRequest
+from src.config import settings
+from src.constants import CLAIMABLE_INVOICE_JOB_STATUSES, InvoiceJobStatus
+from src.logger import logger
+from src.models import InvoiceJob
+
+
+class InvoiceRejected(Exception):
+    """Amego answered with a non-zero code, retrying the same payload won't help."""
+
+
+async def enqueue_invoice(session: AsyncSession, invoice: CreateAmegoInvoiceRequest) -> bool:
+    """Queue an invoice to be issued in the background by `run_invoice_worker`.
+
+    Doesn't commit: call it in the transaction that commits the order, so the job exists if and
+    only if the order does. `OrderId` is the idempotency key, queueing the same order again is a
+    no-op. Returns whether a new job was created.
+    """
+    query = (
+        insert(InvoiceJob)
+        .values(order_id=invoice.OrderId, payload=invoice.model_dump(mode="json"))
+        .on_conflict_do_nothing(index_elements=[InvoiceJob.order_id])
+        .returning(InvoiceJob.job_id)
+    )
+
+    return (await session.execute(query)).scalar() is not None
+
+
+async def claim_invoice_jobs(session: AsyncSession, batch_size: int) -> list[Row]:
+    """Take up to `batch_size` due jobs and lease them for `AMEGO_INVOICE_LEASE_SECONDS`.
+
+    `FOR UPDATE SKIP LOCKED` lets every worker claim concurrently without getting the same job.
+    A job whose worker died mid-call becomes claimable again once its lease runs out.
+    """
+    due = (
+        select(InvoiceJob.job_id)
+        .where(
+            InvoiceJob.status.in_(CLAIMABLE_INVOICE_JOB_STATUSES),
+            InvoiceJob.next_attempt_at <= func.now(),
+        )
+        .order_by(InvoiceJob.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .cte("due")
+    )
+
+    claim_query = (
+        update(InvoiceJob)
+        .where(InvoiceJob.job_id == due.c.job_id)
+        .values(
+            status=InvoiceJobStatus.PROCESSING.value,
+            attempts=InvoiceJob.attempts + 1,
+            next_attempt_at=func.now() + timedelta(seconds=settings.AMEGO_INVOICE_LEASE_SECONDS),
+        )
+        .returning(InvoiceJob.job_id, InvoiceJob.order_id, InvoiceJob.payload, InvoiceJob.attempts)
+        .execution_options(synchronize_session=False)
+    )
+
+    rows = (await session.execute(claim_query)).all()
+    await session.commit()
+
+    return list(rows)
+
+
+def get_retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, so failed jobs don't all come back at once."""
+    delay = min(
+        settings.AMEGO_INVOICE_RETRY_MAX_SECONDS,
+        settings.AMEGO_INVOICE_RETRY_BASE_SECONDS * 2 ** (attempts - 1),
+    )
+    return delay * random.uniform(0.5, 1)
+
+
+async def issue_invoice(invoice_client: InvoiceAPIClient, job: Row) -> dict:
+    result = await invoice_client.create_invoice(CreateAmegoInvoiceRequest(**job.payload))
+
+    if result.get("code") != 0:
+        raise InvoiceRejected(f"code: {result.get('code')}, msg: {result.get('msg')}")
+
+    return result
+
+
+async def process_invoice_jobs(
+    session: AsyncSession,
+    invoice_client: InvoiceAPIClient,
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+) -> int:
+    """Claim a batch of jobs, issue them with at most `concurrency` calls to Amego in flight and
+    record every outcome in one transaction.
+
+    Network errors and unreadable responses are retried with backoff until
+    `AMEGO_INVOICE_MAX_ATTEMPTS`, invoices Amego rejects are dead-lettered right away. If an
+    attempt reached Amego but its outcome was lost, the retry is refused by Amego as a duplicate
+    `OrderId` and dead-lettered instead of issuing a second invoice. Returns the number of jobs
+    claimed.
+    """
+    batch_size = batch_size or settings.AMEGO_INVOICE_WORKER_BATCH_SIZE
+    semaphore = asyncio.Semaphore(concurrency or settings.AMEGO_INVOICE_WORKER_CONCURRENCY)
+
+    jobs = await claim_invoice_jobs(session=session, batch_size=batch_size)
+
+    async def run(job: Row):
+        async with semaphore:
+            try:
+                return await issue_invoice(invoice_client, job)
+            except Exception as exc:
+                return exc
+
+    outcomes = await asyncio.gather(*(run(job) for job in jobs))
+
+    for job, outcome in zip(jobs, outcomes, strict=True):
+        values: dict = {"result": None, "last_error": None}
+
+        if not isinstance(outcome, Exception):
+            values.update(status=InvoiceJobStatus.ISSUED.value, result=outcome)
+        elif (
+            isinstance(outcome, InvoiceRejected)
+            or job.attempts >= settings.AMEGO_INVOICE_MAX_ATTEMPTS
+        ):
+            values.update(status=InvoiceJobStatus.DEAD.value, last_error=repr(outcome))
+            logger.error(f"[Invoice] order {job.order_id} dead-lettered, error: {outcome!r}")
+        else:
+            values.update(
+                status=InvoiceJobStatus.PENDING.value,
+                last_error=repr(outcome),
+                next_attempt_at=func.now() + timedelta(seconds=get_retry_delay(job.attempts)),
+            )
+
+        # Matching on attempts skips jobs another worker reclaimed after the lease ran out
+        await session.execute(
+            update(InvoiceJob)
+            .where(InvoiceJob.job_id == job.job_id, InvoiceJob.attempts == job.attempts)
+            .values(**values)
+        )
+
+    await session.commit()
+
+    return len(jobs)
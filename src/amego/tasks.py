@@ -0,0 +1,26 @@
+import asyncio
+
+from src.amego.invoice import InvoiceAPIClient
+from src.amego.service import process_invoice_jobs
+from src.config import settings
+from src.database import AsyncSessionLocal
+from src.logger import logger
+
+
+async def run_invoice_worker(invoice_client: InvoiceAPIClient, interval: float | None = None):
+    """Background loop that issues the queued Amego invoices, off the checkout request path."""
+    interval = interval or settings.AMEGO_INVOICE_WORKER_INTERVAL_SECONDS
+
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                while (
+                    await process_invoice_jobs(session=session, invoice_client=invoice_client)
+                    == settings.AMEGO_INVOICE_WORKER_BATCH_SIZE
+                ):
+                    pass
+
+        except Exception as exc:
+            logger.exception(exc)
+
+        await asyncio.sleep(interval)
@@ -4,16 +4,46 @@ from fastapi import Depends, HTTPException, status
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.auth.service import get_user_by_account
+from src.auth.service import PrincipalCache, get_principal
+from src.auth.token import TokenVerifier, create_token_verifier
 from src.auth.utils import oauth2_scheme
+from src.cache import register_local_cache
 from src.config import settings
-from src.database import get_db_session
+from src.constants import QUEUE_TICKET_TYPE, Role
+from src.database import get_db_session, get_redis_client
+from src.middleware import bind_request_state
 from src.models import User
 
+principal_cache: PrincipalCache | None = None
+token_verifier: TokenVerifier | None = None
+
+
+def get_token_verifier() -> TokenVerifier:
+    global token_verifier
+
+    if token_verifier is None:
+        token_verifier = create_token_verifier()
+
+    return token_verifier
+
+
+async def get_principal_cache() -> PrincipalCache:
+    global principal_cache
+
+    if principal_cache is None:
+        principal_cache = PrincipalCache(
+            await get_redis_client(), store_in_redis=settings.PRINCIPAL_CACHE_REDIS_ENABLED
+        )
+        register_local_cache(PrincipalCache.namespace, principal_cache.local)
+
+    return principal_cache
+
 
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     session: Annotated[AsyncSession, Depends(get_db_session)],
+    principal_cache: Annotated[PrincipalCache, Depends(get_principal_cache)],
+    token_verifier: Annotated[TokenVerifier, Depends(get_token_verifier)],
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -21,17 +51,23 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = await token_verifier.verify(token)
 
         account: str = payload.get("sub")
 
-        if account is None:
+        # Queue tickets may be signed with the same key but never grant access
+        if account is None or payload.get("typ") == QUEUE_TICKET_TYPE:
             raise credentials_exception
 
-        user = get_user_by_account(session=session, account=account)
+        user = await get_principal(
+            session=session, account=account, principal_cache=principal_cache
+        )
 
         if user is None:
             raise credentials_exception
+
+        # Picked up by the logs of this request
+        bind_request_state(user_id=user.user_id)
         return user
 
     except jwt.ExpiredSignatureError as e:
@@ -41,6 +77,8 @@ async def get_current_user(
         ) from e
     except JWTError as e:
         raise credentials_exception from e
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -54,3 +92,11 @@ async def get_current_active_user(
     if current_user.is_disabled:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
     return current_user
+
+
+async def get_current_admin_user(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+):
+    if current_user.role != Role.ADMIN.value:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    return current_user
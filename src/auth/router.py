@@ -11,16 +11,20 @@ from fastapi import (
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.auth.schemas import CreateUserRequest, Token
+from src.auth.dependencies import get_current_admin_user, get_principal_cache
+from src.auth.schemas import CreateUserRequest, Token, UpdateUserAccessRequest, UserAccess
 from src.auth.service import (
+    PrincipalCache,
     authenticate_user,
     create_access_token,
     create_user,
     get_user_by_account,
+    update_user_access,
 )
 from src.config import settings
 from src.database import get_db_session
 from src.logger import logger
+from src.models import User
 
 router = APIRouter(
     tags=["user"],
@@ -47,12 +51,14 @@ async def register(
 
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
-        access_token = create_access_token(
+        access_token = await create_access_token(
             data={"sub": new_user.account}, expires_delta=access_token_expires
         )
 
         return Token(access_token=access_token)
 
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as exc:
         logger.exception(exc)
         raise HTTPException(
@@ -70,23 +76,45 @@ async def login(
     session: Annotated[AsyncSession, Depends(get_db_session)],
 ):
     try:
-        user = authenticate_user(
+        user = await authenticate_user(
             session=session, account=form_data.username, password=form_data.password
         )
 
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
-        access_token = create_access_token(
+        access_token = await create_access_token(
             data={"sub": user.account}, expires_delta=access_token_expires
         )
         return Token(access_token=access_token)
 
     except HTTPException as http_exc:
         logger.exception(http_exc)
-        raise HTTPException(status_code=http_exc.status_code, detail=http_exc.detail) from http_exc
+        raise HTTPException(
+            status_code=http_exc.status_code, detail=http_exc.detail, headers=http_exc.headers
+        ) from http_exc
     except Exception as e:
         logger.exception(e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"login error: {str(e)}",
         ) from e
+
+
+@router.patch(
+    "/v1/users/{user_id}/access",
+    response_model=UserAccess,
+)
+async def update_access(
+    user_id: int,
+    access: Annotated[UpdateUserAccessRequest, Body()],
+    _: Annotated[User, Depends(get_current_admin_user)],
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    principal_cache: Annotated[PrincipalCache, Depends(get_principal_cache)],
+):
+    return await update_user_access(
+        session=session,
+        user_id=user_id,
+        principal_cache=principal_cache,
+        is_disabled=access.is_disabled,
+        role=access.role,
+    )
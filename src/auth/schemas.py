@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
 
@@ -22,3 +24,17 @@ class User(BaseModel):
     password: str
     is_disabled: bool
     role: str
+
+
+class UpdateUserAccessRequest(BaseModel):
+    is_disabled: bool | None = None
+    role: Literal[1, 2, 3] | None = None  # Role
+
+
+class UserAccess(BaseModel):
+    user_id: int
+    account: str
+    is_disabled: bool
+    role: int
+
+    model_config = {"from_attributes": True}
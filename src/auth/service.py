@@ -1,15 +1,24 @@
 from datetime import UTC, datetime, timedelta
 
+import orjson
 from fastapi import HTTPException, status
-from jose import jwt
-from sqlalchemy import insert, select
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.auth.schemas import CreateUserRequest
+from src.auth.token import get_jwt_backend, get_signing_key
 from src.auth.utils import get_password_hash, verify_password
+from src.cache import TTLCache, publish_invalidation
 from src.config import settings
+from src.logger import logger
+from src.metrics import CACHE_REQUESTS
 from src.models import User
 
+# The password hash is deliberately left out of the cache
+PRINCIPAL_FIELDS = ("user_id", "account", "name", "phone", "is_disabled", "role")
+
 
 async def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -18,7 +27,11 @@ async def create_access_token(data: dict, expires_delta: timedelta | None = None
     else:
         expire = datetime.now(UTC) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    headers = {"kid": settings.JWT_KEY_ID} if settings.JWT_KEY_ID else None
+    backend = get_jwt_backend()
+    encoded_jwt = backend.encode(
+        to_encode, get_signing_key(backend), algorithm=settings.ALGORITHM, headers=headers
+    )
     return encoded_jwt
 
 
@@ -68,3 +81,131 @@ async def authenticate_user(session: AsyncSession, account: str, password: str)
         )
 
     return db_user
+
+
+class PrincipalCache:
+    """Users resolved from access tokens, keyed by account.
+
+    Lookups go to an in-process TTL LRU first and then, with `store_in_redis`, to Redis, which
+    is shared by every worker. Entries are dropped through `invalidate` whenever a user is
+    disabled or changes role, which also tells the other workers over `redis_client` pub/sub to
+    drop their in-process copy, whether or not principals are stored in Redis; a worker that
+    misses the message keeps it for at most PRINCIPAL_CACHE_TTL_SECONDS.
+    """
+
+    namespace = "principal"
+
+    def __init__(self, redis_client: Redis | None = None, store_in_redis: bool = True):
+        self.redis_client = redis_client
+        self.store_in_redis = redis_client is not None and store_in_redis
+        self.local = TTLCache(
+            maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+            ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+            name=self.namespace,
+        )
+        self.redis_hits = 0
+        self.redis_misses = 0
+
+    @staticmethod
+    def get_key(account: str) -> str:
+        return f"principal:{account}"
+
+    async def get(self, account: str) -> User | None:
+        data = self.local.get(account)
+
+        if data is None and self.store_in_redis:
+            try:
+                raw = await self.redis_client.get(self.get_key(account))
+            except RedisError as e:
+                logger.warning(f"Principal cache is unavailable, error: {e}")
+                raw = None
+
+            if raw is None:
+                self.redis_misses += 1
+                CACHE_REQUESTS.labels("principal", "redis", "miss").inc()
+            else:
+                self.redis_hits += 1
+                CACHE_REQUESTS.labels("principal", "redis", "hit").inc()
+                data = orjson.loads(raw)
+                self.local.set(account, data)
+
+        # 回傳未綁定 session 的 User, 只帶 PRINCIPAL_FIELDS
+        return None if data is None else User(**data)
+
+    async def set(self, user: User) -> None:
+        data = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+        self.local.set(user.account, data)
+
+        if self.store_in_redis:
+            try:
+                await self.redis_client.set(
+                    self.get_key(user.account),
+                    orjson.dumps(data),
+                    ex=settings.PRINCIPAL_CACHE_REDIS_TTL_SECONDS,
+                )
+            except RedisError as e:
+                logger.warning(f"Principal cache is unavailable, error: {e}")
+
+    async def invalidate(self, account: str) -> None:
+        self.local.delete(account)
+
+        if self.redis_client is not None:
+            try:
+                if self.store_in_redis:
+                    await self.redis_client.delete(self.get_key(account))
+                await publish_invalidation(self.redis_client, self.namespace, account)
+            except RedisError as e:
+                logger.warning(f"Failed to invalidate principal {account}, error: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "local": self.local.get_stats(),
+            "redis_hits": self.redis_hits,
+            "redis_misses": self.redis_misses,
+        }
+
+
+async def get_principal(
+    session: AsyncSession, account: str, principal_cache: PrincipalCache
+) -> User | None:
+    """The user behind an access token, from the cache when possible."""
+    user = await principal_cache.get(account)
+
+    if user is None:
+        user = await get_user_by_account(session=session, account=account)
+
+        if user is not None:
+            await principal_cache.set(user)
+
+    return user
+
+
+async def update_user_access(
+    session: AsyncSession,
+    user_id: int,
+    principal_cache: PrincipalCache,
+    is_disabled: bool | None = None,
+    role: int | None = None,
+) -> User:
+    """Disable/enable a user or change their role, and drop them from the principal cache."""
+    values = {}
+    if is_disabled is not None:
+        values["is_disabled"] = is_disabled
+    if role is not None:
+        values["role"] = role
+
+    user = await session.get(User, user_id)
+
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    if values:
+        update_query = update(User).where(User.user_id == user_id).values(values).returning(User)
+        user = (await session.execute(update_query)).scalars().one()
+
+        await session.commit()
+
+    # After commit, so later misses read the new row
+    await principal_cache.invalidate(user.account)
+
+    return user
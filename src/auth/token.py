@@ -0,0 +1,210 @@
+import hashlib
+import time
+from typing import Any
+
+import httpx
+from jose import ExpiredSignatureError, JWTError, jwk, jwt
+
+from src.cache import TTLCache
+from src.config import settings
+from src.logger import logger
+
+
+class JoseBackend:
+    """python-jose, the default backend."""
+
+    def prepare_key(self, key_data: str | dict, algorithm: str) -> Any:
+        return jwk.construct(key_data, algorithm)
+
+    def encode(self, claims: dict, key: Any, algorithm: str, headers: dict | None = None) -> str:
+        return jwt.encode(claims, key, algorithm=algorithm, headers=headers)
+
+    def decode(self, token: str, key: Any, algorithms: list[str]) -> dict:
+        return jwt.decode(token, key, algorithms=algorithms)
+
+    def get_unverified_header(self, token: str) -> dict:
+        return jwt.get_unverified_header(token)
+
+
+class PyJWTBackend:
+    """PyJWT, noticeably faster than python-jose. Needs `pip install pyjwt[crypto]`.
+
+    Errors are translated to the python-jose ones, so callers only handle one set.
+    """
+
+    def __init__(self):
+        try:
+            import jwt as pyjwt
+        except ImportError as e:
+            raise RuntimeError("JWT_BACKEND=pyjwt requires the PyJWT package") from e
+
+        self.pyjwt = pyjwt
+
+    def prepare_key(self, key_data: str | dict, algorithm: str) -> Any:
+        if isinstance(key_data, dict):
+            return self.pyjwt.PyJWK(key_data, algorithm).key
+
+        return self.pyjwt.algorithms.get_default_algorithms()[algorithm].prepare_key(key_data)
+
+    def encode(self, claims: dict, key: Any, algorithm: str, headers: dict | None = None) -> str:
+        return self.pyjwt.encode(claims, key, algorithm=algorithm, headers=headers)
+
+    def decode(self, token: str, key: Any, algorithms: list[str]) -> dict:
+        try:
+            return self.pyjwt.decode(token, key, algorithms=algorithms)
+        except self.pyjwt.ExpiredSignatureError as e:
+            raise ExpiredSignatureError(str(e)) from e
+        except self.pyjwt.InvalidTokenError as e:
+            raise JWTError(str(e)) from e
+
+    def get_unverified_header(self, token: str) -> dict:
+        try:
+            return self.pyjwt.get_unverified_header(token)
+        except self.pyjwt.InvalidTokenError as e:
+            raise JWTError(str(e)) from e
+
+
+JWT_BACKENDS = {"jose": JoseBackend, "pyjwt": PyJWTBackend}
+
+
+class JWKSKeySet:
+    """Public keys published at a JWKS endpoint, looked up by `kid`.
+
+    The set is fetched once and kept for `cache_seconds`; a token signed with an unknown `kid`
+    (key rotation) triggers a refetch, at most once every `min_refresh_seconds`.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        backend: Any,
+        cache_seconds: float = 3600,
+        min_refresh_seconds: float = 30,
+        http_client: httpx.AsyncClient | None = None,
+    ):
+        self.url = url
+        self.backend = backend
+        self.cache_seconds = cache_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self.http_client = http_client
+        self.keys: dict[str, Any] = {}
+        self.fetched_at = float("-inf")
+        self.fetch_count = 0
+
+    async def fetch(self) -> None:
+        if self.http_client is None:
+            async with httpx.AsyncClient(timeout=10) as http_client:
+                resp = await http_client.get(self.url)
+        else:
+            resp = await self.http_client.get(self.url)
+        resp.raise_for_status()
+
+        keys = {}
+        for key_data in resp.json()["keys"]:
+            if key_data.get("use", "sig") == "sig" and "alg" in key_data:
+                keys[key_data.get("kid")] = self.backend.prepare_key(key_data, key_data["alg"])
+
+        self.keys = keys
+        self.fetched_at = time.monotonic()
+        self.fetch_count += 1
+
+    async def get_key(self, kid: str | None) -> Any:
+        age = time.monotonic() - self.fetched_at
+
+        if age > self.cache_seconds or (kid not in self.keys and age > self.min_refresh_seconds):
+            try:
+                await self.fetch()
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                # Keep verifying with the keys we already have
+                logger.warning(f"Failed to fetch JWKS from {self.url}, error: {e}")
+
+        key = self.keys.get(kid)
+
+        if key is None:
+            raise JWTError(f"Unknown signing key: {kid}")
+
+        return key
+
+
+class TokenVerifier:
+    """Verifies access tokens and memoizes the claims of every valid token until it expires.
+
+    A token is an immutable string, so once its signature and claims have been checked the
+    result stays valid until `exp`; later requests with the same token are a dict lookup on its
+    SHA-256 instead of a signature check. Only successful verifications are cached.
+    """
+
+    def __init__(
+        self,
+        backend: Any,
+        algorithm: str,
+        key: Any = None,
+        key_set: JWKSKeySet | None = None,
+        cache_size: int = 100000,
+    ):
+        self.backend = backend
+        self.algorithms = [algorithm]
+        self.key = key
+        self.key_set = key_set
+        self.claims_cache = TTLCache(maxsize=cache_size, ttl=0, name="token_claims")
+
+    async def verify(self, token: str) -> dict:
+        token_hash = hashlib.sha256(token.encode()).digest()
+
+        claims = self.claims_cache.get(token_hash)
+        if claims is not None:
+            return claims
+
+        if self.key_set is not None:
+            key = await self.key_set.get_key(self.backend.get_unverified_header(token).get("kid"))
+        else:
+            key = self.key
+
+        claims = self.backend.decode(token, key, self.algorithms)
+
+        if "exp" in claims:
+            self.claims_cache.set(token_hash, claims, ttl=claims["exp"] - time.time())
+
+        return claims
+
+    def get_stats(self) -> dict:
+        return self.claims_cache.get_stats()
+
+
+def is_symmetric(algorithm: str) -> bool:
+    return algorithm.startswith("HS")
+
+
+def get_jwt_backend() -> Any:
+    return JWT_BACKENDS[settings.JWT_BACKEND]()
+
+
+def get_signing_key(backend: Any) -> Any:
+    if is_symmetric(settings.ALGORITHM):
+        return backend.prepare_key(settings.SECRET_KEY, settings.ALGORITHM)
+
+    return backend.prepare_key(settings.JWT_PRIVATE_KEY, settings.ALGORITHM)
+
+
+def create_token_verifier() -> TokenVerifier:
+    backend = get_jwt_backend()
+    key, key_set = None, None
+
+    if is_symmetric(settings.ALGORITHM):
+        key = backend.prepare_key(settings.SECRET_KEY, settings.ALGORITHM)
+    elif settings.JWT_JWKS_URL:
+        key_set = JWKSKeySet(
+            url=settings.JWT_JWKS_URL,
+            backend=backend,
+            cache_seconds=settings.JWT_JWKS_CACHE_SECONDS,
+        )
+    else:
+        key = backend.prepare_key(settings.JWT_PUBLIC_KEY, settings.ALGORITHM)
+
+    return TokenVerifier(
+        backend=backend,
+        algorithm=settings.ALGORITHM,
+        key=key,
+        key_set=key_set,
+        cache_size=settings.JWT_CLAIMS_CACHE_SIZE,
+    )
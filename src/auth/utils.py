@@ -1,11 +1,10 @@
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
-
 import bcrypt
 from fastapi import HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.security.utils import get_authorization_scheme_param
 
+from src.executor import get_cpu_executor
+
 
 class OAuth2PasswordBearerWithAccount(OAuth2PasswordBearer):
     def __init__(self, tokenUrl: str):
@@ -34,11 +33,7 @@ def blocking_verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as pool:
-        return await loop.run_in_executor(
-            pool, blocking_verify_password, plain_password, hashed_password
-        )
+    return await get_cpu_executor().run(blocking_verify_password, plain_password, hashed_password)
 
 
 def blocking_get_password_hash(password: str) -> str:
@@ -46,6 +41,4 @@ def blocking_get_password_hash(password: str) -> str:
 
 
 async def get_password_hash(password: str) -> str:
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as pool:
-        return await loop.run_in_executor(pool, blocking_get_password_hash, password)
+    return await get_cpu_executor().run(blocking_get_password_hash, password)
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.logger import logger
+from src.metrics import CACHE_REQUESTS
+
+# Channel carrying the namespaces invalidated by `invalidate_redis_cache` to every worker, or
+# "<namespace> <key>" when a single entry was dropped
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+class TTLCache:
+    """Small in-process LRU cache whose entries also expire after `ttl` seconds.
+
+    Bounded by entry count and, if `maxbytes` is set, by the total of the `size` given to `set`.
+    Not thread safe, it is meant to be used from the event loop only. Lookups are also counted
+    in `cache_requests_total` under `name`, if given.
+    """
+
+    def __init__(
+        self, maxsize: int, ttl: float, maxbytes: int | None = None, name: str | None = None
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        # Bumped by clear(), lets a caller tell that an invalidation happened while it was loading
+        self.generation = 0
+        self.data: OrderedDict[Any, tuple[float, Any, int]] = OrderedDict()
+        self.hit_counter = self.miss_counter = None
+        if name is not None:
+            self.hit_counter = CACHE_REQUESTS.labels(name, "local", "hit")
+            self.miss_counter = CACHE_REQUESTS.labels(name, "local", "miss")
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self.data.get(key)
+
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self.delete(key)
+            self.misses += 1
+            if self.miss_counter is not None:
+                self.miss_counter.inc()
+            return default
+
+        self.data.move_to_end(key)
+        self.hits += 1
+        if self.hit_counter is not None:
+            self.hit_counter.inc()
+        return entry[1]
+
+    def set(self, key: Any, value: Any, ttl: float | None = None, size: int = 0) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        self.delete(key)
+        self.data[key] = (expires_at, value, size)
+        self.bytes += size
+
+        while len(self.data) > self.maxsize or (
+            self.maxbytes is not None and self.bytes > self.maxbytes and self.data
+        ):
+            _, (_, _, evicted_size) = self.data.popitem(last=False)
+            self.bytes -= evicted_size
+
+    def delete(self, key: Any) -> None:
+        entry = self.data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.bytes = 0
+        self.generation += 1
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "bytes": self.bytes,
+            "maxbytes": self.maxbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# L1 caches of `redis_cache` namespaces, one per namespace and per process
+local_caches: dict[str, TTLCache] = {}
+
+
+def get_local_cache(
+    namespace: str, maxsize: int, ttl: float, maxbytes: int | None = None
+) -> TTLCache:
+    if namespace not in local_caches:
+        local_caches[namespace] = TTLCache(
+            maxsize=maxsize, ttl=ttl, maxbytes=maxbytes, name=namespace
+        )
+
+    return local_caches[namespace]
+
+
+def register_local_cache(namespace: str, local_cache: TTLCache) -> None:
+    """Have the invalidation listener of this process drop entries from `local_cache` too."""
+    local_caches[namespace] = local_cache
+
+
+def clear_local_cache(namespace: str, key: Any = None) -> None:
+    local_cache = local_caches.get(namespace)
+    if local_cache is None:
+        return
+
+    if key is None:
+        local_cache.clear()
+    else:
+        local_cache.delete(key)
+
+
+async def publish_invalidation(redis_client: Redis, namespace: str, key: str | None = None):
+    """Tell every worker to clear `namespace`, or only its `key` entry, from their L1."""
+    await redis_client.publish(
+        INVALIDATION_CHANNEL, namespace if key is None else f"{namespace} {key}"
+    )
+
+
+def get_local_cache_stats() -> dict:
+    return {namespace: cache.get_stats() for namespace, cache in local_caches.items()}
+
+
+async def run_cache_invalidation_listener(redis_client: Redis, reconnect_interval: float = 1):
+    """Clear the L1 cache of every namespace invalidated by any worker or node.
+
+    Pub/sub is fire and forget, so every L1 cache is cleared whenever the subscription is
+    (re)established, in case messages were missed while disconnected.
+    """
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+
+                for local_cache in local_caches.values():
+                    local_cache.clear()
+
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    if isinstance(data, bytes):
+                        data = data.decode()
+                    namespace, _, key = data.partition(" ")
+                    clear_local_cache(namespace, key or None)
+
+        except RedisError as e:
+            logger.warning(f"Cache invalidation listener disconnected, error: {e}")
+            await asyncio.sleep(reconnect_interval)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,8 +10,164 @@ class Settings(BaseSettings):
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
 
+    # JWT, ALGORITHM 為 RS256/ES256 等非對稱演算法時用 JWT_PRIVATE_KEY 簽章,
+    # 以 JWT_PUBLIC_KEY 或 JWT_JWKS_URL 的公鑰驗證
+    JWT_BACKEND: Literal["jose", "pyjwt"] = "jose"
+    JWT_PRIVATE_KEY: str | None = None
+    JWT_PUBLIC_KEY: str | None = None
+    JWT_KEY_ID: str | None = None
+    JWT_JWKS_URL: str | None = None
+    JWT_JWKS_CACHE_SECONDS: float = 3600
+    JWT_CLAIMS_CACHE_SIZE: int = 100000
+
+    # 反向代理的 IP 或網段, 來自這些位址的請求以 X-Forwarded-For 取得實際用戶端 IP
+    TRUSTED_PROXY_IPS: list[str] = []
+
+    # Logging, 由背景執行緒輸出, event loop 只負責排入佇列; 佇列滿時丟棄
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["json", "console"] = "json"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_INFO_SAMPLE_RATE: float = 1.0  # debug/info 保留比例, warning 以上一律保留
+
     # DB
     DATABASE_URL: str
+    # Read replicas, 唯讀查詢輪流分給健康的 replica; 使用者寫入後一段時間內改讀 primary
+    DATABASE_REPLICA_URLS: list[str] = []
+    DATABASE_REPLICA_HEALTH_CHECK_SECONDS: float = 5
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = 10
+    DATABASE_READ_YOUR_WRITES_SECONDS: float = 5
+    # DB pool, 每個 worker 各一組 (replica 亦同); None 表示採用 profile 的設定, 見 src/database.py
+    DATABASE_POOL_PROFILE: Literal["dev", "standard", "high_throughput"] | None = (
+        None  # None 依 MODE
+    )
+    DATABASE_POOL_SIZE: int | None = None
+    DATABASE_MAX_OVERFLOW: int | None = None
+    DATABASE_POOL_TIMEOUT_SECONDS: float | None = None
+    DATABASE_POOL_RECYCLE_SECONDS: int | None = None  # -1 表示不回收
+    DATABASE_POOL_PRE_PING: bool | None = None  # 每次取出連線先 ping 一次
+    DATABASE_STATEMENT_CACHE_SIZE: int = 500  # 每條連線快取的 prepared statement 數, 0 停用
+    # 同時使用 DB session 的請求上限, 超過時排隊; 排隊已滿或等待逾時回 503
+    DATABASE_MAX_CONCURRENT_SESSIONS: int | None = None  # None 為 pool_size + max_overflow
+    DATABASE_SESSION_QUEUE_SIZE: int = 100
+    DATABASE_SESSION_QUEUE_TIMEOUT_SECONDS: float = 2  # 需小於 pool timeout
+    # 啟動時檢查 WEB_CONCURRENCY × (pool_size + max_overflow) 不超過 DB 可用的連線數
+    WEB_CONCURRENCY: int = 1  # uvicorn worker 數, uvicorn 讀同一個環境變數
+    DATABASE_MAX_CONNECTIONS: int = 250  # Postgres max_connections, 見 docker-compose.yml
+    DATABASE_RESERVED_CONNECTIONS: int = 10  # 保留給 superuser、migration 與手動連線
+
+    # Redis
+    REDIS_HOST: str = "localhost"
+    REDIS_PORT: int = 6379
+    REDIS_MAX_CONNECTIONS: int = 100
+    REDIS_POOL_TIMEOUT_SECONDS: float = 5
+    REDIS_HEALTH_CHECK_INTERVAL_SECONDS: int = 30
+    REDIS_SHUTDOWN_DRAIN_SECONDS: float = 5
+
+    # Principal cache, 驗證過的使用者快取, 省去每個請求查一次 users
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    PRINCIPAL_CACHE_REDIS_ENABLED: bool = False  # 是否另存於 Redis; 失效通知一律經 Redis 廣播
+    PRINCIPAL_CACHE_REDIS_TTL_SECONDS: int = 300
+
+    # CPU executor, bcrypt 等 CPU 密集工作共用的執行緒/行程池
+    CPU_EXECUTOR_KIND: Literal["thread", "process"] = "thread"
+    CPU_EXECUTOR_MAX_WORKERS: int | None = None  # None 表示 CPU 核心數
+    CPU_EXECUTOR_MAX_PENDING: int = 64
+
+    # Event catalogue cache, 本機 L1 (LRU) + Redis, L1 透過 pub/sub 跨 worker 失效
+    EVENT_CACHE_LOCAL_TTL_SECONDS: float = 30
+    EVENT_CACHE_MAX_SIZE: int = 1000
+    EVENT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    EVENT_CACHE_REDIS_TTL_SECONDS: int = 60
+
+    # Event search, 全文搜尋無結果時以 pg_trgm 相似度模糊比對活動名稱 (需安裝 pg_trgm)
+    EVENT_SEARCH_MAX_WORDS: int = 8
+    EVENT_SEARCH_FUZZY_THRESHOLD: float = 0.3
+
+    # Reservation
+    RESERVATION_TTL_SECONDS: int = 600
+    RESERVATION_SWEEP_INTERVAL_SECONDS: float = 5
+    RESERVATION_SWEEP_BATCH_SIZE: int = 500
+
+    # Inventory, "redis" 模式下開賣中的庫存由 Redis 計數並批次寫回 Postgres
+    INVENTORY_MODE: Literal["database", "redis"] = "database"
+    INVENTORY_FLUSH_INTERVAL_SECONDS: float = 1
+    INVENTORY_FLUSH_BATCH_SIZE: int = 5000
+    INVENTORY_RECONCILE_INTERVAL_SECONDS: float = 30  # 依 Postgres 的保留紀錄校正 Redis 計數
+    INVENTORY_PENDING_TIMEOUT_SECONDS: float = 60  # Redis 已扣但超過此時間未寫入 Postgres 視為中斷
+
+    # Waiting room, 開賣時以排隊券控制每秒進入購票流程的人數
+    WAITING_ROOM_ENABLED: bool = False
+    WAITING_ROOM_ADMIT_RATE: float = 50
+    WAITING_ROOM_ADMIT_BURST: int = 100
+    WAITING_ROOM_ADMIT_INTERVAL_SECONDS: float = 0.5
+    WAITING_ROOM_ADMISSION_TTL_SECONDS: int = 600
+    WAITING_ROOM_TICKET_EXPIRE_MINUTES: int = 180
+    WAITING_ROOM_TICKET_SECRET: str | None = None  # 排隊券以 HS256 簽章，未設定時沿用 SECRET_KEY
+
+    # Outbound HTTP, 每個金流/發票/簡訊供應商各一個共用連線池
+    HTTP_CLIENT_HTTP2: bool = True  # 需安裝 h2, 對方不支援時自動退回 HTTP/1.1
+    HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS: float = 5
+    HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS: float = 30
+
+    # Resilience, 供應商斷路器 / 自適應逾時, 同時呼叫數上限為各供應商的最大連線數
+    PROVIDER_BREAKER_FAILURE_THRESHOLD: int = 5  # 連續失敗幾次後斷路
+    PROVIDER_BREAKER_RESET_SECONDS: float = 30  # 斷路多久後放行一次試探呼叫
+    PROVIDER_MIN_TIMEOUT_SECONDS: float = 1
+    PROVIDER_TIMEOUT_PERCENTILE: float = 99
+    PROVIDER_TIMEOUT_MULTIPLIER: float = 3
+    PROVIDER_HEDGE_PERCENTILE: float = 95  # 冪等查詢超過此延遲時再送一次
+    PROVIDER_LATENCY_WINDOW: int = 200
+    PROVIDER_LATENCY_MIN_SAMPLES: int = 20  # 樣本不足時逾時為各供應商的 TIMEOUT_SECONDS
+
+    # MyPay
+    MYPAY_URL: str = ""
+    MYPAY_STORE_UID: str = ""
+    MYPAY_STORE_KEY: str = ""
+    MYPAY_TIMEOUT_SECONDS: float = 30
+    MYPAY_MAX_CONNECTIONS: int = 20
+    MYPAY_NOTIFY_ALLOWED_IPS: list[str] = []  # 背景通知來源 IP 白名單, 空白時僅 dev 模式接受
+    MYPAY_ENCRYPT_OFFLOAD_BYTES: int = 16384  # 加密資料超過此大小時改在 CPU executor 執行
+
+    # Order, Idempotency-Key 的結果保留時間與處理中的鎖
+    ORDER_IDEMPOTENCY_TTL_SECONDS: int = 86400
+    ORDER_IDEMPOTENCY_LOCK_SECONDS: int = 60
+
+    # Amego 電子發票
+    AMEGO_API_BASE_URL: str = ""
+    AMEGO_API_KEY: str = ""
+    AMEGO_API_TAX_ID: str = ""
+    AMEGO_TIMEOUT_SECONDS: float = 10
+    AMEGO_MAX_CONNECTIONS: int = 10
+    AMEGO_INVOICE_WORKER_ENABLED: bool = True  # 需設定 AMEGO_API_BASE_URL
+    AMEGO_INVOICE_WORKER_INTERVAL_SECONDS: float = 1
+    AMEGO_INVOICE_WORKER_BATCH_SIZE: int = 50
+    AMEGO_INVOICE_WORKER_CONCURRENCY: int = 10  # 不超過 AMEGO_MAX_CONNECTIONS
+    AMEGO_INVOICE_MAX_ATTEMPTS: int = 8
+    AMEGO_INVOICE_RETRY_BASE_SECONDS: float = 5
+    AMEGO_INVOICE_RETRY_MAX_SECONDS: float = 600
+    AMEGO_INVOICE_LEASE_SECONDS: int = 120  # 需大於 AMEGO_TIMEOUT_SECONDS
+
+    # Mitake 簡訊
+    MITAKE_SMS_API_URL: str = ""
+    MITAKE_SMS_CHECKPOINT_URL: str = ""
+    MITAKE_SMS_USERNAME: str = ""
+    MITAKE_SMS_PASSWORD: str = ""
+    MITAKE_SMS_TIMEOUT_SECONDS: float = 10
+    MITAKE_SMS_MAX_CONNECTIONS: int = 10
+    MITAKE_SMS_BULK_API_URL: str = ""  # SmBulkSend, 大量發送由背景 dispatcher 處理
+    MITAKE_SMS_DISPATCHER_ENABLED: bool = True
+    MITAKE_SMS_DISPATCH_INTERVAL_SECONDS: float = 1
+    MITAKE_SMS_DISPATCH_BATCH_SIZE: int = 2000
+    MITAKE_SMS_DISPATCH_CONCURRENCY: int = 4
+    MITAKE_SMS_BULK_SIZE: int = 500  # SmBulkSend 單次上限 500 則
+    MITAKE_SMS_RATE_PER_SECOND: float = 100  # 依合約配額, 所有 worker 共用
+    MITAKE_SMS_RATE_BURST: int = 500
+    MITAKE_SMS_MAX_ATTEMPTS: int = 5
+    MITAKE_SMS_RETRY_BASE_SECONDS: float = 10
+    MITAKE_SMS_RETRY_MAX_SECONDS: float = 600
+    MITAKE_SMS_LEASE_SECONDS: int = 120
+    MITAKE_SMS_POINTS_CACHE_SECONDS: int = 300
 
     model_config = SettingsConfigDict(env_file="./env/.env")
 
@@ -9,6 +9,54 @@ class Role(Enum):
     GUEST = 3
 
 
+class ReservationStatus(Enum):
+    PENDING = 1
+    CONFIRMED = 2
+    RELEASED = 3
+
+
+ACTIVE_RESERVATION_STATUSES = (ReservationStatus.PENDING.value, ReservationStatus.CONFIRMED.value)
+
+
+class OrderStatus(Enum):
+    PENDING_PAYMENT = 1
+    PAID = 2
+    REFUND_REQUIRED = 3  # 付款成功但預約已逾時釋放，需人工退款
+
+
+# 排隊券 JWT 的 typ，預設與 access token 共用 SECRET_KEY，靠此區分兩者
+QUEUE_TICKET_TYPE = "queue"
+
+# MyPay 交易回傳碼 (prc): 250 付款成功
+MYPAY_PAID_PRC = "250"
+# MyPay 背景通知需回應 8888 表示已收到，否則會重送
+MYPAY_NOTIFY_ACK = "8888"
+
+
+class InvoiceJobStatus(Enum):
+    PENDING = 1  # 等待開立或重試
+    PROCESSING = 2  # 背景 worker 處理中
+    ISSUED = 3
+    DEAD = 4  # 重試次數用盡或被 Amego 拒絕，需人工處理
+
+
+# 背景 worker 可以領取的狀態，處理中的工作逾時未回報也會被重新領取
+CLAIMABLE_INVOICE_JOB_STATUSES = (InvoiceJobStatus.PENDING.value, InvoiceJobStatus.PROCESSING.value)
+
+
+class SmsStatus(Enum):
+    PENDING = 1  # 等待發送或重試
+    SENDING = 2  # 背景 dispatcher 發送中
+    SENT = 3  # Mitake 已受理
+    FAILED = 4  # 門號無效等無法重送的錯誤，或重試次數用盡
+
+
+CLAIMABLE_SMS_STATUSES = (SmsStatus.PENDING.value, SmsStatus.SENDING.value)
+
+# Mitake statuscode: 0 預約傳送中, 1 已送達業者, 2 已送達業者, 4 已送達手機
+MITAKE_SMS_ACCEPTED_STATUS_CODES = ("0", "1", "2", "4")
+
+
 DEFAULT_ERROR_RESPONSE = {
     400: {
         "description": "Bad request",
@@ -1,40 +1,519 @@
+import asyncio
+import logging
+import math
+import time
 from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
 
-from redis.asyncio import ConnectionPool, Redis
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from fastapi import HTTPException, Request, Response, status
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.config import settings
+from src.logger import logger
+from src.metrics import (
+    DB_POOL_WAIT,
+    DB_SESSIONS_REJECTED,
+    REDIS_COMMAND_DURATION,
+    REDIS_POOL_WAIT,
+    instrument_engine,
+)
+
+# Set on a client after its own write, its reads go to the primary until the time it holds
+READ_PRIMARY_COOKIE = "db_read_primary_until"
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long a checkout waits, under the engine's
+    `pool_logging_name`."""
+
+    def connect(self):
+        start_time = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_WAIT.labels(self.logging_name or "primary").observe(
+                time.perf_counter() - start_time
+            )
+
+
+# Pool of each worker, and of each replica in it. DATABASE_POOL_* settings override single values.
+POOL_PROFILES = {
+    # A developer and the tests
+    "dev": {
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": -1,
+        "pool_pre_ping": True,
+    },
+    # A steady pool plus room for bursts, connections renewed before proxies and firewalls drop
+    # them as idle
+    "standard": {
+        "pool_size": 10,
+        "max_overflow": 10,
+        "pool_timeout": 10,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    },
+    # Sales: a fixed pool that opens no connections under load, and no ping round trip per
+    # checkout; a connection found dead fails its query and the pool replaces all of them
+    "high_throughput": {
+        "pool_size": 20,
+        "max_overflow": 0,
+        "pool_timeout": 5,
+        "pool_recycle": 3600,
+        "pool_pre_ping": False,
+    },
+}
+
+
+def get_engine_options() -> dict:
+    profile = settings.DATABASE_POOL_PROFILE or ("dev" if settings.MODE == "dev" else "standard")
+    options = dict(POOL_PROFILES[profile])
+    overrides = {
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+    }
+    options.update({name: value for name, value in overrides.items() if value is not None})
+
+    # Statements are prepared once per connection and reused from this cache, by SQLAlchemy's
+    # asyncpg adapter and by asyncpg itself
+    options["connect_args"] = {
+        "prepared_statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+        "statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+    }
+    return options
+
+
+engine_options = get_engine_options()
 
 if settings.MODE == "dev":
-    engine = create_async_engine(
-        settings.DATABASE_URL,
-        pool_pre_ping=True,
-        echo=True,
+    # Logged SQL goes through the app's handlers, echo=True would add one printing it again
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+
+
+def check_connection_budget(
+    workers: int | None = None,
+    max_connections: int | None = None,
+    reserved_connections: int | None = None,
+    options: dict | None = None,
+) -> None:
+    """Refuse to start when the pools of all workers could open more connections than the
+    server accepts. Past max_connections Postgres refuses new ones, which fails requests at
+    random under load instead of queueing them. Every replica gets the same pools, on a server
+    of its own, so one check covers them too."""
+    workers = workers or settings.WEB_CONCURRENCY
+    max_connections = max_connections or settings.DATABASE_MAX_CONNECTIONS
+    if reserved_connections is None:
+        reserved_connections = settings.DATABASE_RESERVED_CONNECTIONS
+    options = options or engine_options
+
+    per_worker = options["pool_size"] + options["max_overflow"]
+    budget = max_connections - reserved_connections
+    if workers * per_worker > budget:
+        raise RuntimeError(
+            f"{workers} workers x {per_worker} connections (pool_size {options['pool_size']} + "
+            f"max_overflow {options['max_overflow']}) exceeds the {budget} connections available "
+            f"(max_connections {max_connections} - {reserved_connections} reserved), lower "
+            f"WEB_CONCURRENCY or DATABASE_POOL_SIZE / DATABASE_MAX_OVERFLOW"
+        )
+
+
+class SessionLimiter:
+    """Caps the requests using database sessions of a pool at once at what the pool can serve.
+
+    Past `max_concurrency`, up to `max_queued` requests wait at most `queue_timeout` seconds for
+    a session and the rest get a 503 with `Retry-After` right away, instead of all of them
+    waiting `pool_timeout` inside the pool and failing with a 500 after it.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queued: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_use = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def reject(self, reason: str):
+        self.rejected += 1
+        DB_SESSIONS_REJECTED.labels(self.name, reason).inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry later",
+            headers={"Retry-After": "1"},
+        )
+
+    @asynccontextmanager
+    async def limit(self):
+        # Only touched from the event loop thread, so no lock is needed
+        if self.semaphore.locked():
+            if self.queued >= self.max_queued:
+                self.reject("queue_full")
+
+            self.queued += 1
+            try:
+                async with asyncio.timeout(self.queue_timeout):
+                    await self.semaphore.acquire()
+            except TimeoutError:
+                self.reject("timeout")
+            finally:
+                self.queued -= 1
+        else:
+            await self.semaphore.acquire()
+
+        self.in_use += 1
+        try:
+            yield
+        finally:
+            self.in_use -= 1
+            self.semaphore.release()
+
+    def get_stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_use": self.in_use,
+            "queued": self.queued,
+            "rejected": self.rejected,
+        }
+
+
+def create_session_limiter(name: str, pool_capacity: int) -> SessionLimiter:
+    return SessionLimiter(
+        name,
+        max_concurrency=settings.DATABASE_MAX_CONCURRENT_SESSIONS or pool_capacity,
+        max_queued=settings.DATABASE_SESSION_QUEUE_SIZE,
+        queue_timeout=settings.DATABASE_SESSION_QUEUE_TIMEOUT_SECONDS,
     )
-else:
-    engine = create_async_engine(
+
+
+engine = instrument_engine(
+    create_async_engine(
         settings.DATABASE_URL,
-        pool_size=50,
-        max_overflow=100,
-        pool_pre_ping=True,
-    )
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name="primary",
+        **engine_options,
+    ),
+    name="primary",
+)
+primary_limiter = create_session_limiter(
+    "primary", engine_options["pool_size"] + engine_options["max_overflow"]
+)
+
+
+class PrimarySession(Session):
+    """Session on the primary. Remembers whether it wrote anything, so that a committed write
+    pins the client's reads to the primary for `DATABASE_READ_YOUR_WRITES_SECONDS`."""
+
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def track_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def track_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def pin_reads_to_primary(session):
+    response: Response | None = session.info.get("response")
+    if session.info.pop("wrote", False) and response is not None:
+        window = settings.DATABASE_READ_YOUR_WRITES_SECONDS
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            str(time.time() + window),
+            max_age=math.ceil(window),
+            httponly=True,
+            samesite="lax",
+        )
+
+
+@event.listens_for(PrimarySession, "after_rollback")
+def forget_writes(session):
+    session.info.pop("wrote", None)
 
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
     autoflush=False,
     future=True,
+    sync_session_class=PrimarySession,
+)
+ReplicaSessionLocal = async_sessionmaker(autoflush=False, future=True)
+
+
+class ReplicaPool:
+    """Round-robin over the read replicas that passed their last health check.
+
+    A replica is unhealthy when it can't be reached or replays more than `max_lag` seconds
+    behind the primary; it is used again once a later check passes.
+    """
+
+    def __init__(self, urls: list[str], max_lag: float, **engine_kwargs):
+        self.engines: list[AsyncEngine] = [
+            instrument_engine(
+                create_async_engine(
+                    url,
+                    poolclass=InstrumentedQueuePool,
+                    pool_logging_name="replica",
+                    **engine_kwargs,
+                ),
+                name="replica",
+            )
+            for url in urls
+        ]
+        self.healthy = [True] * len(self.engines)
+        # Reads are spread over the replicas, so their pools serve them together
+        pool_capacity = engine_kwargs.get("pool_size", 5) + engine_kwargs.get("max_overflow", 10)
+        self.limiter = create_session_limiter("replica", pool_capacity * len(self.engines))
+        self.max_lag = max_lag
+        self.position = 0
+        self.fallbacks = 0
+
+    def get_engine(self) -> AsyncEngine | None:
+        for _ in range(len(self.engines)):
+            index = self.position % len(self.engines)
+            self.position += 1
+            if self.healthy[index]:
+                return self.engines[index]
+
+        self.fallbacks += 1
+        return None
+
+    async def check_replica(self, engine: AsyncEngine, timeout: float) -> bool:
+        # Caught up replicas have nothing to replay, the replay timestamp of an idle primary is old
+        lag_query = text(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() "
+            "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        )
+        try:
+            async with asyncio.timeout(timeout):
+                async with engine.connect() as conn:
+                    lag = (await conn.execute(lag_query)).scalar()
+        except Exception as e:
+            logger.warning(f"[Database] replica {engine.url.host} check failed, error: {e}")
+            return False
+
+        return lag is None or lag <= self.max_lag
+
+    async def check_health(self, timeout: float = 2) -> None:
+        results = await asyncio.gather(
+            *(self.check_replica(engine, timeout) for engine in self.engines)
+        )
+        for index, healthy in enumerate(results):
+            if healthy != self.healthy[index]:
+                state = "healthy" if healthy else "unhealthy"
+                logger.warning(f"[Database] replica {self.engines[index].url.host} is {state}")
+            self.healthy[index] = healthy
+
+    def get_stats(self) -> dict:
+        return {
+            "replicas": [
+                {"host": engine.url.host, "database": engine.url.database, "healthy": healthy}
+                for engine, healthy in zip(self.engines, self.healthy, strict=True)
+            ],
+            "fallbacks_to_primary": self.fallbacks,
+            "sessions": self.limiter.get_stats(),
+        }
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+
+replica_pool: ReplicaPool | None = (
+    ReplicaPool(
+        settings.DATABASE_REPLICA_URLS,
+        max_lag=settings.DATABASE_REPLICA_MAX_LAG_SECONDS,
+        **engine_options,
+    )
+    if settings.DATABASE_REPLICA_URLS
+    else None
 )
 
 
-async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
-    async with AsyncSessionLocal() as session:
+async def run_replica_health_checks() -> None:
+    while True:
+        await replica_pool.check_health()
+        await asyncio.sleep(settings.DATABASE_REPLICA_HEALTH_CHECK_SECONDS)
+
+
+async def get_db_session(response: Response) -> AsyncGenerator[AsyncSession, None]:
+    """Session on the primary, for writes and for reads that must not lag."""
+    async with primary_limiter.limit(), AsyncSessionLocal() as session:
+        session.info["response"] = response
         yield session
 
 
-async def get_redis_client() -> Redis:
-    pool = ConnectionPool.from_url(
-        f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}", decode_responses=True
+def primary_only(request: Request) -> None:
+    """Route dependency that sends the reads of a route to the primary:
+    `@router.get(..., dependencies=[Depends(primary_only)])`."""
+    request.state.read_primary = True
+
+
+def reads_from_primary(request: Request) -> bool:
+    if getattr(request.state, "read_primary", False):
+        return True
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+async def get_read_db_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Session for read-only dependencies, on a replica when one is healthy.
+
+    Falls back to the primary without replicas, on primary-only routes, and for a client that
+    wrote within the last `DATABASE_READ_YOUR_WRITES_SECONDS`, so it sees its own writes.
+    """
+    replica = None
+    if replica_pool is not None and not reads_from_primary(request):
+        replica = replica_pool.get_engine()
+
+    if replica is None:
+        async with primary_limiter.limit(), AsyncSessionLocal() as session:
+            yield session
+    else:
+        async with replica_pool.limiter.limit(), ReplicaSessionLocal(bind=replica) as session:
+            yield session
+
+
+def get_pool_stats() -> dict:
+    return {
+        "size": engine.pool.size(),
+        "max_overflow": engine_options["max_overflow"],
+        "checked_out": engine.pool.checkedout(),
+        "idle": engine.pool.checkedin(),
+        "sessions": primary_limiter.get_stats(),
+    }
+
+
+def get_replica_stats() -> dict | None:
+    return None if replica_pool is None else replica_pool.get_stats()
+
+
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    """BlockingConnectionPool that keeps the numbers needed to size it: connections created and
+    how long callers had to wait for one."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_connections = 0
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.connection_errors = 0
+
+    def make_connection(self):
+        self.created_connections += 1
+        return super().make_connection()
+
+    async def get_connection(self, *args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return await super().get_connection(*args, **kwargs)
+        except RedisConnectionError:
+            self.connection_errors += 1
+            raise
+        finally:
+            wait_time = time.perf_counter() - start_time
+            REDIS_POOL_WAIT.observe(wait_time)
+            self.wait_count += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def get_stats(self) -> dict:
+        return {
+            "max_connections": self.max_connections,
+            "created": self.created_connections,
+            "in_use": len(self._in_use_connections),
+            "idle": len(self._available_connections),
+            "wait_count": self.wait_count,
+            "wait_time_avg_ms": self.wait_time_total / self.wait_count * 1000
+            if self.wait_count
+            else 0.0,
+            "wait_time_max_ms": self.wait_time_max * 1000,
+            "connection_errors": self.connection_errors,
+        }
+
+
+class InstrumentedRedis(Redis):
+    """Redis client that records the latency of every command by name."""
+
+    async def execute_command(self, *args, **options):
+        start_time = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(
+                time.perf_counter() - start_time
+            )
+
+
+redis_pool: InstrumentedConnectionPool | None = None
+
+
+def init_redis_pool(**connection_kwargs) -> InstrumentedConnectionPool:
+    """Create the process-wide Redis pool, every client returned by `get_redis_client` shares
+    its connections."""
+    global redis_pool
+
+    if redis_pool is None:
+        redis_pool = InstrumentedConnectionPool(
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            decode_responses=True,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+            socket_keepalive=True,
+            **connection_kwargs,
+        )
+
+    return redis_pool
+
+
+async def close_redis_pool(drain_timeout: float | None = None) -> None:
+    """Wait for in-flight commands to hand their connections back, then close them all."""
+    global redis_pool
+
+    if redis_pool is None:
+        return
+
+    pool, redis_pool = redis_pool, None
+    drain_timeout = (
+        settings.REDIS_SHUTDOWN_DRAIN_SECONDS if drain_timeout is None else drain_timeout
     )
+    deadline = time.monotonic() + drain_timeout
 
-    return Redis.from_pool(pool)
+    while pool._in_use_connections and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+    await pool.disconnect()
+
+
+def get_redis_pool_stats() -> dict | None:
+    return None if redis_pool is None else redis_pool.get_stats()
+
+
+async def get_redis_client() -> Redis:
+    return InstrumentedRedis(connection_pool=init_redis_pool())
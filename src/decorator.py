@@ -1,10 +1,42 @@
-import json
+import asyncio
+import hashlib
+import math
+import random
 import time
+import uuid
 from functools import wraps
 
-from fastapi.encoders import jsonable_encoder
+import orjson
+from pydantic import BaseModel
+from redis.exceptions import NoScriptError, RedisError
 
+from src.cache import INVALIDATION_CHANNEL, clear_local_cache, get_local_cache
 from src.logger import logger
+from src.metrics import CACHE_REQUESTS
+
+# KEYS: namespace version key  ARGV: key prefix, key hash
+# Reads the namespace version and the entry under it in one round trip. The entry key is built in
+# the script, the hash tag keeps it in the same cluster slot as the version key.
+CACHE_GET_SCRIPT = """
+local version = redis.call('GET', KEYS[1]) or '0'
+return {version, redis.call('GET', ARGV[1] .. ':v' .. version .. ':' .. ARGV[2])}
+"""
+
+# KEYS: lock key  ARGV: lock token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+CACHE_GET_SHA = hashlib.sha1(CACHE_GET_SCRIPT.encode()).hexdigest()
+RELEASE_LOCK_SHA = hashlib.sha1(RELEASE_LOCK_SCRIPT.encode()).hexdigest()
+
+MISSING = object()
+
+# Computations in progress in this process, so concurrent misses on one key share one call
+inflight: dict[str, asyncio.Future] = {}
 
 
 def timeit(func):
@@ -23,54 +55,301 @@ def timeit(func):
     return wrapper
 
 
-def redis_cache(expiration: int = 3600):
+def orjson_default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, set | frozenset):
+        return sorted(obj)
+    raise TypeError(f"{type(obj).__name__} cannot be used in a cache key or value")
+
+
+def encode_entry(value, delta: float, expires_at: float, raw: bool) -> bytes:
+    """Cache entry of a result: JSON, or for `raw` results a one line header then the bytes."""
+    if raw:
+        return f"{delta!r} {expires_at!r}\n".encode() + value
+    return orjson.dumps({"v": value, "d": delta, "e": expires_at}, default=orjson_default)
+
+
+def decode_entry(cached: str | bytes, raw: bool) -> tuple:
+    """(result, seconds it took to compute, expiry timestamp) of a cache entry.
+
+    Raises ValueError on an entry that doesn't have the expected format.
+    """
+    if raw:
+        if isinstance(cached, str):
+            cached = cached.encode()
+        header, _, value = cached.partition(b"\n")
+        delta, expires_at = header.split()
+        return value, float(delta), float(expires_at)
+
+    entry = orjson.loads(cached)
+    return entry["v"], entry["d"], entry["e"]
+
+
+def make_cache_key(args: tuple, kwargs: dict) -> str:
+    """Hash of the arguments, stable across processes and restarts.
+
+    Arguments are serialized as JSON with sorted keys instead of `str()`, so objects without a
+    stable repr are rejected instead of silently never hitting.
+    """
+    raw = orjson.dumps([args, kwargs], default=orjson_default, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(raw).hexdigest()
+
+
+def get_namespace_keys(namespace: str) -> tuple[str, str]:
+    """(entry key prefix, version key) of a namespace."""
+    return f"cache:{{{namespace}}}", f"cache:{{{namespace}}}:version"
+
+
+async def run_script(redis_client, script: str, sha: str, keys: list, args: list):
+    try:
+        return await redis_client.evalsha(sha, len(keys), *keys, *args)
+    except NoScriptError:
+        return await redis_client.eval(script, len(keys), *keys, *args)
+
+
+async def single_flight(key: str, compute):
+    """`compute()` once per key at a time in this process, concurrent callers share its result.
+
+    It runs in the first caller's task, with that caller's arguments (e.g. its DB session). If
+    that caller is cancelled, e.g. by a client disconnect, the cancellation isn't passed on: the
+    callers waiting for it start over and one of them computes.
+    """
+    while (future := inflight.get(key)) is not None:
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled() or asyncio.current_task().cancelling():
+                raise
+
+    future = asyncio.get_running_loop().create_future()
+    inflight[key] = future
+    try:
+        result = await compute()
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # Waiters re-raise it, don't log it as never retrieved
+        raise
+    finally:
+        del inflight[key]
+
+
+def redis_cache(
+    prefix: str | None = None,
+    expiration: int = 3600,
+    stale_ttl: int | None = None,
+    beta: float = 1.0,
+    lock_timeout: float = 10,
+    local_ttl: float | None = None,
+    local_max_size: int = 1000,
+    local_max_bytes: int | None = None,
+    raw: bool = False,
+):
     """
     Decorator that caches the response of an async function in Redis.
 
+    - Keys are a hash of the arguments under a versioned namespace, `invalidate_redis_cache`
+      bumps the version to drop the whole namespace at once.
+    - Entries are recomputed slightly before they expire, with a probability that grows as the
+      expiry nears and with how long the function takes (XFetch), so a popular key is refreshed
+      by one caller instead of expiring under load.
+    - After `expiration`, the entry is still served for `stale_ttl` more seconds while a single
+      caller, holding a Redis lock, recomputes it (stale-while-revalidate).
+    - On a cold miss only one caller per key computes: one per process through single-flight and
+      one across processes through the lock, the others wait for its result.
+    - Redis errors fall back to calling the function, which is never called twice.
+    - With `local_ttl`, results are also kept in an in-process LRU (L1) for that many seconds,
+      bounded by `local_max_size` entries and `local_max_bytes` of serialized size. Invalidations
+      reach the L1 of every worker through `run_cache_invalidation_listener`. L1 hits return the
+      same object to every caller, treat results as read-only.
+    - With `raw`, the function returns bytes that are stored and returned as they are, e.g. an
+      already serialized response body, so a hit costs no decoding or re-encoding.
+
+    The wrapped function must be called with `redis_client` as a keyword argument and return
+    something orjson can serialize, or bytes with `raw`; `session` and `redis_client` are not
+    part of the key.
+
     Args:
-        prefix: The prefix for the cache key
-        expiration: Cache expiration time in seconds (default: 1 hour)
+        prefix: The namespace for the cache key (default: the function name)
+        expiration: Seconds an entry is fresh (default: 1 hour)
+        stale_ttl: Seconds a stale entry may still be served while refreshing
+            (default: same as expiration)
+        beta: XFetch aggressiveness, > 1 refreshes earlier, 0 disables early refresh
+        lock_timeout: Seconds the recompute lock is held at most
+        local_ttl: Seconds results stay in the in-process L1 (default: no L1)
+        local_max_size: Max entries in the L1
+        local_max_bytes: Max total serialized size of the L1 entries
+        raw: The function returns bytes, cache them as they are
     """
+    stale_ttl = expiration if stale_ttl is None else stale_ttl
 
     def decorator(func):
+        namespace = prefix or func.__name__
+        key_prefix, version_key = get_namespace_keys(namespace)
+        redis_hits = CACHE_REQUESTS.labels(namespace, "redis", "hit")
+        redis_stale = CACHE_REQUESTS.labels(namespace, "redis", "stale")
+        redis_misses = CACHE_REQUESTS.labels(namespace, "redis", "miss")
+        local_cache = None
+        if local_ttl:
+            local_cache = get_local_cache(
+                namespace, maxsize=local_max_size, ttl=local_ttl, maxbytes=local_max_bytes
+            )
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Get redis client from kwargs
             redis_client = kwargs.get("redis_client")
 
             if not redis_client:
                 raise ValueError("Redis client not found in kwargs")
 
-            # Generate cache key based on function arguments
-            # Skip self/cls and filter out redis_client/session
-            kwarg_values = [
-                f"{k}:{v}"
-                for k, v in sorted(kwargs.items())
-                if k not in ("redis_client", "session")  # Exclude redis and session
-            ]
-            cache_key = f"{func.__name__}_{str(args)}_{str(kwarg_values)}"
-
-            try:
-                # Try to get data from cache
-                cached_data = await redis_client.get(cache_key)
-                if cached_data:
-                    return json.loads(cached_data)
-
-                # If not in cache, execute function
+            key_hash = make_cache_key(
+                args, {k: v for k, v in kwargs.items() if k not in ("redis_client", "session")}
+            )
+
+            async def compute() -> tuple:
+                start = time.perf_counter()
                 result = await func(*args, **kwargs)
+                return result, time.perf_counter() - start
+
+            async def store(cache_key: str, result, delta: float) -> None:
+                entry = encode_entry(result, delta, time.time() + expiration, raw)
+                try:
+                    await redis_client.set(cache_key, entry, ex=expiration + stale_ttl)
+                except RedisError as e:
+                    logger.error(f"Redis cache error: {str(e)}")
+
+            async def refresh(cache_key: str):
+                lock_key = f"{cache_key}:lock"
+                lock_token = uuid.uuid4().hex
+                try:
+                    locked = await redis_client.set(
+                        lock_key, lock_token, nx=True, px=int(lock_timeout * 1000)
+                    )
+                except RedisError:
+                    locked = True  # Nothing to coordinate through, just compute
+
+                if not locked:
+                    return None
+
+                try:
+                    result, delta = await compute()
+                    await store(cache_key, result, delta)
+                    return (result,)
+                finally:
+                    try:
+                        await run_script(
+                            redis_client,
+                            RELEASE_LOCK_SCRIPT,
+                            RELEASE_LOCK_SHA,
+                            [lock_key],
+                            [lock_token],
+                        )
+                    except RedisError:
+                        pass
+
+            async def load():
+                try:
+                    version, cached = await run_script(
+                        redis_client,
+                        CACHE_GET_SCRIPT,
+                        CACHE_GET_SHA,
+                        [version_key],
+                        [key_prefix, key_hash],
+                    )
+                except RedisError as e:
+                    logger.error(f"Redis cache error: {str(e)}")
+                    return (await compute())[0]
+
+                if isinstance(version, bytes):
+                    version = version.decode()
+                cache_key = f"{key_prefix}:v{version}:{key_hash}"
+
+                if cached is not None:
+                    try:
+                        value, delta, expires_at = decode_entry(cached, raw)
+                    except ValueError:
+                        # Written in another format, e.g. before `raw` was turned on
+                        cached = None
 
-                # Convert result to JSON-serializable format
-                json_result = jsonable_encoder(result)
+                if cached is not None:
+                    # XFetch: -delta * beta * ln(rand) is an exponentially distributed head start
+                    early = -delta * beta * math.log(1 - random.random())
+                    if time.time() + early < expires_at:
+                        redis_hits.inc()
+                        return value
 
-                # Store result in cache
-                await redis_client.set(cache_key, json.dumps(json_result), ex=expiration)
+                    redis_stale.inc()
+                    # Stale or refreshing early: one caller recomputes, the rest keep the old value
+                    refreshed = await refresh(cache_key)
+                    return value if refreshed is None else refreshed[0]
 
+                redis_misses.inc()
+                deadline = time.monotonic() + lock_timeout
+                while True:
+                    refreshed = await refresh(cache_key)
+                    if refreshed is not None:
+                        return refreshed[0]
+
+                    # Another process is computing it
+                    await asyncio.sleep(0.05)
+                    try:
+                        cached = await redis_client.get(cache_key)
+                    except RedisError:
+                        cached = None
+                    if cached is not None:
+                        try:
+                            return decode_entry(cached, raw)[0]
+                        except ValueError:
+                            pass
+                    if time.monotonic() > deadline:
+                        return (await compute())[0]
+
+            if local_cache is None:
+                return await single_flight(f"{namespace}:{key_hash}", load)
+
+            result = local_cache.get(key_hash, MISSING)
+            if result is not MISSING:
                 return result
-            except Exception as e:
-                logger.error(f"Redis cache error: {str(e)}")
-                # If caching fails, just execute the function
-                return await func(*args, **kwargs)
+
+            generation = local_cache.generation
+            result = await single_flight(f"{namespace}:{key_hash}", load)
+
+            # Skip it if the namespace was invalidated meanwhile, it may predate the change
+            if local_cache.generation == generation:
+                size = len(result) if raw else len(orjson.dumps(result, default=orjson_default))
+                local_cache.set(key_hash, result, size=size)
+
+            return result
 
         return wrapper
 
     return decorator
+
+
+async def invalidate_redis_cache(redis_client, prefix: str) -> int | None:
+    """
+    Drop every entry cached by `redis_cache` under `prefix` by moving the namespace to a new
+    version. Old entries are no longer read and expire on their own. The L1 of this process is
+    cleared right away, the other workers are told through pub/sub. Returns the new version.
+
+    Meant to run after the change is committed, so a Redis outage is logged instead of raised and
+    None is returned; the entries in Redis and the other L1s then live until they expire.
+    """
+    _, version_key = get_namespace_keys(prefix)
+    version = None
+
+    try:
+        version = await redis_client.incr(version_key)
+        # After the bump, so a load racing with it can't put the old version back in the L1
+        clear_local_cache(prefix)
+        await redis_client.publish(INVALIDATION_CHANNEL, prefix)
+    except RedisError as e:
+        clear_local_cache(prefix)
+        logger.warning(f"Failed to invalidate cache {prefix}, error: {e}")
+
+    return version
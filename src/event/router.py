@@ -0,0 +1,165 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, status
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.dependencies import get_current_admin_user
+from src.database import get_db_session, get_read_db_session, get_redis_client
+from src.event.schemas import (
+    Event,
+    EventSearchResult,
+    UpdateEventRequest,
+    UpdateTicketTypeRequest,
+)
+from src.event.service import (
+    get_event_detail,
+    get_event_list,
+    search_events,
+    update_event,
+    update_ticket_type,
+)
+from src.inventory.dependencies import get_inventory
+from src.inventory.service import RedisInventory
+from src.logger import logger
+from src.models import User
+from src.schemas import (
+    BasicQueryParams,
+    CursorPaginatedDataResponse,
+    DataResponse,
+    ListDataResponse,
+    PaginatedDataResponse,
+)
+
+router = APIRouter(
+    tags=["event"],
+)
+
+
+@router.get(
+    "/v1/events",
+    response_model=PaginatedDataResponse[Event] | CursorPaginatedDataResponse[Event],
+)
+async def list_events(
+    params: Annotated[BasicQueryParams, Depends()],
+    session: Annotated[AsyncSession, Depends(get_read_db_session)],
+    redis_client: Annotated[Redis, Depends(get_redis_client)],
+    category: Annotated[str | None, Query()] = None,
+    on_sale: Annotated[bool | None, Query()] = None,
+):
+    # Already serialized, response_model only documents it
+    body = await get_event_list(
+        session=session,
+        redis_client=redis_client,
+        params=params,
+        category=category,
+        on_sale=on_sale,
+    )
+
+    return Response(content=body, media_type="application/json")
+
+
+@router.get(
+    "/v1/events/search",
+    response_model=ListDataResponse[EventSearchResult],
+)
+async def search_event(
+    q: Annotated[str, Query(min_length=1, max_length=100, description="Name, organizer, place")],
+    session: Annotated[AsyncSession, Depends(get_read_db_session)],
+    redis_client: Annotated[Redis, Depends(get_redis_client)],
+    page: Annotated[int, Query(ge=1, le=100)] = 1,
+    page_size: Annotated[int, Query(ge=1, le=50)] = 10,
+    category: Annotated[str | None, Query()] = None,
+):
+    body = await search_events(
+        session=session,
+        redis_client=redis_client,
+        q=q,
+        page=page,
+        page_size=page_size,
+        category=category,
+    )
+
+    return Response(content=body, media_type="application/json")
+
+
+@router.get(
+    "/v1/events/{event_id}",
+    response_model=DataResponse[Event],
+)
+async def get_event(
+    event_id: int,
+    session: Annotated[AsyncSession, Depends(get_read_db_session)],
+    redis_client: Annotated[Redis, Depends(get_redis_client)],
+):
+    body = await get_event_detail(session=session, redis_client=redis_client, event_id=event_id)
+
+    return Response(content=body, media_type="application/json")
+
+
+@router.patch(
+    "/v1/events/{event_id}",
+    response_model=DataResponse[Event],
+)
+async def patch_event(
+    event_id: int,
+    event_data: Annotated[UpdateEventRequest, Body()],
+    _: Annotated[User, Depends(get_current_admin_user)],
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    redis_client: Annotated[Redis, Depends(get_redis_client)],
+    inventory: Annotated[RedisInventory | None, Depends(get_inventory)],
+):
+    try:
+        event = await update_event(
+            session=session,
+            redis_client=redis_client,
+            event_id=event_id,
+            event_data=event_data,
+            inventory=inventory,
+        )
+
+        return DataResponse(data=event)
+
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Update Event Error: {str(e)}",
+        ) from e
+
+
+@router.patch(
+    "/v1/events/{event_id}/ticket-types/{ticket_type_id}",
+    response_model=DataResponse[Event],
+)
+async def patch_ticket_type(
+    event_id: int,
+    ticket_type_id: int,
+    ticket_type_data: Annotated[UpdateTicketTypeRequest, Body()],
+    _: Annotated[User, Depends(get_current_admin_user)],
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    redis_client: Annotated[Redis, Depends(get_redis_client)],
+    inventory: Annotated[RedisInventory | None, Depends(get_inventory)],
+):
+    try:
+        event = await update_ticket_type(
+            session=session,
+            redis_client=redis_client,
+            event_id=event_id,
+            ticket_type_id=ticket_type_id,
+            ticket_type_data=ticket_type_data,
+            inventory=inventory,
+        )
+
+        return DataResponse(data=event)
+
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Update Ticket Type Error: {str(e)}",
+        ) from e
@@ -0,0 +1,89 @@
+from datetime import date, datetime, time
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class EventPicture(BaseModel):
+    picture_id: int
+    picture_url: str | None
+    picture_order: int | None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TicketType(BaseModel):
+    ticket_type_id: int
+    ticket_name: str
+    price: float
+    max_purchase_limit: int | None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class Event(BaseModel):
+    event_id: int
+    event_name: str
+    description: str | None
+    event_date: date
+    event_time: time
+    sale_time: datetime
+    sale_end_time: datetime | None
+    location: str
+    address: str
+    organizer: str
+    category: str
+    on_sale: bool
+    pictures: list[EventPicture]
+    ticket_types: list[TicketType]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class EventSearchResult(BaseModel):
+    event_id: int
+    event_name: str
+    event_date: date
+    event_time: time
+    location: str
+    organizer: str
+    category: str
+    on_sale: bool
+    rank: float
+    name_headline: str = Field(..., description="event_name with the matches in <mark>")
+    description_headline: str | None = Field(
+        None, description="Fragments of the description around the matches"
+    )
+
+
+class UpdateEventRequest(BaseModel):
+    event_name: str | None = None
+    description: str | None = None
+    event_date: date | None = None
+    event_time: time | None = None
+    sale_time: datetime | None = None
+    sale_end_time: datetime | None = None
+    location: str | None = None
+    address: str | None = None
+    organizer: str | None = None
+    category: str | None = None
+    on_sale: bool | None = None
+    is_deleted: bool | None = None
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {"event_name": "2030 跨年演唱會", "on_sale": True},
+        }
+    }
+
+
+class UpdateTicketTypeRequest(BaseModel):
+    ticket_name: str | None = None
+    price: float | None = Field(None, ge=0)
+    max_purchase_limit: int | None = Field(None, gt=0)
+    stock: int | None = Field(None, ge=0)
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {"price": 2800, "stock": 500},
+        }
+    }
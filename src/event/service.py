@@ -0,0 +1,422 @@
+import math
+import re
+
+import orjson
+from fastapi import HTTPException, status
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import func, literal, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from src.config import settings
+from src.decorator import invalidate_redis_cache, redis_cache
+from src.event.schemas import Event as EventSchema
+from src.event.schemas import EventSearchResult, UpdateEventRequest, UpdateTicketTypeRequest
+from src.inventory.service import RedisInventory, close_event_inventory, open_event_inventory
+from src.logger import logger
+from src.models import Event, EventTicketType
+from src.pagination import apply_sort, encode_cursor, get_total_count
+from src.schemas import (
+    BasicQueryParams,
+    CursorPaginatedDataResponse,
+    ListDataResponse,
+    PaginatedDataResponse,
+)
+from src.waiting_room.service import WaitingRoom
+
+EVENT_LIST_CACHE_PREFIX = "event_list"
+EVENT_DETAIL_CACHE_PREFIX = "event_detail"
+EVENT_SEARCH_CACHE_PREFIX = "event_search"
+SEARCH_HEADLINE_OPTIONS = (
+    "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MinWords=5, MaxWords=20"
+)
+
+# Whether pg_trgm is installed, checked once per process
+trigram_available: bool | None = None
+
+
+def event_catalogue_query(include_deleted: bool = False):
+    """Events with their pictures and ticket types joined in, so one statement loads a page."""
+    catalogue_query = select(Event).options(
+        joinedload(Event.pictures), joinedload(Event.ticket_types)
+    )
+    if not include_deleted:
+        catalogue_query = catalogue_query.where(Event.is_deleted.is_(False))
+
+    return catalogue_query
+
+
+def get_event_filters(category: str | None = None, on_sale: bool | None = None) -> list:
+    filters = []
+    if category is not None:
+        filters.append(Event.category == category)
+    if on_sale is not None:
+        filters.append(Event.on_sale.is_(on_sale))
+
+    return filters
+
+
+def event_list_query(
+    params: BasicQueryParams, category: str | None = None, on_sale: bool | None = None
+):
+    """The statement of one catalogue page, with the total as a window function when the exact
+    count of an offset page is asked for."""
+    list_query = event_catalogue_query().where(*get_event_filters(category, on_sale))
+    if params.get_count_mode() == "exact" and not params.use_cursor():
+        list_query = list_query.add_columns(func.count().over().label("total_count"))
+
+    return apply_sort(list_query, params, getattr(Event, params.sort_by), Event.event_id)
+
+
+async def query_event_list(
+    session: AsyncSession,
+    params: BasicQueryParams,
+    category: str | None = None,
+    on_sale: bool | None = None,
+) -> dict:
+    """One page of the catalogue, uncached.
+
+    With an exact count the total is a window function over the same filtered rows, so the
+    page, its total and every picture and ticket type come back in a single round trip. In
+    cursor mode the page starts after the cursor through a (sort column, event_id) index, so
+    deep pages cost the same as the first one.
+    """
+    count_in_window = params.get_count_mode() == "exact" and not params.use_cursor()
+
+    rows = (await session.execute(event_list_query(params, category, on_sale))).unique().all()
+    events = [row.Event for row in rows]
+    count_query = select(Event.event_id).where(
+        Event.is_deleted.is_(False), *get_event_filters(category, on_sale)
+    )
+
+    if params.use_cursor():
+        next_cursor = None
+        if len(events) > params.page_size:
+            events = events[: params.page_size]
+            next_cursor = encode_cursor(
+                params, getattr(events[-1], params.sort_by), events[-1].event_id
+            )
+
+        return CursorPaginatedDataResponse[EventSchema](
+            next_cursor=next_cursor,
+            total_count=await get_total_count(session, params, count_query),
+            data=[EventSchema.model_validate(event) for event in events],
+        ).model_dump(mode="json")
+
+    if count_in_window and rows:
+        total_count = rows[0].total_count
+    else:
+        # Estimated, or past the last page where the window function has nothing to count
+        total_count = await get_total_count(session, params, count_query)
+
+    return PaginatedDataResponse[EventSchema](
+        total_count=total_count,
+        total_pages=math.ceil(total_count / params.page_size),
+        current_page=params.page,
+        data=[EventSchema.model_validate(event) for event in events],
+    ).model_dump(mode="json")
+
+
+async def query_event_detail(
+    session: AsyncSession, event_id: int, include_deleted: bool = False
+) -> dict:
+    detail_query = event_catalogue_query(include_deleted).where(Event.event_id == event_id)
+
+    event = (await session.execute(detail_query)).unique().scalar_one_or_none()
+
+    if event is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+
+    return EventSchema.model_validate(event).model_dump(mode="json")
+
+
+def catalogue_cache(prefix: str):
+    """Redis cache with an in-process L1 in front, invalidated across workers by pub/sub.
+
+    Cached functions return the serialized response body, so a hit is sent as it is, with no
+    decoding, response model validation or re-encoding.
+    """
+    return redis_cache(
+        prefix=prefix,
+        raw=True,
+        expiration=settings.EVENT_CACHE_REDIS_TTL_SECONDS,
+        local_ttl=settings.EVENT_CACHE_LOCAL_TTL_SECONDS,
+        local_max_size=settings.EVENT_CACHE_MAX_SIZE,
+        local_max_bytes=settings.EVENT_CACHE_MAX_BYTES,
+    )
+
+
+@catalogue_cache(EVENT_LIST_CACHE_PREFIX)
+async def get_event_list(
+    session: AsyncSession,
+    redis_client: Redis,
+    params: BasicQueryParams,
+    category: str | None = None,
+    on_sale: bool | None = None,
+) -> bytes:
+    """JSON body of a catalogue page."""
+    return orjson.dumps(
+        await query_event_list(session=session, params=params, category=category, on_sale=on_sale)
+    )
+
+
+@catalogue_cache(EVENT_DETAIL_CACHE_PREFIX)
+async def get_event_detail(session: AsyncSession, redis_client: Redis, event_id: int) -> bytes:
+    """JSON body of an event, as a `DataResponse`."""
+    return orjson.dumps({"data": await query_event_detail(session=session, event_id=event_id)})
+
+
+def normalize_search_query(q: str) -> str:
+    """Lowercased words of a search, so that "Taipei  Arena" and "taipei arena" share a cache
+    entry."""
+    return " ".join(re.findall(r"\w+", q.lower())[: settings.EVENT_SEARCH_MAX_WORDS])
+
+
+async def is_trigram_available(session: AsyncSession) -> bool:
+    global trigram_available
+
+    if trigram_available is None:
+        trigram_available = await session.scalar(
+            text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+        )
+
+    return trigram_available
+
+
+def event_search_query(q: str, page: int, page_size: int, category: str | None = None):
+    """Events matching every word of `q`, the last one as a prefix of a word being typed, best
+    ranked first.
+
+    The page is picked from the GIN index on `search_vector` first; headlines are only built for
+    the rows of that page, ts_headline re-parses the text and is the expensive part. Only the
+    last word is a prefix because prefix lookups walk a range of the index.
+    """
+    ts_query = func.to_tsquery("simple", " & ".join(q.split()) + ":*")
+    rank = func.ts_rank_cd(Event.search_vector, ts_query)
+
+    matches = (
+        select(Event.event_id, rank.label("rank"))
+        .where(
+            Event.is_deleted.is_(False),
+            Event.search_vector.op("@@")(ts_query),
+            *get_event_filters(category),
+        )
+        .order_by(rank.desc(), Event.event_id)
+        .limit(page_size)
+        .offset((page - 1) * page_size)
+        .subquery()
+    )
+
+    return (
+        select(
+            Event,
+            matches.c.rank,
+            func.ts_headline("simple", Event.event_name, ts_query, SEARCH_HEADLINE_OPTIONS).label(
+                "name_headline"
+            ),
+            func.ts_headline("simple", Event.description, ts_query, SEARCH_HEADLINE_OPTIONS).label(
+                "description_headline"
+            ),
+        )
+        .join(matches, matches.c.event_id == Event.event_id)
+        .order_by(matches.c.rank.desc(), Event.event_id)
+    )
+
+
+def event_fuzzy_search_query(q: str, page_size: int, category: str | None = None):
+    """Events whose name is similar to `q`, for misspellings the full-text search can't match.
+    Needs pg_trgm, served by the trigram index on event_name."""
+    similarity = func.similarity(Event.event_name, q)
+
+    return (
+        select(
+            Event,
+            similarity.label("rank"),
+            Event.event_name.label("name_headline"),
+            literal(None).label("description_headline"),
+        )
+        .where(
+            Event.is_deleted.is_(False),
+            Event.event_name.op("%")(q),
+            similarity >= settings.EVENT_SEARCH_FUZZY_THRESHOLD,
+            *get_event_filters(category),
+        )
+        .order_by(similarity.desc(), Event.event_id)
+        .limit(page_size)
+    )
+
+
+async def query_event_search(
+    session: AsyncSession, q: str, page: int, page_size: int, category: str | None = None
+) -> dict:
+    """Ranked and highlighted search results, uncached. `q` is a normalized search query.
+
+    A first page without full-text matches falls back to a fuzzy match on the event name when
+    pg_trgm is installed.
+    """
+    rows = []
+    if q:
+        search_query = event_search_query(q, page, page_size, category)
+        rows = (await session.execute(search_query)).all()
+
+        if not rows and page == 1 and await is_trigram_available(session):
+            fuzzy_query = event_fuzzy_search_query(q, page_size, category)
+            rows = (await session.execute(fuzzy_query)).all()
+
+    results = [
+        EventSearchResult(
+            event_id=row.Event.event_id,
+            event_name=row.Event.event_name,
+            event_date=row.Event.event_date,
+            event_time=row.Event.event_time,
+            location=row.Event.location,
+            organizer=row.Event.organizer,
+            category=row.Event.category,
+            on_sale=row.Event.on_sale,
+            rank=row.rank,
+            name_headline=row.name_headline,
+            description_headline=row.description_headline,
+        )
+        for row in rows
+    ]
+
+    return ListDataResponse[EventSearchResult](data=results).model_dump(mode="json")
+
+
+@catalogue_cache(EVENT_SEARCH_CACHE_PREFIX)
+async def get_event_search(
+    session: AsyncSession,
+    redis_client: Redis,
+    q: str,
+    page: int,
+    page_size: int,
+    category: str | None = None,
+) -> bytes:
+    """JSON body of a page of search results."""
+    return orjson.dumps(
+        await query_event_search(
+            session=session, q=q, page=page, page_size=page_size, category=category
+        )
+    )
+
+
+async def search_events(
+    session: AsyncSession,
+    redis_client: Redis,
+    q: str,
+    page: int = 1,
+    page_size: int = 10,
+    category: str | None = None,
+) -> bytes:
+    """Search the catalogue. Results are cached like catalogue pages, popular searches are
+    served from the in-process L1 and the rest from Redis."""
+    return await get_event_search(
+        session=session,
+        redis_client=redis_client,
+        q=normalize_search_query(q),
+        page=page,
+        page_size=page_size,
+        category=category,
+    )
+
+
+async def invalidate_event_cache(redis_client: Redis) -> None:
+    """Drop every cached catalogue page, event detail and search, in every worker. Call it after
+    the commit, a read in between would cache the old rows again.
+
+    Admin writes are rare next to catalogue reads, so everything is dropped instead of working out
+    which pages an event appears on.
+    """
+    await invalidate_redis_cache(redis_client, EVENT_LIST_CACHE_PREFIX)
+    await invalidate_redis_cache(redis_client, EVENT_DETAIL_CACHE_PREFIX)
+    await invalidate_redis_cache(redis_client, EVENT_SEARCH_CACHE_PREFIX)
+
+
+async def update_event(
+    session: AsyncSession,
+    redis_client: Redis,
+    event_id: int,
+    event_data: UpdateEventRequest,
+    inventory: RedisInventory | None = None,
+) -> dict:
+    """Update an event and invalidate the catalogue.
+
+    In redis inventory mode, putting the event on or off sale also loads or flushes and unloads
+    its counters. Taking it off sale or deleting it closes its waiting room.
+    """
+    values = event_data.model_dump(exclude_unset=True)
+    sale_closed = values.get("on_sale") is False or values.get("is_deleted") is True
+    on_sale = values.pop("on_sale", None) if inventory is not None else None
+
+    try:
+        if values:
+            update_query = update(Event).where(Event.event_id == event_id).values(values)
+            result = await session.execute(update_query)
+            if result.rowcount == 0:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+            await session.commit()
+            await invalidate_event_cache(redis_client)
+
+        # Both commit the on_sale flag before touching the counters
+        if on_sale is True:
+            await open_event_inventory(session=session, inventory=inventory, event_id=event_id)
+            await invalidate_event_cache(redis_client)
+        elif on_sale is False:
+            await close_event_inventory(session=session, inventory=inventory, event_id=event_id)
+            await invalidate_event_cache(redis_client)
+
+    except Exception as e:
+        await session.rollback()
+        raise e
+
+    if sale_closed:
+        try:
+            await WaitingRoom(redis_client).close(event_id)
+        except RedisError as e:
+            logger.warning(f"Failed to close the waiting room of event {event_id}, error: {e}")
+
+    return await query_event_detail(session=session, event_id=event_id, include_deleted=True)
+
+
+async def update_ticket_type(
+    session: AsyncSession,
+    redis_client: Redis,
+    event_id: int,
+    ticket_type_id: int,
+    ticket_type_data: UpdateTicketTypeRequest,
+    inventory: RedisInventory | None = None,
+) -> dict:
+    """Update a ticket type and invalidate the catalogue.
+
+    In redis inventory mode the live counters of an on-sale ticket type are reconciled, so new
+    stock or a new purchase limit applies immediately without losing reservations in flight.
+    """
+    values = ticket_type_data.model_dump(exclude_unset=True)
+
+    try:
+        if values:
+            update_query = (
+                update(EventTicketType)
+                .where(
+                    EventTicketType.ticket_type_id == ticket_type_id,
+                    EventTicketType.event_id == event_id,
+                )
+                .values(values)
+            )
+            result = await session.execute(update_query)
+            if result.rowcount == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Ticket type not found"
+                )
+            await session.commit()
+            await invalidate_event_cache(redis_client)
+
+        if inventory is not None:
+            await inventory.reconcile(session=session, ticket_type_ids=[ticket_type_id])
+
+    except Exception as e:
+        await session.rollback()
+        raise e
+
+    return await query_event_detail(session=session, event_id=event_id, include_deleted=True)
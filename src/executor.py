@@ -0,0 +1,100 @@
+import asyncio
+import os
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any
+
+from fastapi import HTTPException, status
+
+from src.config import settings
+
+
+class BoundedExecutor:
+    """Application-wide pool for CPU-bound work (bcrypt, encryption).
+
+    At most `max_workers` jobs run at once and at most `max_pending` more wait for a worker;
+    beyond that the job is refused with a 503 instead of queueing without bound and starving
+    the event loop.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, kind: str = "thread"):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.kind = kind
+        self.in_flight = 0
+        self.rejected = 0
+
+        if kind == "process":
+            self.executor: Executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cpu")
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        # Only touched from the event loop thread, so no lock is needed
+        if self.in_flight >= self.max_workers + self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry later",
+                headers={"Retry-After": "1"},
+            )
+
+        loop = asyncio.get_running_loop()
+        future = self.executor.submit(func, *args)
+        self.in_flight += 1
+        # Counted until the job is done, not until the caller stops waiting: a cancelled caller's
+        # job is dropped if it hasn't started yet, but keeps its worker if it has
+        future.add_done_callback(lambda _: self.call_in_loop(loop, self.release))
+
+        return await asyncio.wrap_future(future)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+    @staticmethod
+    def call_in_loop(loop: asyncio.AbstractEventLoop, callback: Callable[[], None]) -> None:
+        # Runs on the worker thread when the job is done
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            pass  # The loop is closed, and the counter with it
+
+    def get_stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+cpu_executor: BoundedExecutor | None = None
+
+
+def init_cpu_executor() -> BoundedExecutor:
+    global cpu_executor
+
+    if cpu_executor is None:
+        cpu_executor = BoundedExecutor(
+            max_workers=settings.CPU_EXECUTOR_MAX_WORKERS or os.cpu_count() or 1,
+            max_pending=settings.CPU_EXECUTOR_MAX_PENDING,
+            kind=settings.CPU_EXECUTOR_KIND,
+        )
+
+    return cpu_executor
+
+
+def shutdown_cpu_executor() -> None:
+    global cpu_executor
+
+    if cpu_executor is not None:
+        cpu_executor.shutdown()
+        cpu_executor = None
+
+
+def get_cpu_executor() -> BoundedExecutor:
+    return init_cpu_executor()
@@ -0,0 +1,48 @@
+from importlib.util import find_spec
+
+import httpx
+
+from src.config import settings
+
+# 各供應商的 (整體逾時秒數, 最大連線數)
+PROVIDERS = {
+    "mypay": (settings.MYPAY_TIMEOUT_SECONDS, settings.MYPAY_MAX_CONNECTIONS),
+    "amego": (settings.AMEGO_TIMEOUT_SECONDS, settings.AMEGO_MAX_CONNECTIONS),
+    "mitake_sms": (settings.MITAKE_SMS_TIMEOUT_SECONDS, settings.MITAKE_SMS_MAX_CONNECTIONS),
+}
+
+http_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def create_http_client(timeout: float, max_connections: int) -> httpx.AsyncClient:
+    """Client whose connections are kept alive and reused across requests.
+
+    HTTP/2 is offered through ALPN when the h2 package is installed; peers that don't support it
+    are spoken to over HTTP/1.1.
+    """
+    return httpx.AsyncClient(
+        http2=settings.HTTP_CLIENT_HTTP2 and find_spec("h2") is not None,
+        timeout=httpx.Timeout(timeout, connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+
+
+def init_http_clients() -> dict[str, httpx.AsyncClient]:
+    for provider, (timeout, max_connections) in PROVIDERS.items():
+        if provider not in http_clients:
+            http_clients[provider] = create_http_client(timeout, max_connections)
+
+    return http_clients
+
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    return init_http_clients()[provider]
+
+
+async def close_http_clients() -> None:
+    for provider in list(http_clients):
+        await http_clients.pop(provider).aclose()
@@ -0,0 +1,10 @@
+from src.config import settings
+from src.database import get_redis_client
+from src.inventory.service import RedisInventory
+
+
+async def get_inventory() -> RedisInventory | None:
+    if settings.INVENTORY_MODE != "redis":
+        return None
+
+    return RedisInventory(await get_redis_client())
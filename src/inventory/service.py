@@ -0,0 +1,394 @@
+import time
+import uuid
+
+from redis.asyncio import Redis
+from sqlalchemy import Integer, literal_column, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from src.config import settings
+from src.constants import ACTIVE_RESERVATION_STATUSES
+from src.models import SYNCED_QUANTITY_TARGET_SQL, Event, EventTicketType, TicketReservation
+
+# Return codes of RESERVE_SCRIPT / RELEASE_SCRIPT, successful calls return the new stock (>= 0)
+NOT_ENOUGH_STOCK = -1
+NOT_LOADED = -2
+LIMIT_EXCEEDED = -3
+WRONG_EVENT = -4
+
+# Every script gets the keys of `RedisInventory.get_keys`: stock hash, held hash, pending, releasing
+# and settled sorted sets. Tokens are "user_id:quantity:unique".
+
+# ARGV: quantity, user_id, event_id ('' to skip the check), token, now
+RESERVE_SCRIPT = """
+local stock = redis.call('HGET', KEYS[1], 'stock')
+if not stock then
+    return -2
+end
+if ARGV[3] ~= '' and redis.call('HGET', KEYS[1], 'event_id') ~= ARGV[3] then
+    return -4
+end
+local quantity = tonumber(ARGV[1])
+if tonumber(stock) < quantity then
+    return -1
+end
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit'))
+if limit >= 0 then
+    local held = tonumber(redis.call('HGET', KEYS[2], ARGV[2]) or '0')
+    if held + quantity > limit then
+        return -3
+    end
+    redis.call('HINCRBY', KEYS[2], ARGV[2], quantity)
+end
+redis.call('ZADD', KEYS[3], ARGV[5], ARGV[4])
+return redis.call('HINCRBY', KEYS[1], 'stock', -quantity)
+"""
+
+# ARGV: token
+SETTLE_SCRIPT = """
+if redis.call('ZREM', KEYS[3], ARGV[1]) == 1 and redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('ZADD', KEYS[5], redis.call('HINCRBY', KEYS[1], 'seq', 1), ARGV[1])
+end
+return 1
+"""
+
+# Gives back the tickets of a pending (ARGV[1] = 3) or releasing (ARGV[1] = 4) token
+# ARGV: set, token
+GIVE_BACK_SCRIPT = """
+if redis.call('ZREM', KEYS[tonumber(ARGV[1])], ARGV[2]) == 0
+    or redis.call('EXISTS', KEYS[1]) == 0 then
+    return -2
+end
+local user, quantity = string.match(ARGV[2], '^(%d+):(%d+):')
+quantity = tonumber(quantity)
+if tonumber(redis.call('HGET', KEYS[1], 'limit')) >= 0
+    and redis.call('HINCRBY', KEYS[2], user, -quantity) <= 0 then
+    redis.call('HDEL', KEYS[2], user)
+end
+return redis.call('HINCRBY', KEYS[1], 'stock', quantity)
+"""
+
+# ARGV: epoch, seq, min_time, event_id, stock, limit, user_id, held, user_id, held, ...
+RECONCILE_SCRIPT = """
+if (redis.call('HGET', KEYS[1], 'epoch') or '0') ~= ARGV[1] then
+    return 0
+end
+-- Older tokens belong to requests that crashed between their Redis and Postgres steps
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', '(' .. ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[4], '-inf', '(' .. ARGV[3])
+-- Settled before Postgres was read, so counted by it
+redis.call('ZREMRANGEBYSCORE', KEYS[5], '-inf', ARGV[2])
+local stock = tonumber(ARGV[5])
+local held = {}
+for i = 7, #ARGV, 2 do
+    held[ARGV[i]] = tonumber(ARGV[i + 1])
+end
+for i = 3, 5 do
+    for _, token in ipairs(redis.call('ZRANGE', KEYS[i], 0, -1)) do
+        local user, quantity = string.match(token, '^(%d+):(%d+):')
+        stock = stock - tonumber(quantity)
+        held[user] = (held[user] or 0) + tonumber(quantity)
+    end
+end
+redis.call('DEL', KEYS[2])
+redis.call(
+    'HSET', KEYS[1], 'event_id', ARGV[4], 'stock', stock, 'limit', ARGV[6],
+    'epoch', tonumber(ARGV[1]) + 1
+)
+if tonumber(ARGV[6]) >= 0 then
+    for user, quantity in pairs(held) do
+        if quantity > 0 then
+            redis.call('HSET', KEYS[2], user, quantity)
+        end
+    end
+end
+return 1
+"""
+
+# 尚未反映到 event_ticket_types.stock 的張數 (正數代表 stock 需要再扣)
+unsynced_quantity = literal_column(
+    f"({SYNCED_QUANTITY_TARGET_SQL}) - synced_quantity", type_=Integer
+)
+# Must stay textually equal to the predicate of ix_ticket_reservations_unsynced
+unsynced_filter = literal_column(f"synced_quantity <> {SYNCED_QUANTITY_TARGET_SQL}")
+
+
+class RedisInventory:
+    """Live ticket stock kept in Redis while an event is on sale.
+
+    Every reservation is admitted by a Lua script against the counters, so the hot
+    `event_ticket_types` row is never touched on the purchase path. The reservation rows are
+    still written to Postgres and are the source of truth: `flush_inventory` writes the stock
+    changes behind in batches and `reconcile` rebuilds the counters from them.
+
+    Redis and Postgres are not updated atomically, so every change between the two steps is
+    tracked by a token: an acquisition is pending until its reservation is committed
+    (`settle`) or given back (`cancel`), a release is releasing from before its commit until it
+    is applied (`release`). `reconcile` takes the tokens still open into account, so it can run
+    at any time next to live traffic, and treats the ones older than
+    `INVENTORY_PENDING_TIMEOUT_SECONDS` as left by a crash.
+    """
+
+    def __init__(self, redis_client: Redis):
+        self.redis_client = redis_client
+        self.reserve_script = redis_client.register_script(RESERVE_SCRIPT)
+        self.settle_script = redis_client.register_script(SETTLE_SCRIPT)
+        self.give_back_script = redis_client.register_script(GIVE_BACK_SCRIPT)
+        self.reconcile_script = redis_client.register_script(RECONCILE_SCRIPT)
+
+    @staticmethod
+    def get_keys(ticket_type_id: int) -> list[str]:
+        # Hash tag keeps all keys in the same cluster slot for the scripts
+        prefix = f"inventory:{{{ticket_type_id}}}"
+        return [
+            prefix,
+            f"{prefix}:held",
+            f"{prefix}:pending",
+            f"{prefix}:releasing",
+            f"{prefix}:settled",
+        ]
+
+    @staticmethod
+    def create_token(user_id: int, quantity: int) -> str:
+        return f"{user_id}:{quantity}:{uuid.uuid4().hex}"
+
+    async def acquire(
+        self, ticket_type_id: int, user_id: int, quantity: int, event_id: int | None = None
+    ) -> tuple[int, str]:
+        """Take the tickets off the counter. Returns the new stock (or an error code) and the
+        token to `settle` once the reservation is committed, or to `cancel` if it isn't."""
+        token = self.create_token(user_id, quantity)
+        remaining = await self.reserve_script(
+            keys=self.get_keys(ticket_type_id),
+            args=[quantity, user_id, "" if event_id is None else event_id, token, time.time()],
+        )
+        return remaining, token
+
+    async def settle(self, ticket_type_id: int, token: str) -> None:
+        await self.settle_script(keys=self.get_keys(ticket_type_id), args=[token])
+
+    async def cancel(self, ticket_type_id: int, token: str) -> int:
+        return await self.give_back_script(keys=self.get_keys(ticket_type_id), args=[3, token])
+
+    async def begin_release(self, rows: list[tuple[int, int, int]]) -> list[str]:
+        """Mark (ticket_type_id, user_id, quantity) releases before they are committed."""
+        tokens = [self.create_token(user_id, quantity) for _, user_id, quantity in rows]
+        now = time.time()
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for (ticket_type_id, _, _), token in zip(rows, tokens, strict=True):
+                pipe.zadd(self.get_keys(ticket_type_id)[3], {token: now})
+            await pipe.execute()
+        return tokens
+
+    async def abort_release(self, ticket_type_ids: list[int], tokens: list[str]) -> None:
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for ticket_type_id, token in zip(ticket_type_ids, tokens, strict=True):
+                pipe.zrem(self.get_keys(ticket_type_id)[3], token)
+            await pipe.execute()
+
+    async def release(self, ticket_type_id: int, token: str) -> int:
+        """Give the tickets of a committed release back to the counter."""
+        return await self.give_back_script(keys=self.get_keys(ticket_type_id), args=[4, token])
+
+    async def get_stock(self, ticket_type_id: int) -> int | None:
+        stock = await self.redis_client.hget(self.get_keys(ticket_type_id)[0], "stock")
+        return None if stock is None else int(stock)
+
+    async def unload(self, ticket_type_ids: list[int]) -> None:
+        keys = [key for ticket_type_id in ticket_type_ids for key in self.get_keys(ticket_type_id)]
+        if keys:
+            await self.redis_client.delete(*keys)
+
+    async def reconcile(
+        self, session: AsyncSession, ticket_type_ids: list[int] | None = None
+    ) -> list[int]:
+        """Rebuild the counters of on-sale ticket types from Postgres, creating missing ones.
+
+        Live stock is the capacity minus the live reservations, i.e. the stock column minus the
+        reservations that have not been written behind yet; the tokens still open are taken off
+        it. Safe on every startup, periodically and while reservations are in flight; drift left
+        by a crash (stock taken in Redis for a reservation never inserted, or a committed release
+        never given back) is repaired. Returns the ticket types that were reconciled.
+        """
+        on_sale_query = (
+            select(EventTicketType.ticket_type_id)
+            .join(Event, Event.event_id == EventTicketType.event_id)
+            .where(Event.on_sale.is_(True), Event.is_deleted.is_(False))
+        )
+        if ticket_type_ids is not None:
+            on_sale_query = on_sale_query.where(EventTicketType.ticket_type_id.in_(ticket_type_ids))
+        ticket_type_ids = (await session.scalars(on_sale_query)).all()
+        await session.commit()
+
+        if not ticket_type_ids:
+            return []
+
+        # Read before Postgres is: whatever settled up to here is part of the snapshot below
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for ticket_type_id in ticket_type_ids:
+                pipe.hmget(self.get_keys(ticket_type_id)[0], "epoch", "seq")
+            versions = dict(zip(ticket_type_ids, await pipe.execute(), strict=True))
+
+        # Stock and holdings from one snapshot
+        await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+        pending_stock = (
+            select(
+                TicketReservation.ticket_type_id,
+                func.sum(unsynced_quantity).label("quantity"),
+            )
+            .where(unsynced_filter)
+            .group_by(TicketReservation.ticket_type_id)
+            .subquery()
+        )
+
+        stock_query = (
+            select(
+                EventTicketType.ticket_type_id,
+                EventTicketType.event_id,
+                EventTicketType.stock - func.coalesce(pending_stock.c.quantity, 0),
+                EventTicketType.max_purchase_limit,
+            )
+            .outerjoin(
+                pending_stock, pending_stock.c.ticket_type_id == EventTicketType.ticket_type_id
+            )
+            .where(EventTicketType.ticket_type_id.in_(ticket_type_ids))
+        )
+        stock_rows = (await session.execute(stock_query)).all()
+
+        # Per-user holdings are only needed where max_purchase_limit has to be enforced
+        limited_ids = [row[0] for row in stock_rows if row[3] is not None]
+        held = {ticket_type_id: [] for ticket_type_id in limited_ids}
+
+        if limited_ids:
+            held_query = (
+                select(
+                    TicketReservation.ticket_type_id,
+                    TicketReservation.user_id,
+                    func.sum(TicketReservation.quantity),
+                )
+                .where(
+                    TicketReservation.ticket_type_id.in_(limited_ids),
+                    TicketReservation.status.in_(ACTIVE_RESERVATION_STATUSES),
+                )
+                .group_by(TicketReservation.ticket_type_id, TicketReservation.user_id)
+            )
+            for ticket_type_id, user_id, quantity in await session.execute(held_query):
+                held[ticket_type_id].extend([user_id, quantity])
+
+        await session.commit()
+
+        min_time = time.time() - settings.INVENTORY_PENDING_TIMEOUT_SECONDS
+        reconciled = []
+        for ticket_type_id, event_id, stock, max_purchase_limit in stock_rows:
+            epoch, seq = versions[ticket_type_id]
+            limit = -1 if max_purchase_limit is None else max_purchase_limit
+            # Skipped if another reconcile applied in between, it used newer numbers
+            if await self.reconcile_script(
+                keys=self.get_keys(ticket_type_id),
+                args=[
+                    epoch or 0,
+                    seq or 0,
+                    min_time,
+                    event_id,
+                    stock,
+                    limit,
+                    *held.get(ticket_type_id, []),
+                ],
+            ):
+                reconciled.append(ticket_type_id)
+
+        return reconciled
+
+
+async def flush_inventory(session: AsyncSession, batch_size: int | None = None) -> int:
+    """Write the stock changes of up to `batch_size` reservations behind to Postgres.
+
+    Each reservation's `synced_quantity` is moved to what it should be (its quantity while
+    active, 0 once released) and the difference is applied to `event_ticket_types.stock` as one
+    UPDATE per ticket type, in a single statement. Returns the number of reservations synced.
+    """
+    batch_size = batch_size or settings.INVENTORY_FLUSH_BATCH_SIZE
+
+    pending = (
+        select(
+            TicketReservation.reservation_id,
+            TicketReservation.ticket_type_id,
+            unsynced_quantity.label("quantity"),
+        )
+        .where(unsynced_filter)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .cte("pending")
+    )
+
+    synced = (
+        update(TicketReservation)
+        .where(TicketReservation.reservation_id == pending.c.reservation_id)
+        .values(synced_quantity=TicketReservation.synced_quantity + pending.c.quantity)
+        .returning(pending.c.ticket_type_id, pending.c.quantity)
+        .cte("synced")
+    )
+
+    totals = (
+        select(
+            synced.c.ticket_type_id,
+            func.count().label("reservations"),
+            func.sum(synced.c.quantity).label("quantity"),
+        )
+        .group_by(synced.c.ticket_type_id)
+        .cte("totals")
+    )
+
+    flush_query = (
+        update(EventTicketType)
+        .where(EventTicketType.ticket_type_id == totals.c.ticket_type_id)
+        .values(stock=EventTicketType.stock - totals.c.quantity)
+        .add_cte(pending)
+        .add_cte(synced)
+        .add_cte(totals)
+        .returning(totals.c.reservations)
+        .execution_options(synchronize_session=False)
+    )
+
+    result = await session.execute(flush_query)
+    flushed = sum(result.scalars().all())
+
+    await session.commit()
+
+    return flushed
+
+
+async def open_event_inventory(
+    session: AsyncSession, inventory: RedisInventory, event_id: int
+) -> list[int]:
+    """Put an event on sale and load its ticket types into Redis."""
+    await session.execute(update(Event).where(Event.event_id == event_id).values(on_sale=True))
+    await session.commit()
+
+    ticket_type_ids = (
+        await session.scalars(
+            select(EventTicketType.ticket_type_id).where(EventTicketType.event_id == event_id)
+        )
+    ).all()
+
+    return await inventory.reconcile(session=session, ticket_type_ids=ticket_type_ids)
+
+
+async def close_event_inventory(
+    session: AsyncSession, inventory: RedisInventory, event_id: int
+) -> None:
+    """Take an event off sale, write every pending change behind and drop its counters."""
+    await session.execute(update(Event).where(Event.event_id == event_id).values(on_sale=False))
+    await session.commit()
+
+    while await flush_inventory(session=session):
+        pass
+
+    ticket_type_ids = (
+        await session.scalars(
+            select(EventTicketType.ticket_type_id).where(EventTicketType.event_id == event_id)
+        )
+    ).all()
+
+    await inventory.unload(ticket_type_ids)
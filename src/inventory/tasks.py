@@ -0,0 +1,47 @@
+import asyncio
+
+from src.config import settings
+from src.database import AsyncSessionLocal
+from src.inventory.service import RedisInventory, flush_inventory
+from src.logger import logger
+
+
+async def restore_inventory(inventory: RedisInventory):
+    """Crash recovery: rebuild the counters of on-sale events from the reservations."""
+    async with AsyncSessionLocal() as session:
+        reconciled = await inventory.reconcile(session=session)
+
+    if reconciled:
+        logger.info(f"[Inventory] rebuilt counters for ticket types {reconciled}")
+
+
+async def run_inventory_reconciler(inventory: RedisInventory, interval: float | None = None):
+    """Background loop that repairs drift between the Redis counters and the reservations,
+    e.g. after a worker crashed between its Redis and Postgres steps."""
+    interval = interval or settings.INVENTORY_RECONCILE_INTERVAL_SECONDS
+
+    while True:
+        await asyncio.sleep(interval)
+
+        try:
+            async with AsyncSessionLocal() as session:
+                await inventory.reconcile(session=session)
+
+        except Exception as exc:
+            logger.exception(exc)
+
+
+async def run_inventory_flusher(interval: float | None = None):
+    """Background loop that writes the Redis stock changes behind to Postgres in batches."""
+    interval = interval or settings.INVENTORY_FLUSH_INTERVAL_SECONDS
+
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                while await flush_inventory(session=session) == settings.INVENTORY_FLUSH_BATCH_SIZE:
+                    pass
+
+        except Exception as exc:
+            logger.exception(exc)
+
+        await asyncio.sleep(interval)
@@ -1,3 +1,157 @@
+import atexit
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
 import structlog
 
-logger = structlog.get_logger()
+from src.config import settings
+from src.middleware import request_scope_var
+
+APP_LOGGER = "app"
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that hands records to the writer thread untouched and never blocks.
+
+    Records are formatted by the writer thread instead of in `prepare`, and are dropped (and
+    counted) rather than waited on when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def sample_logs(logger, method_name: str, event_dict: dict) -> dict:
+    """Keep a fraction of high-volume logs: `sample=<rate>` on a call, or
+    `LOG_INFO_SAMPLE_RATE` for every debug and info log. Warnings and errors are always kept;
+    kept samples carry their `sample_rate` so counts can be scaled back up."""
+    rate = event_dict.pop("sample", None)
+    if rate is None and method_name in ("debug", "info"):
+        rate = settings.LOG_INFO_SAMPLE_RATE
+
+    if rate is not None and rate < 1 and method_name not in ("warning", "error", "critical"):
+        if random.random() >= rate:
+            raise structlog.DropEvent
+        event_dict["sample_rate"] = rate
+
+    return event_dict
+
+
+def add_request_context(logger, method_name: str, event_dict: dict) -> dict:
+    """Request id, route template and user id of the request being handled, if any.
+
+    `RequestMiddleware` binds the request's scope once, these are read from it as they become
+    known: the route once the request is routed, the user once `get_current_user` ran.
+    """
+    scope = request_scope_var.get()
+    if scope is not None:
+        state = scope.get("state", {})
+        event_dict.setdefault("request_id", state.get("request_id"))
+        route = scope.get("route")
+        if route is not None:
+            event_dict.setdefault("route", route.path_format)
+        if "user_id" in state:
+            event_dict.setdefault("user_id", state["user_id"])
+    return event_dict
+
+
+def orjson_serializer(event_dict: dict, **kwargs) -> str:
+    return orjson.dumps(event_dict, default=str).decode()
+
+
+def create_renderer(log_format: str):
+    if log_format == "console":
+        return structlog.dev.ConsoleRenderer()
+    return structlog.processors.JSONRenderer(serializer=orjson_serializer)
+
+
+class LogFormatter(structlog.stdlib.ProcessorFormatter):
+    """Formatter of the writer thread. Records of the app logger were rendered by structlog
+    already; records of stdlib loggers (uvicorn, httpx, ...) are rendered the same way here."""
+
+    def __init__(self, log_format: str):
+        super().__init__(
+            processor=create_renderer(log_format),
+            foreign_pre_chain=[
+                structlog.stdlib.add_log_level,
+                structlog.stdlib.add_logger_name,
+                structlog.processors.TimeStamper(fmt="iso", utc=True),
+                structlog.processors.format_exc_info,
+            ],
+        )
+
+    def format(self, record: logging.LogRecord) -> str:
+        if record.name == APP_LOGGER:
+            return record.getMessage()
+        return super().format(record)
+
+
+def configure_logging(stream=None) -> tuple[DroppingQueueHandler, QueueListener]:
+    """Send structlog and stdlib logs through a bounded queue to a writer thread.
+
+    On the event loop a log call only runs the processors, renders the line with orjson and
+    enqueues it; the write happens on the writer thread, so a slow stdout or disk can't stall
+    requests. Rendering stays on the loop on purpose: done on the writer thread, the processors
+    hold the GIL long enough to delay the loop more than they cost on it.
+    Returns the handler and the listener, which `stop_logging` stops.
+    """
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+
+    stream_handler = logging.StreamHandler(stream or sys.stderr)
+    stream_handler.setFormatter(LogFormatter(settings.LOG_FORMAT))
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=False)
+
+    root = logging.getLogger()
+    for existing in [h for h in root.handlers if isinstance(h, DroppingQueueHandler)]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    # Libraries only get through from warnings up, httpx alone logs every request at info
+    root.setLevel(logging.WARNING)
+    logging.getLogger(APP_LOGGER).setLevel(settings.LOG_LEVEL)
+
+    structlog.configure(
+        processors=[
+            sample_logs,
+            structlog.contextvars.merge_contextvars,
+            add_request_context,
+            structlog.stdlib.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso", utc=True),
+            structlog.processors.format_exc_info,
+            create_renderer(settings.LOG_FORMAT),
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.make_filtering_bound_logger(
+            logging.getLevelName(settings.LOG_LEVEL)
+        ),
+        cache_logger_on_first_use=True,
+    )
+
+    listener.start()
+    return handler, listener
+
+
+def stop_logging() -> None:
+    """Write out what is still queued and stop the writer thread."""
+    if listener._thread is not None:
+        listener.stop()
+
+
+log_handler, listener = configure_logging()
+atexit.register(stop_logging)
+
+logger = structlog.get_logger(APP_LOGGER)
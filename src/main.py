@@ -1,14 +1,49 @@
-import time
+import asyncio
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request, status
+from fastapi import APIRouter, Depends, FastAPI, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse
 
+from src.amego.dependencies import get_invoice_client
+from src.amego.tasks import run_invoice_worker
+from src.auth.dependencies import get_current_admin_user, get_principal_cache, get_token_verifier
 from src.auth.router import router as user_router
+from src.cache import get_local_cache_stats, run_cache_invalidation_listener
 from src.config import settings
 from src.constants import DEFAULT_ERROR_RESPONSE
+from src.database import (
+    check_connection_budget,
+    close_redis_pool,
+    get_pool_stats,
+    get_redis_client,
+    get_redis_pool_stats,
+    get_replica_stats,
+    init_redis_pool,
+    replica_pool,
+    run_replica_health_checks,
+)
+from src.event.router import router as event_router
+from src.executor import init_cpu_executor, shutdown_cpu_executor
+from src.http_client import close_http_clients, init_http_clients
+from src.inventory.dependencies import get_inventory
+from src.inventory.tasks import (
+    restore_inventory,
+    run_inventory_flusher,
+    run_inventory_reconciler,
+)
 from src.logger import logger
+from src.metrics import mark_process_dead, render_metrics
+from src.middleware import RequestMiddleware
+from src.mitake_sms.dependencies import get_mitake_sms_client
+from src.mitake_sms.tasks import run_sms_dispatcher
+from src.order.router import router as order_router
+from src.reservation.router import router as reservation_router
+from src.reservation.tasks import run_reservation_sweeper
+from src.resilience import get_provider_stats
+from src.waiting_room.router import router as waiting_room_router
+from src.waiting_room.service import WaitingRoom
+from src.waiting_room.tasks import run_waiting_room_admitter
 
 
 @asynccontextmanager
@@ -17,18 +52,75 @@ async def lifespan(app: FastAPI):
         logger.info("Starting application")
     except Exception as e:
         logger.exception(f"run_migrations failed, error: {e}")
+
+    check_connection_budget()
+    init_cpu_executor()
+    init_http_clients()
+    init_redis_pool()
+    try:
+        await (await get_redis_client()).ping()
+    except Exception as e:
+        logger.warning(f"Redis is not reachable at startup, error: {e}")
+
+    background_tasks = [
+        asyncio.create_task(run_cache_invalidation_listener(await get_redis_client()))
+    ]
+    if replica_pool is not None:
+        background_tasks.append(asyncio.create_task(run_replica_health_checks()))
+
+    inventory = await get_inventory()
+
+    if inventory is not None:
+        try:
+            await restore_inventory(inventory)
+        except Exception as e:
+            # The reconciler rebuilds the counters once both are back
+            logger.warning(f"Inventory could not be restored at startup, error: {e}")
+        background_tasks.append(asyncio.create_task(run_inventory_flusher()))
+        background_tasks.append(asyncio.create_task(run_inventory_reconciler(inventory)))
+
+    background_tasks.append(asyncio.create_task(run_reservation_sweeper(inventory=inventory)))
+
+    if settings.AMEGO_INVOICE_WORKER_ENABLED and settings.AMEGO_API_BASE_URL:
+        background_tasks.append(asyncio.create_task(run_invoice_worker(get_invoice_client())))
+
+    if settings.MITAKE_SMS_DISPATCHER_ENABLED and settings.MITAKE_SMS_BULK_API_URL:
+        background_tasks.append(
+            asyncio.create_task(
+                run_sms_dispatcher(get_mitake_sms_client(), await get_redis_client())
+            )
+        )
+
+    if settings.WAITING_ROOM_ENABLED:
+        waiting_room = WaitingRoom(await get_redis_client())
+        background_tasks.append(asyncio.create_task(run_waiting_room_admitter(waiting_room)))
+
     yield
 
+    for task in background_tasks:
+        task.cancel()
+    # Let them unwind before their HTTP clients and Redis pool go away
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+    await close_http_clients()
+    await close_redis_pool()
+    if replica_pool is not None:
+        await replica_pool.dispose()
+    shutdown_cpu_executor()
+    mark_process_dead()
+
 
 app = FastAPI(
     root_path="/api",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs" if settings.MODE == "dev" else None,
     redoc_url="/redoc" if settings.MODE == "dev" else None,
     responses=DEFAULT_ERROR_RESPONSE,
 )
 
 
+# Pure ASGI middlewares only, the last one added runs first
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -38,13 +130,7 @@ app.add_middleware(
 )
 
 
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
+app.add_middleware(RequestMiddleware)
 
 
 @app.exception_handler(Exception)
@@ -60,4 +146,46 @@ async def health():
     return {"status": "ok"}
 
 
+# Pool, cache and provider stats are for operators only
+internal_router = APIRouter(
+    tags=["internal"],
+    dependencies=[Depends(get_current_admin_user)],
+)
+
+
+@internal_router.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
+
+
+@internal_router.get("/health/redis")
+async def redis_health():
+    return {"pool": get_redis_pool_stats()}
+
+
+@internal_router.get("/health/database")
+async def database_health():
+    return {"pool": get_pool_stats(), "replicas": get_replica_stats()}
+
+
+@internal_router.get("/health/cache")
+async def cache_health():
+    return {
+        "principal": (await get_principal_cache()).get_stats(),
+        "token_claims": get_token_verifier().get_stats(),
+        "local": get_local_cache_stats(),
+    }
+
+
+@internal_router.get("/health/providers")
+async def providers_health():
+    return {"providers": get_provider_stats()}
+
+
 app.include_router(user_router)
+app.include_router(event_router)
+app.include_router(reservation_router)
+app.include_router(order_router)
+app.include_router(waiting_room_router)
+app.include_router(internal_router)
@@ -0,0 +1,143 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# With several uvicorn workers, PROMETHEUS_MULTIPROC_DIR must point to an empty directory before
+# the workers start (see scripts/start.sh). Every process then writes its samples there and
+# /metrics adds them up, whichever worker answers the scrape.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# Finer than the defaults, a Redis command or an indexed query takes well under 5 ms
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests answered", ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to answer an HTTP request", ["method", "route"]
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being answered",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_seconds",
+    "Time to get a connection from the SQLAlchemy pool, opening it included",
+    ["engine"],
+    buckets=FAST_BUCKETS,
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections checked out of the SQLAlchemy pool",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_SESSIONS_REJECTED = Counter(
+    "db_sessions_rejected_total",
+    "Requests refused a database session with a 503, the pool being saturated",
+    ["engine", "reason"],
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Time to execute a statement",
+    ["engine", "operation"],
+    buckets=FAST_BUCKETS,
+)
+
+REDIS_POOL_WAIT = Histogram(
+    "redis_pool_wait_seconds",
+    "Time to get a connection from the Redis pool",
+    buckets=FAST_BUCKETS,
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Time to run a Redis command, round trip included",
+    ["command"],
+    buckets=FAST_BUCKETS,
+)
+
+PROVIDER_REQUEST_DURATION = Histogram(
+    "provider_request_duration_seconds",
+    "Time of a call to an outbound provider",
+    ["provider", "outcome"],
+)
+
+# Hit ratio: sum(rate(cache_requests_total{result="hit"})) / sum(rate(cache_requests_total))
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ["cache", "tier", "result"])
+
+
+def get_operation(statement: str) -> str:
+    words = statement[:16].split(None, 1)
+    operation = words[0].upper() if words else ""
+    return operation if operation in SQL_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> AsyncEngine:
+    """Time every statement run through `engine` and count its checked out connections.
+
+    Checkout wait is measured by the pool itself, see `InstrumentedQueuePool`.
+    """
+    sync_engine = engine.sync_engine
+    checked_out = DB_POOL_CHECKED_OUT.labels(name)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        DB_QUERY_DURATION.labels(name, get_operation(statement)).observe(
+            time.perf_counter() - start
+        )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def fail_query(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+    @event.listens_for(sync_engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out.inc()
+
+    @event.listens_for(sync_engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        checked_out.dec()
+
+    return engine
+
+
+def mark_process_dead() -> None:
+    """Drop the live gauges of this worker when it exits."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Samples in the Prometheus text format, of every worker in multiprocess mode."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,128 @@
+import time
+import uuid
+from contextvars import ContextVar
+from ipaddress import ip_address, ip_network
+
+from starlette.requests import Request
+
+from src.config import settings
+from src.metrics import (
+    HTTP_METHODS,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    HTTP_REQUESTS_IN_PROGRESS,
+)
+
+REQUEST_ID_HEADER = b"x-request-id"
+REQUEST_ID_MAX_LENGTH = 128
+
+# Id of the request being handled, for logs and outbound calls
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+# ASGI scope of the request being handled, its route and state fill in as it is processed
+request_scope_var: ContextVar[dict | None] = ContextVar("request_scope", default=None)
+
+
+def bind_request_state(**values) -> None:
+    """Set `request.state` values of the request being handled, if any, e.g. from dependencies
+    that don't take the request."""
+    scope = request_scope_var.get()
+    if scope is not None:
+        scope.setdefault("state", {}).update(values)
+
+
+def get_request_id(headers: list[tuple[bytes, bytes]]) -> str:
+    """The caller's X-Request-ID if it is a short printable ASCII string, a new one otherwise."""
+    for name, value in headers:
+        if name == REQUEST_ID_HEADER:
+            if 0 < len(value) <= REQUEST_ID_MAX_LENGTH and value.isascii():
+                request_id = value.decode()
+                if request_id.isprintable():
+                    return request_id
+            break
+
+    return uuid.uuid4().hex
+
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ip_address(host)
+    except ValueError:
+        return False
+    return any(address in ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXY_IPS)
+
+
+def get_client_ip(request: Request) -> str | None:
+    """IP of the caller. Behind `TRUSTED_PROXY_IPS` it is the last X-Forwarded-For hop that is not
+    one of them, the hops before it are whatever the caller put there."""
+    host = request.client.host if request.client else None
+    if host is None or not is_trusted_proxy(host):
+        return host
+
+    hops = [
+        hop.strip()
+        for value in request.headers.getlist("x-forwarded-for")
+        for hop in value.split(",")
+    ]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+
+    return hops[0] if hops else host
+
+
+class RequestMiddleware:
+    """Request id, timing and metrics of every HTTP request, in a single pure ASGI layer.
+
+    - X-Request-ID is taken from the request or generated, set in `request_id_var` and
+      `request.state.request_id`, and sent back on the response.
+    - Server-Timing carries the time until the response started, measured with perf_counter.
+    - Latency, status and in-flight requests are recorded in the `http_*` metrics, labelled by
+      route template (`/v1/events/{event_id}`), not by path, so the number of series stays
+      bounded; requests no route matched share the `unmatched` label.
+
+    Unlike `@app.middleware("http")` (BaseHTTPMiddleware), the app runs in the caller's task and
+    its messages are passed straight through, so streaming responses keep their backpressure and
+    a request costs no extra task or memory stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in HTTP_METHODS else "OTHER"
+        request_id = get_request_id(scope["headers"])
+        scope.setdefault("state", {})["request_id"] = request_id
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_headers(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                duration_ms = (time.perf_counter() - start) * 1000
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (REQUEST_ID_HEADER, request_id.encode()),
+                    (b"server-timing", f"app;dur={duration_ms:.2f}".encode()),
+                ]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        token = request_id_var.set(request_id)
+        scope_token = request_scope_var.set(scope)
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            duration = time.perf_counter() - start
+            request_id_var.reset(token)
+            request_scope_var.reset(scope_token)
+            in_progress.dec()
+            # Set by the router on the scope it was given, which is this one
+            route = getattr(scope.get("route"), "path_format", "unmatched")
+            HTTP_REQUEST_DURATION.labels(method, route).observe(duration)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
@@ -11,4 +11,5 @@ def get_mitake_sms_client() -> MitakeSMS:
         check_point_url=settings.MITAKE_SMS_CHECKPOINT_URL,
         username=settings.MITAKE_SMS_USERNAME,
         password=settings.MITAKE_SMS_PASSWORD,
+        bulk_api_url=settings.MITAKE_SMS_BULK_API_URL,
     )
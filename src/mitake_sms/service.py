@@ -1,16 +1,67 @@
+import asyncio
+import random
 import urllib.parse
+from datetime import timedelta
 
 import httpx
+from redis.asyncio import Redis
+from sqlalchemy import (
+    Float,
+    Integer,
+    Row,
+    String,
+    Text,
+    case,
+    cast,
+    column,
+    literal_column,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
 
+from src.config import settings
+from src.constants import CLAIMABLE_SMS_STATUSES, MITAKE_SMS_ACCEPTED_STATUS_CODES, SmsStatus
+from src.http_client import get_http_client
 from src.logger import logger
+from src.models import SmsMessage
+from src.rate_limiter import RedisRateLimiter
+from src.resilience import ProviderPolicy, get_provider_policy
+
+SMS_POINTS_KEY = "sms:points"
+
+# 每 3 個參數一列, 遠低於 asyncpg 單一語句 32767 個參數的上限
+ENQUEUE_CHUNK_SIZE = 5000
 
 
 class MitakeSMS:
-    def __init__(self, api_url: str, check_point_url: str, username: str, password: str):
+    def __init__(
+        self,
+        api_url: str,
+        check_point_url: str,
+        username: str,
+        password: str,
+        http_client: httpx.AsyncClient | None = None,
+        bulk_api_url: str = "",
+        policy: ProviderPolicy | None = None,
+    ):
         self.username = username
         self.password = password
         self.api_url = api_url
         self.check_point_url = check_point_url
+        self.bulk_api_url = bulk_api_url
+        self.policy = policy
+        self.http_client = http_client
+        self.points: int | None = None
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        return self.http_client or get_http_client("mitake_sms")
+
+    def get_policy(self) -> ProviderPolicy:
+        return self.policy or get_provider_policy("mitake_sms")
 
     async def send_sms_code(self, phone: str, sms_message: str) -> None:
         data = {
@@ -22,12 +73,13 @@ class MitakeSMS:
 
         encoded_data = urllib.parse.urlencode(data, encoding="big5")
 
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.post(
-                self.api_url,
-                data=encoded_data,
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-            )
+        response = await self.get_policy().request(
+            self.get_http_client(),
+            "POST",
+            self.api_url,
+            content=encoded_data,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
 
         if "AccountPoint=" in response.text:
             account_point = response.text.split("AccountPoint=")[-1]
@@ -42,18 +94,65 @@ class MitakeSMS:
             logger.error(f"[MitakeSMS][失敗]: error message: {response.text}")
             raise Exception(f"[MitakeSMS][失敗]: error message: {response.text}")
 
+    async def send_bulk_sms(self, messages: list[tuple[str, str, str]]) -> dict[str, dict]:
+        """Send up to 500 (client id, phone, message) in one SmBulkSend call.
+
+        Returns the fields Mitake answered for each client id (`msgid`, `statuscode`, ...), a
+        message missing from the result was not processed. Mitake ignores a client id it has
+        already received in the last 12 hours, so resending a batch never sends twice.
+        """
+        # 欄位以 $$ 分隔: ClientID$$dstaddr$$dlvtime$$vldtime$$destname$$response$$smbody
+        # 簡訊內容的換行需以 ASCII 6 表示
+        lines = [
+            f"{client_id}$${phone}$$$$$$$$$${sms_message.replace(chr(10), chr(6))}"
+            for client_id, phone, sms_message in messages
+        ]
+
+        response = await self.get_policy().request(
+            self.get_http_client(),
+            "POST",
+            self.bulk_api_url,
+            params={
+                "username": self.username,
+                "password": self.password,
+                "Encoding_PostIn": "UTF8",
+            },
+            content="\r\n".join(lines).encode("utf-8"),
+            headers={"Content-Type": "text/plain; charset=utf-8"},
+        )
+        response.raise_for_status()
+
+        results: dict[str, dict] = {}
+        fields: dict | None = None
+        for line in response.text.splitlines():
+            line = line.strip()
+            if line.startswith("[") and line.endswith("]"):
+                fields = results.setdefault(line[1:-1], {})
+            elif fields is not None and "=" in line:
+                key, value = line.split("=", 1)
+                fields[key] = value
+
+        for fields in results.values():
+            if "AccountPoint" in fields:
+                self.points = int(fields["AccountPoint"])
+
+        return results
+
     async def query_sms_points(self) -> dict:
         data = {
             "username": self.username,
             "password": self.password,
         }
 
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.post(
-                self.check_point_url,
-                params=data,
-                headers={"Content-Type": "application/json"},
-            )
+        # 查詢點數是冪等的, 慢的時候可以多送一次
+        response = await self.get_policy().request(
+            self.get_http_client(),
+            "POST",
+            self.check_point_url,
+            hedge=True,
+            params=data,
+            headers={"Content-Type": "application/json"},
+        )
 
         if "AccountPoint=" in response.text:
             account_point = response.text.split("AccountPoint=")[-1]
@@ -66,3 +165,232 @@ class MitakeSMS:
             error_msg = f"[MitakeSMS][失敗]: error message: {response.text}"
 
             return {"success": False, "message": error_msg}
+
+
+def normalize_phone(phone: str) -> str:
+    phone = "".join(c for c in phone if c.isdigit())
+    if phone.startswith("886"):
+        phone = f"0{phone[3:]}"
+    return phone
+
+
+async def enqueue_sms(session: AsyncSession, campaign: str, phones: list[str], body: str) -> int:
+    """Queue `body` to be sent to every phone by `run_sms_dispatcher`.
+
+    Phones are normalized and deduplicated, a phone already queued for `campaign` is skipped, so
+    a campaign can be queued again safely. Doesn't commit. Returns the number of new messages.
+    """
+    phones = list(dict.fromkeys(normalize_phone(phone) for phone in phones))
+    queued = 0
+
+    for start in range(0, len(phones), ENQUEUE_CHUNK_SIZE):
+        query = (
+            insert(SmsMessage)
+            .values(
+                [
+                    {"campaign": campaign, "phone": phone, "body": body}
+                    for phone in phones[start : start + ENQUEUE_CHUNK_SIZE]
+                ]
+            )
+            .on_conflict_do_nothing(constraint="uq_sms_messages_campaign_phone")
+            .returning(SmsMessage.message_id)
+        )
+        queued += len((await session.execute(query)).all())
+
+    return queued
+
+
+async def get_sms_points(redis_client: Redis, mitake_sms: MitakeSMS) -> int | None:
+    """Remaining AccountPoint balance, queried from Mitake at most every
+    `MITAKE_SMS_POINTS_CACHE_SECONDS`; every send also refreshes it."""
+    cached = await redis_client.get(SMS_POINTS_KEY)
+    if cached is not None:
+        return int(cached)
+
+    result = await mitake_sms.query_sms_points()
+    if not result["success"]:
+        logger.error(result["message"])
+        return None
+
+    await store_sms_points(redis_client, result["points"])
+    return result["points"]
+
+
+async def store_sms_points(redis_client: Redis, points: int) -> None:
+    await redis_client.set(SMS_POINTS_KEY, points, ex=settings.MITAKE_SMS_POINTS_CACHE_SECONDS)
+
+
+async def claim_sms_messages(session: AsyncSession, batch_size: int) -> list[Row]:
+    """Take up to `batch_size` due messages and lease them for `MITAKE_SMS_LEASE_SECONDS`.
+
+    `FOR UPDATE SKIP LOCKED` lets every worker claim concurrently without getting the same
+    message, a message whose worker died mid-call becomes claimable again once its lease runs out.
+    """
+    due = (
+        select(SmsMessage.message_id)
+        .where(
+            SmsMessage.status.in_(CLAIMABLE_SMS_STATUSES),
+            SmsMessage.next_attempt_at <= func.now(),
+        )
+        .order_by(SmsMessage.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .cte("due")
+    )
+
+    claim_query = (
+        update(SmsMessage)
+        .where(SmsMessage.message_id == due.c.message_id)
+        .values(
+            status=SmsStatus.SENDING.value,
+            attempts=SmsMessage.attempts + 1,
+            next_attempt_at=func.now() + timedelta(seconds=settings.MITAKE_SMS_LEASE_SECONDS),
+        )
+        .returning(SmsMessage.message_id, SmsMessage.phone, SmsMessage.body, SmsMessage.attempts)
+        .execution_options(synchronize_session=False)
+    )
+
+    rows = (await session.execute(claim_query)).all()
+    await session.commit()
+
+    return list(rows)
+
+
+async def record_sms_outcomes(session: AsyncSession, outcomes: list[tuple]) -> None:
+    """Write (message id, attempts, status, msgid, statuscode, error, retry in seconds) of a
+    batch in one UPDATE ... FROM (VALUES ...)."""
+    outcome_values = values(
+        column("message_id", Integer),
+        column("attempts", Integer),
+        column("status", Integer),
+        column("provider_msgid", String),
+        column("status_code", String),
+        column("last_error", Text),
+        column("retry_seconds", Float),
+        name="outcomes",
+    ).data(outcomes)
+
+    await session.execute(
+        update(SmsMessage)
+        # Matching on attempts skips messages another worker reclaimed after the lease ran out
+        .where(
+            SmsMessage.message_id == outcome_values.c.message_id,
+            SmsMessage.attempts == outcome_values.c.attempts,
+        )
+        .values(
+            status=outcome_values.c.status,
+            provider_msgid=outcome_values.c.provider_msgid,
+            status_code=outcome_values.c.status_code,
+            last_error=outcome_values.c.last_error,
+            next_attempt_at=case(
+                (
+                    outcome_values.c.retry_seconds.is_not(None),
+                    func.now()
+                    # NULL in the first VALUES row would type the column as text
+                    + cast(outcome_values.c.retry_seconds, Float)
+                    * literal_column("interval '1 second'"),
+                ),
+                else_=SmsMessage.next_attempt_at,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+
+async def dispatch_sms(
+    session: AsyncSession,
+    mitake_sms: MitakeSMS,
+    redis_client: Redis,
+    rate_limiter: RedisRateLimiter,
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+) -> int:
+    """Send a batch of queued messages through SmBulkSend.
+
+    The batch is split into calls of `MITAKE_SMS_BULK_SIZE` messages, at most `concurrency` in
+    flight, each waiting for its messages on the shared rate limiter. Nothing is claimed while
+    the cached balance can't pay for it. Messages Mitake rejects (e.g. an invalid number) fail
+    right away, failed calls and messages missing from the answer are retried with backoff until
+    `MITAKE_SMS_MAX_ATTEMPTS`. Returns the number of messages claimed.
+    """
+    batch_size = batch_size or settings.MITAKE_SMS_DISPATCH_BATCH_SIZE
+    bulk_size = min(settings.MITAKE_SMS_BULK_SIZE, rate_limiter.burst)
+    semaphore = asyncio.Semaphore(concurrency or settings.MITAKE_SMS_DISPATCH_CONCURRENCY)
+
+    points = await get_sms_points(redis_client, mitake_sms)
+    if points is not None:
+        if points <= 0:
+            logger.error("[MitakeSMS][失敗]: 點數不足，暫停發送")
+            return 0
+        batch_size = min(batch_size, points)
+
+    messages = await claim_sms_messages(session=session, batch_size=batch_size)
+
+    async def send(chunk: list[Row]) -> list[tuple]:
+        async with semaphore:
+            await rate_limiter.acquire(len(chunk))
+            try:
+                results = await mitake_sms.send_bulk_sms(
+                    [(str(m.message_id), m.phone, m.body) for m in chunk]
+                )
+                error = "Not in the SmBulkSend response"
+            except Exception as exc:
+                results = {}
+                error = repr(exc)
+
+        outcomes = []
+        for message in chunk:
+            fields = results.get(str(message.message_id))
+
+            if fields is not None and fields.get("statuscode") in MITAKE_SMS_ACCEPTED_STATUS_CODES:
+                outcome = (
+                    SmsStatus.SENT.value,
+                    fields.get("msgid"),
+                    fields["statuscode"],
+                    None,
+                    None,
+                )
+            elif fields is not None:
+                outcome = (
+                    SmsStatus.FAILED.value,
+                    None,
+                    fields.get("statuscode"),
+                    str(fields),
+                    None,
+                )
+            elif message.attempts >= settings.MITAKE_SMS_MAX_ATTEMPTS:
+                outcome = (SmsStatus.FAILED.value, None, None, error, None)
+            else:
+                delay = min(
+                    settings.MITAKE_SMS_RETRY_MAX_SECONDS,
+                    settings.MITAKE_SMS_RETRY_BASE_SECONDS * 2 ** (message.attempts - 1),
+                )
+                outcome = (
+                    SmsStatus.PENDING.value,
+                    None,
+                    None,
+                    error,
+                    delay * random.uniform(0.5, 1),
+                )
+
+            outcomes.append((message.message_id, message.attempts, *outcome))
+
+        return outcomes
+
+    chunks = [messages[i : i + bulk_size] for i in range(0, len(messages), bulk_size)]
+    outcomes = [
+        outcome for result in await asyncio.gather(*map(send, chunks)) for outcome in result
+    ]
+
+    if outcomes:
+        await record_sms_outcomes(session, outcomes)
+
+        failed = sum(1 for outcome in outcomes if outcome[2] == SmsStatus.FAILED.value)
+        if failed:
+            logger.error(f"[MitakeSMS][失敗]: {failed} 則簡訊發送失敗")
+
+    if mitake_sms.points is not None:
+        await store_sms_points(redis_client, mitake_sms.points)
+
+    return len(messages)
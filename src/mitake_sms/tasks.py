@@ -0,0 +1,41 @@
+import asyncio
+
+from redis.asyncio import Redis
+
+from src.config import settings
+from src.database import AsyncSessionLocal
+from src.logger import logger
+from src.mitake_sms.service import MitakeSMS, dispatch_sms
+from src.rate_limiter import RedisRateLimiter
+
+
+async def run_sms_dispatcher(
+    mitake_sms: MitakeSMS, redis_client: Redis, interval: float | None = None
+):
+    """Background loop that sends the queued SMS in bulk, within the Mitake quota."""
+    interval = interval or settings.MITAKE_SMS_DISPATCH_INTERVAL_SECONDS
+    rate_limiter = RedisRateLimiter(
+        redis_client,
+        key="mitake_sms",
+        rate=settings.MITAKE_SMS_RATE_PER_SECOND,
+        burst=settings.MITAKE_SMS_RATE_BURST,
+    )
+
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                while (
+                    await dispatch_sms(
+                        session=session,
+                        mitake_sms=mitake_sms,
+                        redis_client=redis_client,
+                        rate_limiter=rate_limiter,
+                    )
+                    == settings.MITAKE_SMS_DISPATCH_BATCH_SIZE
+                ):
+                    pass
+
+        except Exception as exc:
+            logger.exception(exc)
+
+        await asyncio.sleep(interval)
@@ -1,10 +1,44 @@
 from datetime import date, datetime, time
 
-from sqlalchemy import Boolean, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy.sql import false, func
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    CheckConstraint,
+    Computed,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.sql import false, func, text
 
-from src.constants import Role
+from src.constants import (
+    ACTIVE_RESERVATION_STATUSES,
+    CLAIMABLE_INVOICE_JOB_STATUSES,
+    CLAIMABLE_SMS_STATUSES,
+    InvoiceJobStatus,
+    OrderStatus,
+    ReservationStatus,
+    Role,
+    SmsStatus,
+)
+
+# 預約應扣在 event_ticket_types.stock 上的張數：有效預約為 quantity，已釋放為 0
+SYNCED_QUANTITY_TARGET_SQL = (
+    f"CASE WHEN status IN {ACTIVE_RESERVATION_STATUSES} THEN quantity ELSE 0 END"
+)
+
+
+# 活動全文搜尋: 名稱權重最高, 主辦與地點次之, 描述最低. simple 不做英文詞幹, 名稱與地名原樣比對
+EVENT_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', event_name), 'A') || "
+    "setweight(to_tsvector('simple', organizer || ' ' || location), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
 
 
 class Base(DeclarativeBase):
@@ -27,6 +61,45 @@ class User(Base):
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        # Keyset pagination of the catalogue, (sort column, event_id) in either direction
+        Index(
+            "ix_events_created_at_event_id",
+            "created_at",
+            "event_id",
+            postgresql_where=text("is_deleted IS false"),
+        ),
+        Index(
+            "ix_events_updated_at_event_id",
+            "updated_at",
+            "event_id",
+            postgresql_where=text("is_deleted IS false"),
+        ),
+        # Catalogue filtered by category, newest first
+        Index(
+            "ix_events_category_created_at_event_id",
+            "category",
+            "created_at",
+            "event_id",
+            postgresql_where=text("is_deleted IS false"),
+        ),
+        Index(
+            "ix_events_category_updated_at_event_id",
+            "category",
+            "updated_at",
+            "event_id",
+            postgresql_where=text("is_deleted IS false"),
+        ),
+        # Events whose tickets can be reserved, for the reservation and inventory lookups
+        Index(
+            "ix_events_on_sale",
+            "event_id",
+            postgresql_where=text("on_sale IS true AND is_deleted IS false"),
+        ),
+        # The pg_trgm index on event_name only exists where the extension is available, see
+        # the add_events_search_vector migration
+        Index("ix_events_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     event_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     event_name: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -43,10 +116,23 @@ class Event(Base):
     is_deleted: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR, Computed(EVENT_SEARCH_VECTOR_SQL, persisted=True), deferred=True
+    )
+
+    pictures: Mapped[list["EventPicture"]] = relationship(
+        order_by="EventPicture.picture_order", passive_deletes=True
+    )
+    ticket_types: Mapped[list["EventTicketType"]] = relationship(
+        order_by="EventTicketType.ticket_type_id", passive_deletes=True
+    )
 
 
 class EventPicture(Base):
     __tablename__ = "event_pictures"
+    __table_args__ = (
+        Index("ix_event_pictures_event_id_picture_order", "event_id", "picture_order"),
+    )
 
     picture_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     event_id: Mapped[int] = mapped_column(ForeignKey("events.event_id", ondelete="CASCADE"))
@@ -59,6 +145,10 @@ class EventPicture(Base):
 
 class EventTicketType(Base):
     __tablename__ = "event_ticket_types"
+    __table_args__ = (
+        CheckConstraint("stock >= 0", name="ck_event_ticket_types_stock"),
+        Index("ix_event_ticket_types_event_id", "event_id"),
+    )
 
     ticket_type_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     event_id: Mapped[int] = mapped_column(ForeignKey("events.event_id", ondelete="CASCADE"))
@@ -66,3 +156,132 @@ class EventTicketType(Base):
     max_purchase_limit: Mapped[int | None] = mapped_column(nullable=True)  # null 表示不限
     price: Mapped[float] = mapped_column(nullable=False)
     stock: Mapped[int] = mapped_column(nullable=False)
+
+
+class TicketReservation(Base):
+    __tablename__ = "ticket_reservations"
+    __table_args__ = (
+        Index("ix_ticket_reservations_user_ticket_type", "user_id", "ticket_type_id"),
+        Index(
+            "ix_ticket_reservations_pending_expires_at",
+            "expires_at",
+            postgresql_where=text(f"status = {ReservationStatus.PENDING.value}"),
+        ),
+        Index(
+            "ix_ticket_reservations_unsynced",
+            "reservation_id",
+            postgresql_where=text(f"synced_quantity <> {SYNCED_QUANTITY_TARGET_SQL}"),
+        ),
+    )
+
+    reservation_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    ticket_type_id: Mapped[int] = mapped_column(
+        ForeignKey("event_ticket_types.ticket_type_id", ondelete="CASCADE")
+    )
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id", ondelete="CASCADE"))
+    quantity: Mapped[int] = mapped_column(nullable=False)
+    status: Mapped[int] = mapped_column(server_default=str(ReservationStatus.PENDING.value))
+    expires_at: Mapped[datetime] = mapped_column(nullable=False)  # 未結帳逾時自動釋放
+    synced_quantity: Mapped[int] = mapped_column(server_default="0")  # 已扣在 stock 欄位上的張數
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
+
+
+class InvoiceJob(Base):
+    __tablename__ = "invoice_jobs"
+    __table_args__ = (
+        Index(
+            "ix_invoice_jobs_claimable_next_attempt_at",
+            "next_attempt_at",
+            postgresql_where=text(f"status IN {CLAIMABLE_INVOICE_JOB_STATUSES}"),
+        ),
+    )
+
+    job_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    order_id: Mapped[str] = mapped_column(String(50), unique=True)  # Amego OrderId, 冪等鍵
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)  # CreateAmegoInvoiceRequest
+    status: Mapped[int] = mapped_column(server_default=str(InvoiceJobStatus.PENDING.value))
+    attempts: Mapped[int] = mapped_column(server_default="0")
+    # 下次可領取的時間，處理中時為租約到期時間
+    next_attempt_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    result: Mapped[dict | None] = mapped_column(JSON, nullable=True)  # Amego 回應
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
+
+
+class SmsMessage(Base):
+    __tablename__ = "sms_messages"
+    __table_args__ = (
+        # 同一個活動 (campaign) 同一個門號只發一次
+        UniqueConstraint("campaign", "phone", name="uq_sms_messages_campaign_phone"),
+        Index(
+            "ix_sms_messages_claimable_next_attempt_at",
+            "next_attempt_at",
+            postgresql_where=text(f"status IN {CLAIMABLE_SMS_STATUSES}"),
+        ),
+    )
+
+    message_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)  # Mitake ClientID
+    campaign: Mapped[str] = mapped_column(String(100), nullable=False)  # e.g. event_reminder:12
+    phone: Mapped[str] = mapped_column(String(20), nullable=False)
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[int] = mapped_column(server_default=str(SmsStatus.PENDING.value))
+    attempts: Mapped[int] = mapped_column(server_default="0")
+    # 下次可領取的時間，發送中時為租約到期時間
+    next_attempt_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    provider_msgid: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    status_code: Mapped[str | None] = mapped_column(String(4), nullable=True)  # Mitake statuscode
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
+
+
+class Order(Base):
+    __tablename__ = "orders"
+    __table_args__ = (
+        UniqueConstraint("user_id", "idempotency_key", name="uq_orders_user_idempotency_key"),
+    )
+
+    order_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    order_no: Mapped[str] = mapped_column(String(32), unique=True)  # MyPay / Amego 訂單編號
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id", ondelete="CASCADE"))
+    # 一筆預約只會有一張訂單
+    reservation_id: Mapped[int] = mapped_column(
+        ForeignKey("ticket_reservations.reservation_id", ondelete="CASCADE"), unique=True
+    )
+    amount: Mapped[int] = mapped_column(nullable=False)
+    status: Mapped[int] = mapped_column(server_default=str(OrderStatus.PENDING_PAYMENT.value))
+    buyer_email: Mapped[str | None] = mapped_column(String(255), nullable=True)  # 開立發票用
+    idempotency_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    request_fingerprint: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    payment_url: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # 向 MyPay 取付款頁的請求進行中, 逾時未完成的可由其他請求接手
+    payment_requested_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    provider_transaction_id: Mapped[str | None] = mapped_column(
+        String(64), unique=True
+    )  # MyPay uid
+    paid_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
+
+
+class PaymentNotification(Base):
+    __tablename__ = "payment_notifications"
+    __table_args__ = (
+        # 金流重送的通知只處理一次, 同一筆交易的不同狀態各處理一次
+        UniqueConstraint(
+            "provider",
+            "transaction_id",
+            "status_code",
+            name="uq_payment_notifications_provider_transaction_status",
+        ),
+    )
+
+    notification_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    provider: Mapped[str] = mapped_column(String(20), nullable=False)
+    transaction_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[str] = mapped_column(String(10), nullable=False)
+    order_no: Mapped[str] = mapped_column(String(32), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
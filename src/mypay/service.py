@@ -1,14 +1,32 @@
 import base64
-import json
 
-import requests
+import httpx
+import orjson
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
 from Crypto.Util import Padding
 
 from src.config import settings
+from src.executor import get_cpu_executor
+from src.http_client import get_http_client
 from src.logger import logger
 from src.order.schemas import MyPayOrderItem
+from src.resilience import ProviderPolicy, get_provider_policy
+
+MYPAY_SERVICE = {"service_name": "api", "cmd": "api/orders"}
+MYPAY_QUERY_SERVICE = {"service_name": "api", "cmd": "api/queryorder"}
+
+
+def encrypt_payload(data: bytes, key: bytes) -> str:
+    """AES-256-CBC with a random IV prefixed to the ciphertext, base64 encoded."""
+    iv = get_random_bytes(AES.block_size)
+    cipher = AES.new(key, AES.MODE_CBC, iv)
+    return base64.b64encode(iv + cipher.encrypt(Padding.pad(data, AES.block_size))).decode()
+
+
+def encrypt_payloads(payloads: list[bytes], key: bytes) -> list[str]:
+    # Module level so that a process pool can pickle it
+    return [encrypt_payload(data, key) for data in payloads]
 
 
 class StoreOrder:
@@ -16,6 +34,13 @@ class StoreOrder:
     store_key = settings.MYPAY_STORE_KEY.encode("utf-8")
     url = settings.MYPAY_URL
 
+    def __init__(
+        self, http_client: httpx.AsyncClient | None = None, policy: ProviderPolicy | None = None
+    ):
+        self.http_client = http_client
+        self.policy = policy
+        self.service_segments: dict[bytes, str] = {}
+
     def get_raw_data(self, cost: str, user_id: str, order_id: str, items: list[MyPayOrderItem]):
         """取得串接欄位資料
 
@@ -34,25 +59,28 @@ class StoreOrder:
         return rawData
 
     def get_service(self):
-        return {"service_name": "api", "cmd": "api/orders"}
+        return MYPAY_SERVICE
+
+    def get_service_segment(self) -> str:
+        """The encrypted service descriptor never changes, so it is encrypted once per key.
+        MyPay reads the IV from the segment itself, reusing it is fine."""
+        if self.store_key not in self.service_segments:
+            self.service_segments[self.store_key] = self.encrypt(self.get_service(), self.store_key)
+        return self.service_segments[self.store_key]
 
     def encrypt(self, fields, key):
-        data = json.dumps(fields, separators=(",", ":"))
-        data = Padding.pad(data.encode("utf-8"), AES.block_size)
-        iv = get_random_bytes(AES.block_size)
-        cipher = AES.new(key, AES.MODE_CBC, iv)
-        data = cipher.encrypt(data)
-        data = base64.b64encode(iv + data)
-        return data
-
-    def post(self, postData):
-        result = requests.post(self.url, postData)
+        return encrypt_payload(orjson.dumps(fields), key)
+
+    async def post(self, postData, hedge: bool = False):
+        client = self.http_client or get_http_client("mypay")
+        policy = self.policy or get_provider_policy("mypay")
+        result = await policy.request(client, "POST", self.url, hedge=hedge, data=postData)
         return result.text
 
     def get_post_data(self, cost: str, user_id: str, order_id: str, items: list[MyPayOrderItem]):
         post_data = {
             "store_uid": self.store_uid,
-            "service": self.encrypt(self.get_service(), self.store_key),
+            "service": self.get_service_segment(),
             "encry_data": self.encrypt(
                 self.get_raw_data(cost=cost, user_id=user_id, order_id=order_id, items=items),
                 self.store_key,
@@ -60,24 +88,73 @@ class StoreOrder:
         }
         return post_data
 
-    def run(self, cost: str, user_id: str, order_id: str, items: list[MyPayOrderItem]):
+    async def build_post_data_batch(self, orders: list[dict]) -> list[dict]:
+        """`get_post_data` for many orders at once, each a dict of its keyword arguments.
+
+        The payloads are serialized on the event loop; once they add up to more than
+        `MYPAY_ENCRYPT_OFFLOAD_BYTES` they are encrypted in one job on the CPU executor.
+        """
+        service = self.get_service_segment()
+        payloads = [orjson.dumps(self.get_raw_data(**order)) for order in orders]
+
+        if sum(len(data) for data in payloads) > settings.MYPAY_ENCRYPT_OFFLOAD_BYTES:
+            encrypted = await get_cpu_executor().run(encrypt_payloads, payloads, self.store_key)
+        else:
+            encrypted = encrypt_payloads(payloads, self.store_key)
+
+        return [
+            {"store_uid": self.store_uid, "service": service, "encry_data": data}
+            for data in encrypted
+        ]
+
+    async def build_post_data(
+        self, cost: str, user_id: str, order_id: str, items: list[MyPayOrderItem]
+    ) -> dict:
+        orders = [{"cost": cost, "user_id": user_id, "order_id": order_id, "items": items}]
+        return (await self.build_post_data_batch(orders))[0]
+
+    async def run(self, cost: str, user_id: str, order_id: str, items: list[MyPayOrderItem]):
         try:
-            post_data = self.get_post_data(
+            post_data = await self.build_post_data(
                 cost=cost,
                 user_id=user_id,
                 order_id=order_id,
                 items=[item.model_dump() for item in items],
             )
 
-            logger.info(post_data)
+            # The payload itself is encrypted order and customer data, keep it out of the logs
+            logger.info(f"[MyPay] requesting payment for order {order_id}")
 
-            response_text = self.post(post_data)
+            response_text = await self.post(post_data)
 
-            return json.loads(response_text)
+            return orjson.loads(response_text)
 
         except Exception as exc:
             logger.exception(exc)
             raise exc
 
 
+class QueryOrder(StoreOrder):
+    """MyPay 交易查詢, 以商家金鑰向 MyPay 確認一筆交易的狀態"""
+
+    def get_service(self):
+        return MYPAY_QUERY_SERVICE
+
+    def get_query_data(self, uid: str, key: str):
+        return {"store_uid": self.store_uid, "uid": uid, "key": key}
+
+    async def run(self, uid: str, key: str) -> dict:
+        post_data = {
+            "store_uid": self.store_uid,
+            "service": self.get_service_segment(),
+            "encry_data": self.encrypt(self.get_query_data(uid=uid, key=key), self.store_key),
+        }
+
+        logger.info(f"[MyPay] querying transaction {uid}")
+
+        # A query changes nothing, it is safe to send twice
+        return orjson.loads(await self.post(post_data, hedge=True))
+
+
 mypay_store_order = StoreOrder()
+mypay_query_order = QueryOrder()
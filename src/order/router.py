@@ -0,0 +1,101 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Request, Response, status
+from fastapi.responses import PlainTextResponse
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.dependencies import get_current_active_user
+from src.config import settings
+from src.constants import MYPAY_NOTIFY_ACK
+from src.database import get_db_session, get_read_db_session, get_redis_client
+from src.logger import logger
+from src.middleware import get_client_ip
+from src.models import User
+from src.order.schemas import CreateOrderRequest, Order
+from src.order.service import get_order, place_order, process_mypay_notification
+from src.schemas import DataResponse
+
+router = APIRouter(
+    tags=["order"],
+)
+
+
+@router.post(
+    "/v1/orders",
+    response_model=DataResponse[Order],
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_order(
+    order_data: Annotated[CreateOrderRequest, Body()],
+    response: Response,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    redis_client: Annotated[Redis, Depends(get_redis_client)],
+    idempotency_key: Annotated[str | None, Header(min_length=1, max_length=64)] = None,
+):
+    try:
+        order, replayed = await place_order(
+            session=session,
+            redis_client=redis_client,
+            user_id=current_user.user_id,
+            order_data=order_data,
+            idempotency_key=idempotency_key,
+        )
+
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+
+        return DataResponse(data=order)
+
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Order Error: {str(e)}",
+        ) from e
+
+
+@router.get(
+    "/v1/orders/{order_id}",
+    response_model=DataResponse[Order],
+)
+async def get_order_detail(
+    order_id: int,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_read_db_session)],
+):
+    order = await get_order(session=session, order_id=order_id, user_id=current_user.user_id)
+
+    return DataResponse(data=Order.model_validate(order))
+
+
+@router.post(
+    "/v1/orders/mypay/notify",
+    response_class=PlainTextResponse,
+    include_in_schema=False,
+)
+async def mypay_notify(
+    request: Request,
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+):
+    """MyPay 背景通知, 重送的通知只會處理一次
+
+    只接受白名單 IP 的通知, 未設定白名單時僅 dev 模式接受; 付款成功的通知另向 MyPay 查詢確認。
+    """
+    if settings.MYPAY_NOTIFY_ALLOWED_IPS:
+        allowed = get_client_ip(request) in settings.MYPAY_NOTIFY_ALLOWED_IPS
+    else:
+        allowed = settings.MODE == "dev"
+    if not allowed:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+    payload = dict(await request.form())
+
+    if not await process_mypay_notification(session=session, payload=payload):
+        # MyPay retries until it gets the ack, these come in bursts
+        logger.info(f"[MyPay] duplicate notification {payload.get('uid')} skipped", sample=0.1)
+
+    return MYPAY_NOTIFY_ACK
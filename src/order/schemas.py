@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class MyPayOrderItem(BaseModel):
+    # MyPay 訂單商品明細
+    id: str
+    name: str
+    cost: str  # 單價
+    amount: str  # 數量
+    total: str  # 小計
+
+
+class CreateOrderRequest(BaseModel):
+    reservation_id: int
+    buyer_email: str | None = Field(None, max_length=255)  # 有填寫時於付款後開立電子發票
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {"reservation_id": 1, "buyer_email": "buyer@example.com"},
+        }
+    }
+
+
+class Order(BaseModel):
+    order_id: int
+    order_no: str
+    reservation_id: int
+    amount: int
+    status: int
+    payment_url: str | None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,399 @@
+import hashlib
+import secrets
+from datetime import timedelta
+
+import orjson
+from fastapi import HTTPException, status
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from src.amego.schemas import AmegoTaxType, CreateAmegoInvoiceRequest, ProductDetail
+from src.amego.service import enqueue_invoice
+from src.config import settings
+from src.constants import MYPAY_PAID_PRC, OrderStatus, ReservationStatus
+from src.logger import logger
+from src.models import EventTicketType, Order, PaymentNotification, TicketReservation
+from src.mypay.service import mypay_query_order, mypay_store_order
+from src.order.schemas import CreateOrderRequest, MyPayOrderItem
+from src.order.schemas import Order as OrderSchema
+from src.reservation.service import confirm_reservation
+
+
+def generate_order_no() -> str:
+    return f"T94{secrets.token_hex(8).upper()}"
+
+
+def get_request_fingerprint(order_data: CreateOrderRequest) -> str:
+    return hashlib.sha256(order_data.model_dump_json().encode()).hexdigest()
+
+
+def raise_idempotency_key_reused():
+    raise HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="Idempotency-Key was already used with a different request",
+    )
+
+
+async def get_ticket_line(session: AsyncSession, reservation_id: int, user_id: int):
+    """Reservation of the user with its ticket name, unit price and whether it can still be
+    paid for. Plain columns, so they stay readable after the session commits."""
+    query = (
+        select(
+            TicketReservation.reservation_id,
+            TicketReservation.ticket_type_id,
+            TicketReservation.quantity,
+            EventTicketType.ticket_name,
+            EventTicketType.price,
+            and_(
+                TicketReservation.status == ReservationStatus.PENDING.value,
+                TicketReservation.expires_at > func.now(),
+            ).label("is_pending"),
+        )
+        .join(EventTicketType, EventTicketType.ticket_type_id == TicketReservation.ticket_type_id)
+        .where(
+            TicketReservation.reservation_id == reservation_id,
+            TicketReservation.user_id == user_id,
+        )
+    )
+    return (await session.execute(query)).one_or_none()
+
+
+async def release_payment_claim(session: AsyncSession, order_id: int) -> None:
+    await session.execute(
+        update(Order)
+        .where(Order.order_id == order_id, Order.payment_url.is_(None))
+        .values(payment_requested_at=None)
+    )
+    await session.commit()
+
+
+async def request_payment(session: AsyncSession, order: Order, ticket_line) -> Order:
+    """Ask MyPay for the payment page of the order.
+
+    The order is first claimed through `payment_requested_at` and committed, so no row lock is
+    held during the call: a concurrent request for the same order gets a 409 instead of a second
+    payment page, and a claim older than `MYPAY_TIMEOUT_SECONDS` is from a request that died.
+    """
+    claim_expired_at = func.now() - timedelta(seconds=settings.MYPAY_TIMEOUT_SECONDS)
+    claimed = await session.scalar(
+        update(Order)
+        .where(
+            Order.order_id == order.order_id,
+            Order.payment_url.is_(None),
+            or_(
+                Order.payment_requested_at.is_(None),
+                Order.payment_requested_at < claim_expired_at,
+            ),
+        )
+        .values(payment_requested_at=func.now())
+        .returning(Order.order_id)
+    )
+    await session.commit()
+    await session.refresh(order)
+
+    if claimed is None:
+        if order.payment_url is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The payment page of this order is being prepared",
+            )
+        return order
+
+    try:
+        result = await mypay_store_order.run(
+            cost=str(order.amount),
+            user_id=str(order.user_id),
+            order_id=order.order_no,
+            items=[
+                MyPayOrderItem(
+                    id=str(ticket_line.ticket_type_id),
+                    name=ticket_line.ticket_name,
+                    cost=str(int(ticket_line.price)),
+                    amount=str(ticket_line.quantity),
+                    total=str(order.amount),
+                )
+            ],
+        )
+    except Exception:
+        await release_payment_claim(session, order.order_id)
+        raise
+
+    if str(result.get("code")) != "200":
+        await release_payment_claim(session, order.order_id)
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"MyPay Error: {result.get('msg')}",
+        )
+
+    order.payment_url = result.get("url")
+    await session.commit()
+    await session.refresh(order)
+
+    return order
+
+
+async def create_order(
+    session: AsyncSession,
+    user_id: int,
+    order_data: CreateOrderRequest,
+    idempotency_key: str | None = None,
+    fingerprint: str | None = None,
+) -> Order:
+    """Create the order of a pending reservation and ask MyPay for its payment page.
+
+    A reservation has at most one order: creating it again, e.g. after a double click, returns
+    the existing one and only asks MyPay again if it hasn't answered yet.
+    """
+    ticket_line = await get_ticket_line(session, order_data.reservation_id, user_id)
+    if ticket_line is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservation not found")
+
+    insert_query = (
+        insert(Order)
+        .values(
+            order_no=generate_order_no(),
+            user_id=user_id,
+            reservation_id=ticket_line.reservation_id,
+            amount=int(ticket_line.price * ticket_line.quantity),
+            buyer_email=order_data.buyer_email,
+            idempotency_key=idempotency_key,
+            request_fingerprint=fingerprint,
+        )
+        .on_conflict_do_nothing()
+        .returning(Order)
+    )
+
+    if ticket_line.is_pending:
+        order = (await session.execute(insert_query)).scalar()
+        await session.commit()
+        if order is not None:
+            await session.refresh(order)
+    else:
+        order = None
+
+    if order is None:
+        query = select(Order).where(
+            or_(
+                Order.reservation_id == ticket_line.reservation_id,
+                and_(Order.user_id == user_id, Order.idempotency_key == idempotency_key),
+            )
+        )
+        order = (await session.execute(query)).scalars().first()
+
+        if order is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="Reservation is no longer pending"
+            )
+        if idempotency_key is not None and order.idempotency_key == idempotency_key:
+            if order.request_fingerprint != fingerprint:
+                raise_idempotency_key_reused()
+
+    if order.payment_url is None and order.status == OrderStatus.PENDING_PAYMENT.value:
+        order = await request_payment(session, order, ticket_line)
+
+    return order
+
+
+async def place_order(
+    session: AsyncSession,
+    redis_client: Redis,
+    user_id: int,
+    order_data: CreateOrderRequest,
+    idempotency_key: str | None = None,
+) -> tuple[dict, bool]:
+    """`create_order` behind an `Idempotency-Key`. Returns the order and whether it's a replay.
+
+    The result of a key is kept in Redis for `ORDER_IDEMPOTENCY_TTL_SECONDS` and replayed from
+    there. While the first request is running, the key is locked and the same key gets a 409.
+    Without Redis, or once the entry is gone, the order is found again through the
+    (user, key) unique constraint in Postgres. A key sent with a different body gets a 422.
+    """
+    if idempotency_key is None:
+        order = await create_order(session=session, user_id=user_id, order_data=order_data)
+        return OrderSchema.model_validate(order).model_dump(mode="json"), False
+
+    fingerprint = get_request_fingerprint(order_data)
+    redis_key = f"idempotency:order:{user_id}:{idempotency_key}"
+    locked = False
+
+    try:
+        locked = await redis_client.set(
+            redis_key,
+            orjson.dumps({"fingerprint": fingerprint}),
+            nx=True,
+            ex=settings.ORDER_IDEMPOTENCY_LOCK_SECONDS,
+        )
+        if not locked and (cached := await redis_client.get(redis_key)) is not None:
+            entry = orjson.loads(cached)
+            if entry["fingerprint"] != fingerprint:
+                raise_idempotency_key_reused()
+            if "response" not in entry:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is in progress",
+                )
+            return entry["response"], True
+    except RedisError as e:
+        logger.warning(f"Idempotency cache unavailable, falling back to Postgres, error: {e}")
+
+    # Postgres fallback: the Redis entry expired or was lost
+    order = await session.scalar(
+        select(Order).where(Order.user_id == user_id, Order.idempotency_key == idempotency_key)
+    )
+    replayed = order is not None and order.payment_url is not None
+
+    if order is not None and order.request_fingerprint != fingerprint:
+        raise_idempotency_key_reused()
+
+    if not replayed:
+        try:
+            order = await create_order(
+                session=session,
+                user_id=user_id,
+                order_data=order_data,
+                idempotency_key=idempotency_key,
+                fingerprint=fingerprint,
+            )
+        except BaseException:
+            if locked:
+                try:
+                    await redis_client.delete(redis_key)
+                except RedisError:
+                    pass
+            raise
+
+    response = OrderSchema.model_validate(order).model_dump(mode="json")
+    try:
+        await redis_client.set(
+            redis_key,
+            orjson.dumps({"fingerprint": fingerprint, "response": response}),
+            ex=settings.ORDER_IDEMPOTENCY_TTL_SECONDS,
+        )
+    except RedisError:
+        pass
+
+    return response, replayed
+
+
+async def get_order(session: AsyncSession, order_id: int, user_id: int) -> Order:
+    order = await session.scalar(
+        select(Order).where(Order.order_id == order_id, Order.user_id == user_id)
+    )
+    if order is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    return order
+
+
+def build_invoice(order: Order, reservation: TicketReservation, ticket_name: str, price: float):
+    # 未打統編: 含稅價, 稅額帶 0
+    return CreateAmegoInvoiceRequest(
+        OrderId=order.order_no,
+        BuyerEmailAddress=order.buyer_email,
+        ProductItem=[
+            ProductDetail(
+                Description=ticket_name,
+                Quantity=str(reservation.quantity),
+                UnitPrice=str(int(price)),
+                Amount=str(order.amount),
+                TaxType=AmegoTaxType.TAXABLE,
+            )
+        ],
+        SalesAmount=str(order.amount),
+        FreeTaxSalesAmount="0",
+        ZeroTaxSalesAmount="0",
+        TaxType=AmegoTaxType.TAXABLE,
+        TaxRate="0.05",
+        TaxAmount="0",
+        TotalAmount=str(order.amount),
+    )
+
+
+def get_paid_amount(payload: dict) -> float | None:
+    try:
+        return float(payload.get("cost"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def process_mypay_notification(session: AsyncSession, payload: dict) -> bool:
+    """Apply a MyPay notify callback exactly once.
+
+    The notification is recorded under a unique (provider, transaction id, status) in the same
+    transaction as its effects, so a callback MyPay retries, even concurrently, is only applied
+    once. A paid notification marks the order paid and confirms its reservation, and queues the
+    invoice when the buyer gave an email. Returns False for a notification already processed.
+
+    Whoever knows an order number can send a notification, so a paid one is first confirmed with
+    MyPay's transaction query and the amount paid is taken from MyPay's answer. One MyPay does
+    not confirm is refused with a 403, before anything is recorded.
+    """
+    transaction_id = payload.get("uid")
+    order_no = payload.get("order_id")
+    prc = str(payload.get("prc", ""))
+
+    if not transaction_id or not order_no:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid notification")
+
+    paid_amount = None
+    if prc == MYPAY_PAID_PRC:
+        # Queried before any row is locked, the call can take up to MYPAY_TIMEOUT_SECONDS
+        transaction = await mypay_query_order.run(uid=transaction_id, key=str(payload.get("key")))
+        if (
+            str(transaction.get("uid")) != transaction_id
+            or str(transaction.get("order_id")) != order_no
+            or str(transaction.get("prc")) != MYPAY_PAID_PRC
+        ):
+            logger.warning(f"[MyPay] paid notification {transaction_id} not confirmed by MyPay")
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+        paid_amount = get_paid_amount(transaction)
+
+    recorded = await session.scalar(
+        insert(PaymentNotification)
+        .values(
+            provider="mypay",
+            transaction_id=transaction_id,
+            status_code=prc,
+            order_no=order_no,
+            payload=payload,
+        )
+        .on_conflict_do_nothing(constraint="uq_payment_notifications_provider_transaction_status")
+        .returning(PaymentNotification.notification_id)
+    )
+
+    if recorded is None:
+        await session.rollback()
+        return False
+
+    order = await session.scalar(select(Order).where(Order.order_no == order_no).with_for_update())
+
+    if prc != MYPAY_PAID_PRC:
+        logger.info(f"[MyPay] order {order_no} notified with prc {prc}")
+    elif order is None or order.status != OrderStatus.PENDING_PAYMENT.value:
+        logger.warning(f"[MyPay] paid notification for order {order_no} ignored")
+    elif paid_amount != order.amount:
+        logger.error(f"[MyPay] order {order_no} paid {paid_amount}, expected {order.amount}")
+    else:
+        reservation = await confirm_reservation(session, order.reservation_id, commit=False)
+
+        order.provider_transaction_id = transaction_id
+        order.paid_at = func.now()
+
+        if reservation is None:
+            order.status = OrderStatus.REFUND_REQUIRED.value
+            logger.error(f"[MyPay] order {order_no} paid after its reservation was released")
+        else:
+            order.status = OrderStatus.PAID.value
+            if order.buyer_email:
+                ticket_line = await get_ticket_line(session, order.reservation_id, order.user_id)
+                await enqueue_invoice(
+                    session,
+                    build_invoice(order, reservation, ticket_line.ticket_name, ticket_line.price),
+                )
+
+    await session.commit()
+
+    return True
@@ -0,0 +1,89 @@
+import base64
+from datetime import datetime
+
+import orjson
+from fastapi import HTTPException, status
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+from src.schemas import BasicQueryParams
+
+
+def encode_cursor(params: BasicQueryParams, sort_value: datetime, primary_key: int) -> str:
+    """Opaque cursor: the sort of the listing and the (sort value, primary key) of its last row."""
+    raw = orjson.dumps([params.sort_by, params.order_by, sort_value, primary_key])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(params: BasicQueryParams) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(params.cursor + "=" * (-len(params.cursor) % 4))
+        sort_by, order_by, sort_value, primary_key = orjson.loads(raw)
+        if (sort_by, order_by) != (params.sort_by, params.order_by):
+            raise ValueError("cursor of another sort")
+        return datetime.fromisoformat(sort_value), int(primary_key)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+
+
+def apply_sort(
+    query: Select,
+    params: BasicQueryParams,
+    sort_column: InstrumentedAttribute,
+    primary_key: InstrumentedAttribute,
+) -> Select:
+    """Order by the sort column with the primary key as tie-breaker, both in the same direction
+    so that (sort value, primary key) is a row comparison an index can answer.
+
+    In cursor mode only the rows after the cursor are selected, otherwise the page is an OFFSET.
+    """
+    if params.order_by == "asc":
+        query = query.order_by(sort_column.asc(), primary_key.asc())
+    else:
+        query = query.order_by(sort_column.desc(), primary_key.desc())
+
+    if not params.use_cursor():
+        return query.limit(params.page_size).offset((params.page - 1) * params.page_size)
+
+    if params.cursor is not None:
+        position = tuple_(sort_column, primary_key)
+        after = tuple_(*decode_cursor(params))
+        query = query.where(position > after if params.order_by == "asc" else position < after)
+
+    # One extra row tells whether there is a next page
+    return query.limit(params.page_size + 1)
+
+
+async def count_rows(session: AsyncSession, query: Select) -> int:
+    count_query = select(func.count()).select_from(query.order_by(None).subquery())
+    return (await session.execute(count_query)).scalar()
+
+
+async def estimate_rows(session: AsyncSession, query: Select) -> int:
+    """Row count the planner expects for `query`, from the table statistics.
+
+    Costs a plan instead of a scan, but is only as fresh as the last (auto)analyze.
+    """
+    # Sent as is with its bound parameters, user input never becomes part of the SQL text
+    connection = await session.connection()
+    compiled = query.order_by(None).compile(
+        dialect=connection.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+    plan = (
+        await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", parameters)
+    ).scalar()
+    if isinstance(plan, str):
+        plan = orjson.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def get_total_count(session: AsyncSession, params: BasicQueryParams, query: Select):
+    """Total count of `query` as asked for in `params.count`, None if it wasn't."""
+    count_mode = params.get_count_mode()
+    if count_mode == "exact":
+        return await count_rows(session, query)
+    if count_mode == "estimated":
+        return await estimate_rows(session, query)
+    return None
@@ -0,0 +1,51 @@
+import asyncio
+
+from redis.asyncio import Redis
+
+# Token bucket, refilled at `rate` tokens per second up to `burst`. Redis TIME is the clock, so
+# every worker shares the same quota. Takes all the requested tokens or none, and returns how many
+# milliseconds to wait before they are available.
+# KEYS: bucket  ARGV: rate, burst, requested tokens
+ACQUIRE_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1] or burst)
+local updated_at = tonumber(bucket[2] or now_ms)
+tokens = math.min(burst, tokens + (now_ms - updated_at) * rate / 1000)
+local wait_ms = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait_ms = math.ceil((requested - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', now_ms)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return wait_ms
+"""
+
+
+class RedisRateLimiter:
+    """Rate limit shared by every worker and node, e.g. a provider quota."""
+
+    def __init__(self, redis_client: Redis, key: str, rate: float, burst: int):
+        self.key = f"rate_limit:{key}"
+        self.rate = rate
+        self.burst = burst
+        self.acquire_script = redis_client.register_script(ACQUIRE_SCRIPT)
+
+    async def acquire(self, tokens: int = 1) -> None:
+        """Wait until `tokens` tokens are available and take them."""
+        if tokens > self.burst:
+            raise ValueError(f"Cannot acquire {tokens} tokens, burst is {self.burst}")
+
+        while True:
+            wait_ms = await self.acquire_script(
+                keys=[self.key], args=[self.rate, self.burst, tokens]
+            )
+            if not wait_ms:
+                return
+            await asyncio.sleep(wait_ms / 1000)
@@ -0,0 +1,76 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Body, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.dependencies import get_current_active_user
+from src.database import get_db_session
+from src.inventory.dependencies import get_inventory
+from src.inventory.service import RedisInventory
+from src.logger import logger
+from src.models import User
+from src.reservation.schemas import CreateReservationRequest, Reservation
+from src.reservation.service import release_reservation, reserve_tickets
+from src.schemas import DataResponse, DetailResponse
+from src.waiting_room.dependencies import require_queue_admission
+
+router = APIRouter(
+    tags=["reservation"],
+)
+
+
+@router.post(
+    "/v1/reservations",
+    response_model=DataResponse[Reservation],
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_reservation(
+    reservation_data: Annotated[CreateReservationRequest, Body()],
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    inventory: Annotated[RedisInventory | None, Depends(get_inventory)],
+    admitted_event_id: Annotated[int | None, Depends(require_queue_admission)],
+):
+    try:
+        reservation = await reserve_tickets(
+            session=session,
+            user_id=current_user.user_id,
+            ticket_type_id=reservation_data.ticket_type_id,
+            quantity=reservation_data.quantity,
+            inventory=inventory,
+            event_id=admitted_event_id,
+        )
+
+        return DataResponse(data=Reservation.model_validate(reservation))
+
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Reservation Error: {str(e)}",
+        ) from e
+
+
+@router.delete(
+    "/v1/reservations/{reservation_id}",
+    response_model=DetailResponse,
+)
+async def cancel_reservation(
+    reservation_id: int,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    inventory: Annotated[RedisInventory | None, Depends(get_inventory)],
+):
+    released = await release_reservation(
+        session=session,
+        reservation_id=reservation_id,
+        user_id=current_user.user_id,
+        inventory=inventory,
+    )
+
+    if not released:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservation not found")
+
+    return DetailResponse(detail="successful")
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class CreateReservationRequest(BaseModel):
+    ticket_type_id: int
+    quantity: int = Field(..., gt=0)
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {"ticket_type_id": 1, "quantity": 2},
+        }
+    }
+
+
+class Reservation(BaseModel):
+    reservation_id: int
+    ticket_type_id: int
+    quantity: int
+    status: int
+    expires_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
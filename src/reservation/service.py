@@ -0,0 +1,355 @@
+from datetime import timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy import Row, insert, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from src.config import settings
+from src.constants import ACTIVE_RESERVATION_STATUSES, ReservationStatus
+from src.inventory.service import (
+    LIMIT_EXCEEDED,
+    NOT_ENOUGH_STOCK,
+    NOT_LOADED,
+    WRONG_EVENT,
+    RedisInventory,
+)
+from src.models import Event, EventTicketType, TicketReservation
+
+
+def held_quantity_query(user_id: int, ticket_type_id: int):
+    """使用者在該票種已保留 (含已付款) 的張數"""
+    return select(func.coalesce(func.sum(TicketReservation.quantity), 0)).where(
+        TicketReservation.user_id == user_id,
+        TicketReservation.ticket_type_id == ticket_type_id,
+        TicketReservation.status.in_(ACTIVE_RESERVATION_STATUSES),
+    )
+
+
+def raise_wrong_event():
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not admitted to this event")
+
+
+async def raise_reservation_rejected(
+    session: AsyncSession,
+    user_id: int,
+    ticket_type_id: int,
+    quantity: int,
+    event_id: int | None = None,
+):
+    """Only runs on the failure path, to tell the caller why the conditional update matched
+    nothing."""
+    ticket_type = await session.get(EventTicketType, ticket_type_id)
+
+    if ticket_type is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket type not found")
+
+    if event_id is not None and ticket_type.event_id != event_id:
+        raise_wrong_event()
+
+    if ticket_type.max_purchase_limit is not None:
+        held_quantity = (
+            await session.execute(held_quantity_query(user_id, ticket_type_id))
+        ).scalar()
+
+        if held_quantity + quantity > ticket_type.max_purchase_limit:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="Purchase limit exceeded"
+            )
+
+    if ticket_type.stock < quantity:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Not enough tickets left")
+
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Event is not on sale")
+
+
+async def reserve_tickets(
+    session: AsyncSession,
+    user_id: int,
+    ticket_type_id: int,
+    quantity: int,
+    ttl_seconds: int | None = None,
+    inventory: RedisInventory | None = None,
+    event_id: int | None = None,
+) -> TicketReservation:
+    """Atomically take `quantity` tickets off the stock and record a pending reservation.
+
+    Without `inventory`, the stock check, the purchase limit check and the decrement are a single
+    conditional `UPDATE ... WHERE stock >= n RETURNING`, chained into the reservation `INSERT` by
+    a CTE, so the hot row is only locked for one statement and can never go below zero. The
+    requests of one user for one ticket type are serialized by an advisory lock first: under
+    READ COMMITTED, concurrent ones (a double-click) would all count the tickets held before any
+    of them inserted its reservation, and together exceed the purchase limit.
+
+    `event_id` restricts the reservation to ticket types of that event (e.g. the event a waiting
+    room admitted the user to).
+    """
+    ttl_seconds = ttl_seconds or settings.RESERVATION_TTL_SECONDS
+
+    if inventory is not None:
+        return await reserve_tickets_from_inventory(
+            session=session,
+            inventory=inventory,
+            user_id=user_id,
+            ticket_type_id=ticket_type_id,
+            quantity=quantity,
+            ttl_seconds=ttl_seconds,
+            event_id=event_id,
+        )
+
+    on_sale_events = select(Event.event_id).where(
+        Event.on_sale.is_(True), Event.is_deleted.is_(False)
+    )
+    if event_id is not None:
+        on_sale_events = on_sale_events.where(Event.event_id == event_id)
+
+    reserved = (
+        update(EventTicketType)
+        .where(
+            EventTicketType.ticket_type_id == ticket_type_id,
+            EventTicketType.stock >= quantity,
+            EventTicketType.event_id.in_(on_sale_events),
+            or_(
+                EventTicketType.max_purchase_limit.is_(None),
+                held_quantity_query(user_id, ticket_type_id).scalar_subquery() + quantity
+                <= EventTicketType.max_purchase_limit,
+            ),
+        )
+        .values(stock=EventTicketType.stock - quantity)
+        .returning(EventTicketType.ticket_type_id)
+        .cte("reserved")
+    )
+
+    insert_query = (
+        insert(TicketReservation)
+        .from_select(
+            ["ticket_type_id", "user_id", "quantity", "synced_quantity", "expires_at"],
+            select(
+                reserved.c.ticket_type_id,
+                literal(user_id),
+                literal(quantity),
+                literal(quantity),
+                func.now() + timedelta(seconds=ttl_seconds),
+            ),
+        )
+        .add_cte(reserved)
+        .returning(TicketReservation)
+    )
+
+    try:
+        # Held until commit or rollback, the INSERT then runs on a snapshot that includes the
+        # reservations of the previous holder
+        await session.execute(select(func.pg_advisory_xact_lock(user_id, ticket_type_id)))
+        result = await session.execute(insert_query)
+        reservation = result.scalars().one_or_none()
+
+        if reservation is None:
+            await raise_reservation_rejected(session, user_id, ticket_type_id, quantity, event_id)
+
+        await session.commit()
+
+        return reservation
+
+    except Exception as e:
+        await session.rollback()
+        raise e
+
+
+async def reserve_tickets_from_inventory(
+    session: AsyncSession,
+    inventory: RedisInventory,
+    user_id: int,
+    ticket_type_id: int,
+    quantity: int,
+    ttl_seconds: int,
+    event_id: int | None = None,
+) -> TicketReservation:
+    """Admit the reservation against the Redis counters and only insert the reservation row.
+
+    The stock column is left for `flush_inventory` to write behind (`synced_quantity` stays 0).
+    The acquisition is settled once the row is committed and given back if it can't be.
+    """
+    remaining, token = await inventory.acquire(ticket_type_id, user_id, quantity, event_id)
+
+    if remaining == NOT_LOADED:
+        await inventory.reconcile(session=session, ticket_type_ids=[ticket_type_id])
+        remaining, token = await inventory.acquire(ticket_type_id, user_id, quantity, event_id)
+
+    if remaining == NOT_LOADED:
+        await raise_reservation_rejected(session, user_id, ticket_type_id, quantity, event_id)
+    if remaining == WRONG_EVENT:
+        raise_wrong_event()
+    if remaining == NOT_ENOUGH_STOCK:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Not enough tickets left")
+    if remaining == LIMIT_EXCEEDED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Purchase limit exceeded")
+
+    insert_query = (
+        insert(TicketReservation)
+        .values(
+            ticket_type_id=ticket_type_id,
+            user_id=user_id,
+            quantity=quantity,
+            expires_at=func.now() + timedelta(seconds=ttl_seconds),
+        )
+        .returning(TicketReservation)
+    )
+
+    try:
+        result = await session.execute(insert_query)
+        reservation = result.scalars().one()
+
+        await session.commit()
+
+    except Exception as e:
+        await session.rollback()
+        await inventory.cancel(ticket_type_id, token)
+        raise e
+
+    await inventory.settle(ticket_type_id, token)
+
+    return reservation
+
+
+async def confirm_reservation(
+    session: AsyncSession, reservation_id: int, commit: bool = True
+) -> TicketReservation | None:
+    """Mark a pending reservation as paid. Returns None if it has already expired or been
+    released, in which case the tickets are back on sale and must not be issued.
+
+    With `commit=False` the change is left in the caller's transaction."""
+    update_query = (
+        update(TicketReservation)
+        .where(
+            TicketReservation.reservation_id == reservation_id,
+            TicketReservation.status == ReservationStatus.PENDING.value,
+            TicketReservation.expires_at > func.now(),
+        )
+        .values(status=ReservationStatus.CONFIRMED.value)
+        .returning(TicketReservation)
+    )
+
+    result = await session.execute(update_query)
+    reservation = result.scalars().one_or_none()
+
+    if commit:
+        await session.commit()
+
+    return reservation
+
+
+async def release_locked_reservations(
+    session: AsyncSession, locked_query, inventory: RedisInventory | None = None
+) -> list[Row]:
+    """Release the reservations selected (FOR UPDATE) by `locked_query` in one statement.
+
+    Only the part of each reservation that was already taken off the stock column
+    (`synced_quantity`) is given back to it; with `inventory`, the full quantity is then given
+    back to the Redis counters. Returns (ticket_type_id, user_id, quantity) of every released
+    reservation.
+    """
+    locked = locked_query.cte("locked")
+
+    released = (
+        update(TicketReservation)
+        .where(TicketReservation.reservation_id == locked.c.reservation_id)
+        .values(status=ReservationStatus.RELEASED.value, synced_quantity=0)
+        .returning(
+            TicketReservation.ticket_type_id,
+            TicketReservation.user_id,
+            TicketReservation.quantity,
+            locked.c.synced_quantity,
+        )
+        .cte("released")
+    )
+
+    totals = (
+        select(released.c.ticket_type_id, func.sum(released.c.synced_quantity).label("quantity"))
+        .group_by(released.c.ticket_type_id)
+        .cte("totals")
+    )
+
+    restored = (
+        update(EventTicketType)
+        .where(EventTicketType.ticket_type_id == totals.c.ticket_type_id, totals.c.quantity > 0)
+        .values(stock=EventTicketType.stock + totals.c.quantity)
+        .returning(EventTicketType.ticket_type_id)
+        .cte("restored")
+    )
+
+    release_query = select(
+        released.c.ticket_type_id, released.c.user_id, released.c.quantity
+    ).add_cte(restored)
+
+    rows = (await session.execute(release_query)).all()
+
+    if inventory is None:
+        await session.commit()
+        return rows
+
+    # Marked before the commit, so a reconcile in between doesn't give the tickets back twice
+    tokens = await inventory.begin_release(rows)
+    try:
+        await session.commit()
+    except Exception as e:
+        await inventory.abort_release([row[0] for row in rows], tokens)
+        raise e
+
+    for (ticket_type_id, _, _), token in zip(rows, tokens, strict=True):
+        await inventory.release(ticket_type_id, token)
+
+    return rows
+
+
+async def release_reservation(
+    session: AsyncSession,
+    reservation_id: int,
+    user_id: int,
+    inventory: RedisInventory | None = None,
+) -> bool:
+    """Give the tickets of a pending reservation back to the stock."""
+    locked_query = (
+        select(TicketReservation.reservation_id, TicketReservation.synced_quantity)
+        .where(
+            TicketReservation.reservation_id == reservation_id,
+            TicketReservation.user_id == user_id,
+            TicketReservation.status == ReservationStatus.PENDING.value,
+        )
+        .with_for_update()
+    )
+
+    rows = await release_locked_reservations(
+        session=session, locked_query=locked_query, inventory=inventory
+    )
+
+    return len(rows) > 0
+
+
+async def release_expired_reservations(
+    session: AsyncSession,
+    batch_size: int | None = None,
+    inventory: RedisInventory | None = None,
+) -> int:
+    """Release up to `batch_size` expired pending reservations and restore their stock.
+
+    `FOR UPDATE SKIP LOCKED` lets every worker run this concurrently without blocking on each
+    other or on a checkout that is confirming the same row. Returns the number of tickets put
+    back on sale.
+    """
+    batch_size = batch_size or settings.RESERVATION_SWEEP_BATCH_SIZE
+
+    locked_query = (
+        select(TicketReservation.reservation_id, TicketReservation.synced_quantity)
+        .where(
+            TicketReservation.status == ReservationStatus.PENDING.value,
+            TicketReservation.expires_at <= func.now(),
+        )
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+    rows = await release_locked_reservations(
+        session=session, locked_query=locked_query, inventory=inventory
+    )
+
+    return sum(quantity for _, _, quantity in rows)
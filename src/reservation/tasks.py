@@ -0,0 +1,29 @@
+import asyncio
+
+from src.config import settings
+from src.database import AsyncSessionLocal
+from src.inventory.service import RedisInventory
+from src.logger import logger
+from src.reservation.service import release_expired_reservations
+
+
+async def run_reservation_sweeper(
+    interval: float | None = None, inventory: RedisInventory | None = None
+):
+    """Background loop that puts the tickets of unpaid, expired reservations back on sale."""
+    interval = interval or settings.RESERVATION_SWEEP_INTERVAL_SECONDS
+
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                released_quantity = await release_expired_reservations(
+                    session=session, inventory=inventory
+                )
+
+            if released_quantity:
+                logger.info(f"[Reservation] released {released_quantity} expired tickets")
+
+        except Exception as exc:
+            logger.exception(exc)
+
+        await asyncio.sleep(interval)
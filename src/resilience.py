@@ -0,0 +1,279 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import httpx
+from fastapi import HTTPException, status
+
+from src.config import settings
+from src.http_client import PROVIDERS
+from src.logger import logger
+from src.metrics import PROVIDER_REQUEST_DURATION
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def raise_for_server_error(response: httpx.Response) -> httpx.Response:
+    """5xx answers count as failures of the provider, other answers are left to the caller."""
+    if response.status_code >= 500:
+        response.raise_for_status()
+    return response
+
+
+class CircuitBreaker:
+    """Stops calling a provider after `failure_threshold` consecutive failures.
+
+    Once open, calls are rejected for `reset_timeout` seconds, then a single trial call is let
+    through (half-open): it closes the breaker if it succeeds and opens it again if it fails.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self.trial_in_flight = False
+
+    def get_state(self) -> str:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        return self.state
+
+    def allow(self) -> bool:
+        state = self.get_state()
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def retry_after(self) -> int:
+        return max(1, round(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened_count += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+
+class LatencyWindow:
+    """Latencies of the last `size` successful calls."""
+
+    def __init__(self, size: int):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, percentile: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+class ProviderPolicy:
+    """Circuit breaker, bulkhead, adaptive timeout and hedging around the calls to one provider.
+
+    - Bulkhead: at most `max_in_flight` calls at a time, the next ones are rejected with a 503
+      instead of queueing behind a slow provider.
+    - Timeout: `timeout_multiplier` times the `timeout_percentile` latency of recent calls, within
+      [`min_timeout`, `max_timeout`]; `max_timeout` until `min_samples` calls were measured.
+    - Hedging, for idempotent calls only: if the first attempt is slower than the
+      `hedge_percentile` latency, a second one is started when the bulkhead has room and the
+      first answer wins.
+    - Failures (exceptions and timeouts) count towards the circuit breaker, open circuits are
+      rejected with a 503 and `Retry-After`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int,
+        max_timeout: float,
+        min_timeout: float | None = None,
+        failure_threshold: int | None = None,
+        reset_timeout: float | None = None,
+        latency_window: int | None = None,
+        min_samples: int | None = None,
+        timeout_percentile: float | None = None,
+        timeout_multiplier: float | None = None,
+        hedge_percentile: float | None = None,
+    ):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout or settings.PROVIDER_MIN_TIMEOUT_SECONDS
+        self.min_samples = min_samples or settings.PROVIDER_LATENCY_MIN_SAMPLES
+        self.timeout_percentile = timeout_percentile or settings.PROVIDER_TIMEOUT_PERCENTILE
+        self.timeout_multiplier = timeout_multiplier or settings.PROVIDER_TIMEOUT_MULTIPLIER
+        self.hedge_percentile = hedge_percentile or settings.PROVIDER_HEDGE_PERCENTILE
+        self.breaker = CircuitBreaker(
+            failure_threshold=failure_threshold or settings.PROVIDER_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=reset_timeout or settings.PROVIDER_BREAKER_RESET_SECONDS,
+        )
+        self.latencies = LatencyWindow(latency_window or settings.PROVIDER_LATENCY_WINDOW)
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.hedges = 0
+
+    def get_timeout(self) -> float:
+        if len(self.latencies.samples) < self.min_samples:
+            return self.max_timeout
+        latency = self.latencies.percentile(self.timeout_percentile)
+        return min(self.max_timeout, max(self.min_timeout, latency * self.timeout_multiplier))
+
+    def get_hedge_delay(self) -> float | None:
+        if len(self.latencies.samples) < self.min_samples:
+            return None
+        return self.latencies.percentile(self.hedge_percentile)
+
+    def reject(self, detail: str, retry_after: int = 1):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{self.name} {detail}",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    async def attempt(self, func: Callable[..., Awaitable], args: tuple, kwargs: dict) -> Any:
+        self.in_flight += 1
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            async with asyncio.timeout(self.get_timeout()):
+                result = await func(*args, **kwargs)
+            outcome = "success"
+        except TimeoutError:
+            self.timeouts += 1
+            outcome = "timeout"
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            self.in_flight -= 1
+            latency = time.perf_counter() - start
+            PROVIDER_REQUEST_DURATION.labels(self.name, outcome).observe(latency)
+
+        self.latencies.record(latency)
+        return result
+
+    async def hedged_attempt(self, func: Callable[..., Awaitable], args: tuple, kwargs: dict):
+        first = asyncio.ensure_future(self.attempt(func, args, kwargs))
+        hedge_delay = self.get_hedge_delay()
+        tasks = {first}
+
+        try:
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done and self.in_flight < self.max_in_flight:
+                    self.hedges += 1
+                    tasks.add(asyncio.ensure_future(self.attempt(func, args, kwargs)))
+
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not tasks:
+                    raise done.pop().exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, func: Callable[..., Awaitable], *args, hedge: bool = False, **kwargs):
+        """Call `func(*args, **kwargs)` under the policy. Only pass `hedge=True` for calls that
+        are safe to make twice."""
+        if not self.breaker.allow():
+            self.reject("is unavailable", retry_after=self.breaker.retry_after())
+        if self.in_flight >= self.max_in_flight:
+            if self.breaker.state == HALF_OPEN:
+                self.breaker.trial_in_flight = False
+            self.reject("is overloaded")
+
+        self.calls += 1
+        try:
+            if hedge:
+                result = await self.hedged_attempt(func, args, kwargs)
+            else:
+                result = await self.attempt(func, args, kwargs)
+        except asyncio.CancelledError:
+            if self.breaker.state == HALF_OPEN:
+                self.breaker.trial_in_flight = False
+            raise
+        except Exception:
+            self.failures += 1
+            was_open = self.breaker.state == OPEN
+            self.breaker.record_failure()
+            if not was_open and self.breaker.state == OPEN:
+                logger.warning(f"[Resilience] {self.name} circuit opened")
+            raise
+
+        self.breaker.record_success()
+        return result
+
+    async def request(
+        self, client: httpx.AsyncClient, method: str, url: str, hedge: bool = False, **kwargs
+    ) -> httpx.Response:
+        """`call` for a single HTTP request, 5xx answers count as failures."""
+
+        async def send() -> httpx.Response:
+            return raise_for_server_error(await client.request(method, url, **kwargs))
+
+        return await self.call(send, hedge=hedge)
+
+    def get_stats(self) -> dict:
+        p50 = self.latencies.percentile(50)
+        p99 = self.latencies.percentile(99)
+        return {
+            "state": self.breaker.get_state(),
+            "opened": self.breaker.opened_count,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "hedges": self.hedges,
+            "timeout": round(self.get_timeout(), 4),
+            "latency_p50": None if p50 is None else round(p50, 4),
+            "latency_p99": None if p99 is None else round(p99, 4),
+        }
+
+
+provider_policies: dict[str, ProviderPolicy] = {}
+
+
+def get_provider_policy(provider: str) -> ProviderPolicy:
+    """Per process policy of a provider, the bulkhead is as large as its connection pool."""
+    if provider not in provider_policies:
+        timeout, max_connections = PROVIDERS[provider]
+        provider_policies[provider] = ProviderPolicy(
+            name=provider, max_in_flight=max_connections, max_timeout=timeout
+        )
+
+    return provider_policies[provider]
+
+
+def get_provider_stats() -> dict:
+    return {provider: policy.get_stats() for provider, policy in provider_policies.items()}
@@ -16,6 +16,26 @@ class BasicQueryParams(BaseModel):
     order_by: Annotated[
         Literal["asc", "desc"], Query(description="Sort order", examples=["desc"])
     ] = "desc"
+    pagination: Annotated[
+        Literal["offset", "cursor"],
+        Query(description="cursor: keyset pagination through next_cursor, page is ignored"),
+    ] = "offset"
+    cursor: Annotated[
+        str | None, Query(description="next_cursor of the previous page, implies cursor mode")
+    ] = None
+    count: Annotated[
+        Literal["exact", "estimated"] | None,
+        Query(
+            description="Total count: exact, or estimated from Postgres statistics. "
+            "Offset pagination defaults to exact, cursor pagination leaves it out unless asked"
+        ),
+    ] = None
+
+    def use_cursor(self) -> bool:
+        return self.pagination == "cursor" or self.cursor is not None
+
+    def get_count_mode(self) -> str | None:
+        return self.count or (None if self.use_cursor() else "exact")
 
 
 class PaginatedDataResponse(BaseModel, Generic[T]):
@@ -27,6 +47,16 @@ class PaginatedDataResponse(BaseModel, Generic[T]):
     data: list[T]
 
 
+class CursorPaginatedDataResponse(BaseModel, Generic[T]):
+    next_cursor: str | None = Field(
+        ..., description="Cursor of the next page, null on the last page"
+    )
+    total_count: int | None = Field(
+        None, description="Total count of data, only when asked for with count"
+    )
+    data: list[T]
+
+
 class ListDataResponse(BaseModel, Generic[T]):
     data: list[T]
 
@@ -1,5 +1,3 @@
-import logging
-
 import requests
 
 from src.logger import logger
@@ -11,13 +9,7 @@ class MitakeSMS:
         self.password = password
         self.api_url = api_url
         self.check_point_url = check_point_url
-
-        logging.basicConfig(
-            filename="mitake_sms.log",
-            level=logging.INFO,
-            format="[%(levelname)s] %(asctime)s - %(message)s",
-        )
-        self.logger = logging.getLogger("mitake_sms")
+        self.logger = logger.bind(provider="mitake_sms")
 
     def send_sms_code(self, phone: str, sms_message: str):
         self.phone = phone
@@ -45,9 +37,7 @@ class MitakeSMS:
             msg = f"[成功]: 點數剩餘 {self.points} 發送至 {self.phone}，內容為: {self.sms_message}"
 
             self.logger.info(msg)
-            logger.info(msg)
         else:
-            logger.error(f"[失敗]: error message: {response.text}")
             self.logger.error(f"[失敗]: error message: {response.text}")
 
     def query_sms_points(self):
@@ -0,0 +1,39 @@
+from typing import Annotated
+
+from fastapi import Depends, Header, HTTPException, status
+
+from src.auth.dependencies import get_current_active_user
+from src.config import settings
+from src.database import get_redis_client
+from src.models import User
+from src.waiting_room.service import WaitingRoom, verify_queue_ticket
+
+
+async def get_waiting_room() -> WaitingRoom:
+    return WaitingRoom(await get_redis_client())
+
+
+async def require_queue_admission(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    waiting_room: Annotated[WaitingRoom, Depends(get_waiting_room)],
+    queue_ticket: Annotated[str | None, Header(alias="X-Queue-Ticket")] = None,
+) -> int | None:
+    """Gate of the purchase flow, returns the event the user has been admitted to.
+
+    Returns None when the waiting room is disabled.
+    """
+    if not settings.WAITING_ROOM_ENABLED:
+        return None
+
+    if queue_ticket is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Queue ticket required")
+
+    claims = verify_queue_ticket(queue_ticket)
+
+    if claims.get("sub") != current_user.account:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid queue ticket")
+
+    if not await waiting_room.is_admitted(claims.get("event_id"), claims.get("tid")):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not admitted yet")
+
+    return claims.get("event_id")
@@ -0,0 +1,111 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.dependencies import get_current_active_user, get_current_admin_user
+from src.database import get_db_session
+from src.models import User
+from src.waiting_room.dependencies import get_waiting_room
+from src.waiting_room.schemas import AdmissionRate, QueueStatus, QueueTicket
+from src.waiting_room.service import (
+    WaitingRoom,
+    create_queue_ticket,
+    is_event_on_sale,
+    verify_queue_ticket,
+)
+
+router = APIRouter(
+    tags=["waiting room"],
+)
+
+
+@router.post(
+    "/v1/events/{event_id}/waiting-room",
+    response_model=QueueTicket,
+)
+async def join_waiting_room(
+    event_id: int,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    waiting_room: Annotated[WaitingRoom, Depends(get_waiting_room)],
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+):
+    if not await is_event_on_sale(session=session, event_id=event_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event is not on sale")
+
+    ticket_id = await waiting_room.join(event_id=event_id, account=current_user.account)
+    admitted, position = await waiting_room.get_status(event_id=event_id, ticket_id=ticket_id)
+
+    return QueueTicket(
+        queue_ticket=create_queue_ticket(
+            account=current_user.account, event_id=event_id, ticket_id=ticket_id
+        ),
+        admitted=admitted,
+        position=position,
+    )
+
+
+@router.get(
+    "/v1/events/{event_id}/waiting-room/status",
+    response_model=QueueStatus,
+)
+async def get_waiting_room_status(
+    event_id: int,
+    queue_ticket: Annotated[str, Header(alias="X-Queue-Ticket")],
+    waiting_room: Annotated[WaitingRoom, Depends(get_waiting_room)],
+):
+    """Polled by clients in the queue: signature check plus one Redis script, no Postgres."""
+    claims = verify_queue_ticket(queue_ticket, event_id=event_id)
+
+    admitted, position = await waiting_room.get_status(event_id=event_id, ticket_id=claims["tid"])
+
+    if admitted or position is None:
+        poll_after_seconds = 0
+    else:
+        rate, _ = await waiting_room.get_rate(event_id=event_id)
+        poll_after_seconds = min(max(position / rate, 1), 30)
+
+    return QueueStatus(admitted=admitted, position=position, poll_after_seconds=poll_after_seconds)
+
+
+@router.get(
+    "/v1/events/{event_id}/waiting-room/rate",
+    response_model=AdmissionRate,
+)
+async def get_admission_rate(
+    event_id: int,
+    _: Annotated[User, Depends(get_current_admin_user)],
+    waiting_room: Annotated[WaitingRoom, Depends(get_waiting_room)],
+):
+    rate, burst = await waiting_room.get_rate(event_id=event_id)
+
+    return AdmissionRate(rate=rate, burst=burst)
+
+
+@router.put(
+    "/v1/events/{event_id}/waiting-room/rate",
+    response_model=AdmissionRate,
+)
+async def update_admission_rate(
+    event_id: int,
+    admission_rate: Annotated[AdmissionRate, Body()],
+    _: Annotated[User, Depends(get_current_admin_user)],
+    waiting_room: Annotated[WaitingRoom, Depends(get_waiting_room)],
+):
+    await waiting_room.set_rate(
+        event_id=event_id, rate=admission_rate.rate, burst=admission_rate.burst
+    )
+
+    return admission_rate
+
+
+@router.delete(
+    "/v1/events/{event_id}/waiting-room",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def close_waiting_room(
+    event_id: int,
+    _: Annotated[User, Depends(get_current_admin_user)],
+    waiting_room: Annotated[WaitingRoom, Depends(get_waiting_room)],
+):
+    await waiting_room.close(event_id=event_id)
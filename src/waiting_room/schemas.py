@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field
+
+
+class QueueTicket(BaseModel):
+    queue_ticket: str
+    admitted: bool
+    position: int | None
+
+
+class QueueStatus(BaseModel):
+    admitted: bool
+    position: int | None = Field(..., description="Position in queue, null if ticket expired")
+    poll_after_seconds: float = Field(..., description="Suggested delay before polling again")
+
+
+class AdmissionRate(BaseModel):
+    rate: float = Field(..., gt=0, description="Users admitted per second")
+    burst: int = Field(..., ge=1, description="Max users admitted at once")
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {"rate": 50, "burst": 100},
+        }
+    }
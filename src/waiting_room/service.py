@@ -0,0 +1,244 @@
+import time
+import uuid
+from datetime import UTC, datetime, timedelta
+from functools import lru_cache
+from typing import Any
+
+from fastapi import HTTPException, status
+from jose import JWTError
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.token import get_jwt_backend
+from src.config import settings
+from src.constants import QUEUE_TICKET_TYPE
+from src.models import Event
+
+# Events with a queue for the admitter, scored by when someone last joined
+ACTIVE_EVENTS_KEY = "waiting_room:active_events"
+# Queue tickets are only ever verified by this service, so they stay on HMAC whatever ALGORITHM
+# the access tokens use
+QUEUE_TICKET_ALGORITHM = "HS256"
+
+# KEYS: queue, admitted, accounts, seq  ARGV: account, new ticket id
+JOIN_SCRIPT = """
+local existing = redis.call('HGET', KEYS[3], ARGV[1])
+if existing then
+    if redis.call('ZSCORE', KEYS[1], existing) then
+        return existing
+    end
+    local now = redis.call('TIME')
+    local expires_at = redis.call('ZSCORE', KEYS[2], existing)
+    if expires_at and tonumber(expires_at) > tonumber(now[1]) * 1000 then
+        return existing
+    end
+end
+redis.call('ZADD', KEYS[1], redis.call('INCR', KEYS[4]), ARGV[2])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+return ARGV[2]
+"""
+
+# KEYS: queue, admitted  ARGV: ticket id
+# Returns {1, 0} when admitted, {0, position} while waiting and {0, -1} for unknown tickets
+STATUS_SCRIPT = """
+local now = redis.call('TIME')
+local expires_at = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if expires_at and tonumber(expires_at) > tonumber(now[1]) * 1000 then
+    return {1, 0}
+end
+local rank = redis.call('ZRANK', KEYS[1], ARGV[1])
+if rank then
+    return {0, rank + 1}
+end
+return {0, -1}
+"""
+
+# Token bucket, refilled at `rate` tokens per second up to `burst`. Redis TIME is the clock, so
+# every worker can run the admitter at the same time without admitting more than `rate`.
+# KEYS: queue, admitted, bucket  ARGV: default rate, default burst, admission ttl seconds
+# Returns {admitted, still waiting}
+ADMIT_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[3], 'rate', 'burst', 'tokens', 'updated_at')
+local rate = tonumber(bucket[1] or ARGV[1])
+local burst = tonumber(bucket[2] or ARGV[2])
+local tokens = tonumber(bucket[3] or burst)
+local updated_at = tonumber(bucket[4] or now_ms)
+tokens = math.min(burst, tokens + (now_ms - updated_at) * rate / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now_ms)
+local admitted = 0
+local count = math.floor(tokens)
+if count > 0 then
+    local popped = redis.call('ZPOPMIN', KEYS[1], count)
+    local expires_at = now_ms + tonumber(ARGV[3]) * 1000
+    for i = 1, #popped, 2 do
+        redis.call('ZADD', KEYS[2], expires_at, popped[i])
+        admitted = admitted + 1
+    end
+    tokens = tokens - admitted
+end
+redis.call('HSET', KEYS[3], 'tokens', tostring(tokens), 'updated_at', now_ms)
+return {admitted, redis.call('ZCARD', KEYS[1])}
+"""
+
+# Drops a drained event from the active ones, unless someone joined since it was seen drained
+# KEYS: active events  ARGV: event id, its score when it was seen drained
+DEACTIVATE_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) == tonumber(ARGV[2]) then
+    return redis.call('ZREM', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+@lru_cache
+def get_queue_ticket_signer() -> tuple[Any, Any]:
+    """(JWT backend, prepared key) of queue tickets."""
+    backend = get_jwt_backend()
+    secret = settings.WAITING_ROOM_TICKET_SECRET or settings.SECRET_KEY
+
+    return backend, backend.prepare_key(secret, QUEUE_TICKET_ALGORITHM)
+
+
+def create_queue_ticket(account: str, event_id: int, ticket_id: str) -> str:
+    expire = datetime.now(UTC) + timedelta(minutes=settings.WAITING_ROOM_TICKET_EXPIRE_MINUTES)
+    to_encode = {
+        "sub": account,
+        "typ": QUEUE_TICKET_TYPE,
+        "event_id": event_id,
+        "tid": ticket_id,
+        "exp": expire,
+    }
+    backend, key = get_queue_ticket_signer()
+    return backend.encode(to_encode, key, algorithm=QUEUE_TICKET_ALGORITHM)
+
+
+def verify_queue_ticket(queue_ticket: str, event_id: int | None = None) -> dict:
+    """Check the signature of a queue ticket without touching Redis or Postgres."""
+    try:
+        backend, key = get_queue_ticket_signer()
+        claims = backend.decode(queue_ticket, key, algorithms=[QUEUE_TICKET_ALGORITHM])
+    except JWTError as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid queue ticket"
+        ) from e
+
+    if (
+        claims.get("typ") != QUEUE_TICKET_TYPE
+        or claims.get("event_id") is None
+        or claims.get("tid") is None
+        or (event_id is not None and claims["event_id"] != event_id)
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid queue ticket")
+
+    return claims
+
+
+async def is_event_on_sale(session: AsyncSession, event_id: int) -> bool:
+    query = select(Event.event_id).where(
+        Event.event_id == event_id, Event.on_sale.is_(True), Event.is_deleted.is_(False)
+    )
+    return await session.scalar(query) is not None
+
+
+class WaitingRoom:
+    """Per-event admission queue living entirely in Redis, so it survives app restarts and the
+    clients polling their position never reach Postgres."""
+
+    def __init__(self, redis_client: Redis):
+        self.redis_client = redis_client
+        self.join_script = redis_client.register_script(JOIN_SCRIPT)
+        self.status_script = redis_client.register_script(STATUS_SCRIPT)
+        self.admit_script = redis_client.register_script(ADMIT_SCRIPT)
+        self.deactivate_script = redis_client.register_script(DEACTIVATE_SCRIPT)
+
+    @staticmethod
+    def get_keys(event_id: int) -> dict[str, str]:
+        prefix = f"waiting_room:{{{event_id}}}"
+        return {
+            "queue": f"{prefix}:queue",
+            "admitted": f"{prefix}:admitted",
+            "accounts": f"{prefix}:accounts",
+            "seq": f"{prefix}:seq",
+            "bucket": f"{prefix}:bucket",
+        }
+
+    async def join(self, event_id: int, account: str) -> str:
+        """Queue the account for the event. Joining again keeps the original place.
+
+        Only call it for events on sale, see `is_event_on_sale`.
+        """
+        keys = self.get_keys(event_id)
+
+        ticket_id = await self.join_script(
+            keys=[keys["queue"], keys["admitted"], keys["accounts"], keys["seq"]],
+            args=[account, uuid.uuid4().hex],
+        )
+        await self.redis_client.zadd(ACTIVE_EVENTS_KEY, {event_id: time.time()})
+
+        return ticket_id
+
+    async def get_status(self, event_id: int, ticket_id: str) -> tuple[bool, int | None]:
+        """(admitted, position in queue), position is None for unknown or expired tickets."""
+        keys = self.get_keys(event_id)
+
+        admitted, position = await self.status_script(
+            keys=[keys["queue"], keys["admitted"]], args=[ticket_id]
+        )
+
+        return bool(admitted), None if position < 0 else position
+
+    async def is_admitted(self, event_id: int, ticket_id: str) -> bool:
+        admitted, _ = await self.get_status(event_id, ticket_id)
+        return admitted
+
+    async def admit(self, event_id: int) -> tuple[int, int]:
+        """(admitted, still waiting)"""
+        keys = self.get_keys(event_id)
+
+        admitted, waiting = await self.admit_script(
+            keys=[keys["queue"], keys["admitted"], keys["bucket"]],
+            args=[
+                settings.WAITING_ROOM_ADMIT_RATE,
+                settings.WAITING_ROOM_ADMIT_BURST,
+                settings.WAITING_ROOM_ADMISSION_TTL_SECONDS,
+            ],
+        )
+        return admitted, waiting
+
+    async def admit_all(self) -> int:
+        """Admit the next users of every active event. An event leaves the active ones once its
+        queue has drained, and comes back with the next join."""
+        admitted = 0
+        active_events = await self.redis_client.zrange(ACTIVE_EVENTS_KEY, 0, -1, withscores=True)
+        for event_id, joined_at in active_events:
+            count, waiting = await self.admit(int(event_id))
+            admitted += count
+            if waiting == 0:
+                await self.deactivate_script(
+                    keys=[ACTIVE_EVENTS_KEY], args=[event_id, repr(joined_at)]
+                )
+        return admitted
+
+    async def get_rate(self, event_id: int) -> tuple[float, int]:
+        rate, burst = await self.redis_client.hmget(
+            self.get_keys(event_id)["bucket"], "rate", "burst"
+        )
+        return (
+            settings.WAITING_ROOM_ADMIT_RATE if rate is None else float(rate),
+            settings.WAITING_ROOM_ADMIT_BURST if burst is None else int(burst),
+        )
+
+    async def set_rate(self, event_id: int, rate: float, burst: int) -> None:
+        """Change how many users per second get into the purchase flow, effective on the next
+        admitter tick of every worker."""
+        await self.redis_client.hset(
+            self.get_keys(event_id)["bucket"], mapping={"rate": rate, "burst": burst}
+        )
+
+    async def close(self, event_id: int) -> None:
+        await self.redis_client.zrem(ACTIVE_EVENTS_KEY, event_id)
+        await self.redis_client.delete(*self.get_keys(event_id).values())
@@ -0,0 +1,19 @@
+import asyncio
+
+from src.config import settings
+from src.logger import logger
+from src.waiting_room.service import WaitingRoom
+
+
+async def run_waiting_room_admitter(waiting_room: WaitingRoom, interval: float | None = None):
+    """Background loop that lets the next users of every open waiting room into the purchase
+    flow, at the admission rate of each event."""
+    interval = interval or settings.WAITING_ROOM_ADMIT_INTERVAL_SECONDS
+
+    while True:
+        try:
+            await waiting_room.admit_all()
+        except Exception as exc:
+            logger.exception(exc)
+
+        await asyncio.sleep(interval)
@@ -1,21 +1,35 @@
+from datetime import date, datetime
+from datetime import time as dt_time
+
+import pytest
 import pytest_asyncio
+from fakeredis import FakeAsyncRedis
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy import delete
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from src.auth.dependencies import get_current_user
+from src.cache import local_caches
 from src.config import settings
 from src.constants import Role
+from src.database import get_redis_client
 from src.main import app
-from src.models import User
+from src.models import Event, User
 
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    echo=True,
-)
+# Shared by every test module, large enough for the concurrent reservation tests
+engine = create_async_engine(settings.DATABASE_URL, pool_size=40, max_overflow=0)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+EVENT_DEFAULTS = {
+    "event_date": date(2030, 1, 1),
+    "event_time": dt_time(19, 30),
+    "sale_time": datetime(2029, 12, 1),
+    "location": "Taipei Arena",
+    "address": "Taipei",
+    "organizer": "test",
+    "category": "concert",
+}
+
 
 def override_get_admin_user():
     return User(
@@ -29,7 +43,7 @@ def override_get_admin_user():
 app.dependency_overrides[get_current_user] = override_get_admin_user
 
 
-@pytest_asyncio.fixture(scope="module", autouse=True)
+@pytest_asyncio.fixture(scope="module", loop_scope="session", autouse=True)
 async def setup_db():
     async with AsyncSessionLocal() as session:
         async with session.begin():
@@ -54,6 +68,57 @@ async def setup_db():
             await session.commit()
 
 
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def db_engine():
+    yield engine
+
+    await engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def session_factory(db_engine) -> async_sessionmaker[AsyncSession]:
+    return AsyncSessionLocal
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def redis_client():
+    """An empty fake Redis, also handed to the app in place of the real one."""
+    redis_client = FakeAsyncRedis(decode_responses=True)
+    app.dependency_overrides[get_redis_client] = lambda: redis_client
+
+    yield redis_client
+
+    app.dependency_overrides.pop(get_redis_client)
+    # Their entries were read through this Redis
+    for local_cache in local_caches.values():
+        local_cache.clear()
+    await redis_client.aclose()
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def create_event(session_factory: async_sessionmaker[AsyncSession]):
+    """Insert an event, EVENT_DEFAULTS filling in the columns not given.
+
+    Everything created is deleted afterwards, along with what references it.
+    """
+    event_ids = []
+
+    async def create(**values) -> Event:
+        async with session_factory() as session:
+            event = Event(**{**EVENT_DEFAULTS, **values})
+            session.add(event)
+            await session.commit()
+
+        event_ids.append(event.event_id)
+        return event
+
+    yield create
+
+    async with session_factory() as session:
+        await session.execute(delete(Event).where(Event.event_id.in_(event_ids)))
+        await session.commit()
+
+
 @pytest_asyncio.fixture(loop_scope="session")
 async def client():
     host, port = "127.0.0.1", "8000"
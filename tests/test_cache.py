@@ -0,0 +1,87 @@
+import asyncio
+import statistics
+import time
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from src.cache import (
+    INVALIDATION_CHANNEL,
+    TTLCache,
+    local_caches,
+    run_cache_invalidation_listener,
+)
+from src.decorator import redis_cache
+
+READS = 2000
+EVENT = {
+    "event_id": 1,
+    "event_name": "2030 跨年演唱會",
+    "pictures": [
+        {"picture_id": i, "picture_url": f"https://example.com/{i}.jpg"} for i in range(5)
+    ],
+    "ticket_types": [{"ticket_type_id": i, "price": 1000 * i} for i in range(5)],
+}
+
+
+@redis_cache(prefix="test_event_l2_only", expiration=60)
+async def get_event_l2_only(redis_client, event_id: int) -> dict:
+    return EVENT
+
+
+@redis_cache(prefix="test_event_l1", expiration=60, local_ttl=60)
+async def get_event_l1(redis_client, event_id: int) -> dict:
+    return EVENT
+
+
+async def measure_latencies(get_event, redis_client) -> tuple[float, float]:
+    await get_event(redis_client=redis_client, event_id=1)
+
+    latencies = []
+    for _ in range(READS):
+        start = time.perf_counter()
+        await get_event(redis_client=redis_client, event_id=1)
+        latencies.append((time.perf_counter() - start) * 1_000_000)
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return quantiles[49], quantiles[98]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_l1_read_latency(redis_client: FakeAsyncRedis):
+    l2_p50, l2_p99 = await measure_latencies(get_event_l2_only, redis_client)
+    l1_p50, l1_p99 = await measure_latencies(get_event_l1, redis_client)
+
+    print(
+        f"\ncached event read us: L1 off p50 {l2_p50:.1f} p99 {l2_p99:.1f}, "
+        f"L1 on p50 {l1_p50:.1f} p99 {l1_p99:.1f}"
+    )
+    assert l1_p50 < l2_p50
+    assert local_caches["test_event_l1"].get_stats()["hits"] == READS
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_invalidation_reaches_other_workers(redis_client: FakeAsyncRedis):
+    listener = asyncio.create_task(run_cache_invalidation_listener(redis_client))
+    try:
+        await asyncio.sleep(0.1)
+        await get_event_l1(redis_client=redis_client, event_id=2)
+        assert local_caches["test_event_l1"].get_stats()["size"] > 0
+
+        # Published by another worker, which also bumped the namespace version
+        await redis_client.publish(INVALIDATION_CHANNEL, "test_event_l1")
+        await asyncio.sleep(0.1)
+
+        assert local_caches["test_event_l1"].get_stats()["size"] == 0
+    finally:
+        listener.cancel()
+
+
+def test_local_cache_memory_cap():
+    cache = TTLCache(maxsize=100, ttl=60, maxbytes=1000)
+
+    for i in range(10):
+        cache.set(i, "x", size=300)
+
+    assert cache.get_stats()["bytes"] == 900
+    assert list(cache.data) == [7, 8, 9]
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from httpx import AsyncClient
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import src.auth.service
+from src.auth.utils import blocking_verify_password
+from src.executor import BoundedExecutor
+from src.models import User
+
+LOGINS = 200
+PASSWORD = "correct horse battery staple"
+
+
+async def verify_password_per_call_executor(plain_password: str, hashed_password: str) -> bool:
+    """The previous implementation, which built a new pool for every login"""
+    loop = asyncio.get_event_loop()
+    with ThreadPoolExecutor() as pool:
+        return await loop.run_in_executor(
+            pool, blocking_verify_password, plain_password, hashed_password
+        )
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def login_user(session_factory: async_sessionmaker[AsyncSession]):
+    hashed_password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=8)).decode()
+
+    async with session_factory() as session:
+        await session.merge(User(user_id=1002, account="test_login", password=hashed_password))
+        await session.commit()
+
+    yield "test_login"
+
+    async with session_factory() as session:
+        await session.execute(delete(User).where(User.user_id == 1002))
+        await session.commit()
+
+
+async def measure_logins(client: AsyncClient, account: str) -> float:
+    semaphore = asyncio.Semaphore(20)
+
+    async def login():
+        async with semaphore:
+            resp = await client.post("/v1/login", data={"username": account, "password": PASSWORD})
+            assert resp.status_code == 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(LOGINS)))
+
+    return LOGINS / (time.perf_counter() - start)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_login_throughput(
+    client: AsyncClient, login_user: str, monkeypatch: pytest.MonkeyPatch
+):
+    shared_rate = await measure_logins(client, login_user)
+
+    monkeypatch.setattr(src.auth.service, "verify_password", verify_password_per_call_executor)
+    per_call_rate = await measure_logins(client, login_user)
+
+    print(f"\nlogins/sec: shared pool {shared_rate:.0f}, pool per call {per_call_rate:.0f}")
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_saturated_executor_sheds_load():
+    executor = BoundedExecutor(max_workers=1, max_pending=2)
+
+    results = await asyncio.gather(
+        *(executor.run(time.sleep, 0.05) for _ in range(5)), return_exceptions=True
+    )
+    executor.shutdown()
+
+    rejected = [result for result in results if isinstance(result, HTTPException)]
+    assert len(rejected) == 2
+    assert all(exc.status_code == 503 for exc in rejected)
+    assert executor.get_stats()["rejected"] == 2
+    assert executor.get_stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cancelled_callers_keep_counting_until_their_job_is_done():
+    executor = BoundedExecutor(max_workers=1, max_pending=0)
+    job_started = threading.Event()
+    job_released = threading.Event()
+
+    def job():
+        job_started.set()
+        job_released.wait()
+
+    # E.g. the client disconnected while its password was being hashed
+    caller = asyncio.create_task(executor.run(job))
+    try:
+        await asyncio.to_thread(job_started.wait)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+
+        # The only worker is still busy
+        assert executor.get_stats()["in_flight"] == 1
+        with pytest.raises(HTTPException):
+            await executor.run(time.sleep, 0)
+    finally:
+        job_released.set()
+
+    await asyncio.sleep(0.05)
+    assert executor.get_stats()["in_flight"] == 0
+    assert await executor.run(sum, [1, 2]) == 3
+    executor.shutdown()
@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import src.database
+from src.config import settings
+from src.database import (
+    SessionLimiter,
+    check_connection_budget,
+    engine_options,
+    get_db_session,
+    get_engine_options,
+)
+
+REQUESTS = 12
+QUERY_SECONDS = 0.3
+
+
+def test_pool_profiles(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "MODE", "prod")
+    options = get_engine_options()
+    assert options["pool_size"] == 10
+    assert options["max_overflow"] == 10
+    assert options["pool_pre_ping"] is True
+
+    monkeypatch.setattr(settings, "DATABASE_POOL_PROFILE", "high_throughput")
+    monkeypatch.setattr(settings, "DATABASE_POOL_SIZE", 30)
+    monkeypatch.setattr(settings, "DATABASE_STATEMENT_CACHE_SIZE", 0)
+    options = get_engine_options()
+    assert options["pool_size"] == 30
+    assert options["max_overflow"] == 0
+    assert options["pool_pre_ping"] is False
+    assert options["connect_args"]["prepared_statement_cache_size"] == 0
+
+
+def test_connection_budget():
+    options = {"pool_size": 10, "max_overflow": 10}
+    # 12 x 20 fits in 250 - 10
+    check_connection_budget(
+        workers=12, max_connections=250, reserved_connections=10, options=options
+    )
+
+    with pytest.raises(RuntimeError, match="13 workers x 20 connections"):
+        check_connection_budget(
+            workers=13, max_connections=250, reserved_connections=10, options=options
+        )
+
+
+async def run_requests(session_engine, limiter: SessionLimiter | None) -> list[tuple[str, float]]:
+    """(outcome, seconds) of REQUESTS concurrent requests that each hold a connection for
+    QUERY_SECONDS, with or without the limiter in front of the pool."""
+
+    async def request() -> tuple[str, float]:
+        start = time.perf_counter()
+        try:
+            if limiter is None:
+                async with session_engine.connect() as conn:
+                    await conn.execute(text(f"SELECT pg_sleep({QUERY_SECONDS})"))
+            else:
+                async with limiter.limit(), session_engine.connect() as conn:
+                    await conn.execute(text(f"SELECT pg_sleep({QUERY_SECONDS})"))
+            outcome = "ok"
+        except exc.TimeoutError:
+            outcome = "pool timeout"
+        except Exception as e:
+            outcome = str(getattr(e, "status_code", e))
+        return outcome, time.perf_counter() - start
+
+    return await asyncio.gather(*(request() for _ in range(REQUESTS)))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_saturated_pool_is_refused_fast():
+    session_engine = create_async_engine(
+        settings.DATABASE_URL,
+        **{**engine_options, "pool_size": 2, "max_overflow": 0, "pool_timeout": 1},
+    )
+    try:
+        # Before: every request waits in the pool, the ones it can't serve fail after pool_timeout
+        unlimited = await run_requests(session_engine, limiter=None)
+
+        # After: 2 run, 2 wait for a session and the others are turned away right away
+        limiter = SessionLimiter("test", max_concurrency=2, max_queued=2, queue_timeout=1)
+        limited = await run_requests(session_engine, limiter=limiter)
+    finally:
+        await session_engine.dispose()
+
+    def summarize(results: list[tuple[str, float]]) -> dict:
+        summary = {}
+        for outcome, seconds in results:
+            count, slowest = summary.get(outcome, (0, 0.0))
+            summary[outcome] = (count + 1, max(slowest, seconds))
+        return summary
+
+    unlimited_summary = summarize(unlimited)
+    limited_summary = summarize(limited)
+    print(
+        "\noutcome: (requests, slowest seconds)"
+        f"\n  pool only    {unlimited_summary}"
+        f"\n  with limiter {limited_summary}"
+    )
+    assert unlimited_summary["pool timeout"][1] >= 1
+    assert limited_summary["ok"][0] == 4
+    assert limited_summary["503"][0] == REQUESTS - 4
+    # Refused before waiting on anything
+    assert limited_summary["503"][1] < 0.1
+    assert limiter.rejected == REQUESTS - 4
+    assert limiter.in_use == limiter.queued == 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_session_dependency_returns_503(monkeypatch: pytest.MonkeyPatch):
+    limiter = SessionLimiter("test", max_concurrency=1, max_queued=0, queue_timeout=1)
+    monkeypatch.setattr(src.database, "primary_limiter", limiter)
+    test_app = FastAPI()
+
+    @test_app.get("/slow")
+    async def slow(session: AsyncSession = Depends(get_db_session)):
+        await session.execute(text(f"SELECT pg_sleep({QUERY_SECONDS})"))
+        return {}
+
+    async with AsyncClient(transport=ASGITransport(app=test_app), base_url="http://test") as client:
+        first, second = await asyncio.gather(client.get("/slow"), client.get("/slow"))
+
+    assert sorted([first.status_code, second.status_code]) == [200, 503]
+    refused = first if first.status_code == 503 else second
+    assert refused.headers["retry-after"] == "1"
+    assert limiter.get_stats() == {"max_concurrency": 1, "in_use": 0, "queued": 0, "rejected": 1}
@@ -0,0 +1,180 @@
+import asyncio
+import time
+
+import orjson
+import pytest
+from fakeredis import FakeAsyncRedis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.cache import clear_local_cache
+from src.decorator import invalidate_redis_cache, make_cache_key, redis_cache
+from src.schemas import BasicQueryParams
+
+
+class BrokenRedis:
+    async def evalsha(self, *args, **kwargs):
+        raise RedisConnectionError("Redis is down")
+
+    async def set(self, *args, **kwargs):
+        raise RedisConnectionError("Redis is down")
+
+
+def counting_function(**cache_kwargs):
+    calls = []
+
+    @redis_cache(prefix=f"test_{id(calls)}", **cache_kwargs)
+    async def get_value(
+        redis_client, params: BasicQueryParams, delay: float = 0, fail: bool = False
+    ):
+        calls.append(params.page)
+        await asyncio.sleep(delay)
+        if fail:
+            raise ValueError("provider failed")
+        return {"page": params.page, "call": len(calls)}
+
+    return get_value, calls
+
+
+def test_cache_keys_are_stable():
+    assert make_cache_key((), {"params": BasicQueryParams(page=2), "category": None}) == (
+        make_cache_key((), {"category": None, "params": BasicQueryParams(page=2)})
+    )
+    assert make_cache_key((), {"params": BasicQueryParams(page=2)}) != (
+        make_cache_key((), {"params": BasicQueryParams(page=3)})
+    )
+    with pytest.raises(TypeError):
+        make_cache_key((object(),), {})
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrent_misses_compute_once(redis_client: FakeAsyncRedis):
+    get_value, calls = counting_function()
+
+    results = await asyncio.gather(
+        *(
+            get_value(redis_client=redis_client, params=BasicQueryParams(page=1), delay=0.05)
+            for _ in range(100)
+        )
+    )
+
+    assert calls == [1]
+    assert all(result == {"page": 1, "call": 1} for result in results)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_redis_failure_does_not_call_twice():
+    get_value, calls = counting_function()
+
+    assert await get_value(redis_client=BrokenRedis(), params=BasicQueryParams(page=1)) == {
+        "page": 1,
+        "call": 1,
+    }
+    with pytest.raises(ValueError):
+        await get_value(redis_client=BrokenRedis(), params=BasicQueryParams(page=2), fail=True)
+
+    assert calls == [1, 2]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cancelled_caller_does_not_cancel_the_others():
+    get_value, calls = counting_function()
+    params = BasicQueryParams(page=1)
+
+    first = asyncio.create_task(get_value(redis_client=BrokenRedis(), params=params, delay=0.05))
+    await asyncio.sleep(0.01)
+    others = [
+        asyncio.create_task(get_value(redis_client=BrokenRedis(), params=params, delay=0.05))
+        for _ in range(10)
+    ]
+    await asyncio.sleep(0.01)
+
+    # E.g. its client disconnected
+    first.cancel()
+    results = await asyncio.gather(*others)
+
+    assert first.cancelled()
+    assert calls == [1, 1]
+    assert all(result == {"page": 1, "call": 2} for result in results)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_namespace_invalidation(redis_client: FakeAsyncRedis):
+    get_value, calls = counting_function()
+    params = BasicQueryParams(page=1)
+
+    await get_value(redis_client=redis_client, params=params)
+    await get_value(redis_client=redis_client, params=params)
+    assert len(calls) == 1
+
+    await invalidate_redis_cache(redis_client, f"test_{id(calls)}")
+
+    assert await get_value(redis_client=redis_client, params=params) == {"page": 1, "call": 2}
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_stale_while_revalidate(
+    redis_client: FakeAsyncRedis, monkeypatch: pytest.MonkeyPatch
+):
+    get_value, calls = counting_function(expiration=60, beta=0)
+    params = BasicQueryParams(page=1)
+
+    await get_value(redis_client=redis_client, params=params)
+
+    # Past the soft expiry, another process is already refreshing: serve the stale value
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    for key in await redis_client.keys(f"cache:{{test_{id(calls)}}}:*"):
+        if not key.endswith(":version"):
+            await redis_client.set(f"{key}:lock", "other", px=10_000)
+
+    assert await get_value(redis_client=redis_client, params=params) == {"page": 1, "call": 1}
+    assert len(calls) == 1
+
+    # Lock free: this caller refreshes
+    for key in await redis_client.keys("cache:*:lock"):
+        await redis_client.delete(key)
+
+    assert await get_value(redis_client=redis_client, params=params) == {"page": 1, "call": 2}
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_probabilistic_early_expiry(
+    redis_client: FakeAsyncRedis, monkeypatch: pytest.MonkeyPatch
+):
+    get_value, calls = counting_function(expiration=60, beta=1000)
+    params = BasicQueryParams(page=1)
+
+    await get_value(redis_client=redis_client, params=params, delay=0.01)
+
+    # Well before expiry, a slow function with a large beta gets refreshed early
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 55)
+    for _ in range(20):
+        await get_value(redis_client=redis_client, params=params, delay=0.01)
+
+    assert len(calls) > 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_raw_results_are_cached_as_bytes(redis_client: FakeAsyncRedis):
+    calls = []
+    namespace = f"test_{id(calls)}"
+
+    @redis_cache(prefix=namespace, raw=True, local_ttl=60)
+    async def get_body(redis_client, page: int) -> bytes:
+        calls.append(page)
+        return b'{"page":%d,"name":"\xe4\xb8\x80\xe8\x88\xac\xe7\xa5\xa8"}' % page
+
+    body = await get_body(redis_client=redis_client, page=1)
+    # L1 hit, then Redis hit once the L1 is gone
+    assert await get_body(redis_client=redis_client, page=1) is body
+    clear_local_cache(namespace)
+    assert await get_body(redis_client=redis_client, page=1) == body
+    assert calls == [1]
+
+    # An entry in the JSON format, written before `raw` was turned on, is a miss
+    for key in await redis_client.keys(f"cache:{{{namespace}}}:v[0-9]*"):
+        await redis_client.set(key, orjson.dumps({"v": {"page": 1}, "d": 0.1, "e": time.time()}))
+    clear_local_cache(namespace)
+    assert await get_body(redis_client=redis_client, page=1) == body
+    assert calls == [1, 1]
@@ -0,0 +1,205 @@
+import time
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from httpx import AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.database import engine as app_engine
+from src.database import get_redis_client
+from src.decorator import get_namespace_keys
+from src.event.service import (
+    EVENT_DETAIL_CACHE_PREFIX,
+    get_event_list,
+    query_event_list,
+)
+from src.main import app
+from src.models import EventPicture, EventTicketType
+from src.schemas import BasicQueryParams
+
+EVENTS = 30
+REQUESTS = 300
+CATEGORY = "test_catalogue"
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def event_ids(create_event) -> list[int]:
+    events = [
+        await create_event(
+            event_name=f"test_catalogue_event_{i}",
+            # The same sort value for all of them, paging has to fall back to the tie-breaker
+            created_at=datetime(2029, 11, 1),
+            category=CATEGORY,
+            pictures=[
+                EventPicture(picture_url=f"https://example.com/{i}/{j}.jpg", picture_order=j)
+                for j in range(3)
+            ],
+            ticket_types=[
+                EventTicketType(ticket_name=name, price=price, stock=100)
+                for name, price in (("VIP", 5000), ("一般票", 2800), ("身障票", 1400))
+            ],
+        )
+        for i in range(EVENTS)
+    ]
+
+    return [e.event_id for e in events]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_event_list_in_one_round_trip(
+    client: AsyncClient, redis_client: FakeAsyncRedis, event_ids: list[int]
+):
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args)
+
+    event.listen(app_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        resp = await client.get("/v1/events", params={"category": CATEGORY, "page_size": 20})
+        cached_resp = await client.get("/v1/events", params={"category": CATEGORY, "page_size": 20})
+    finally:
+        event.remove(app_engine.sync_engine, "before_cursor_execute", count_statement)
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["total_count"] == EVENTS
+    assert body["total_pages"] == 2
+    assert len(body["data"]) == 20
+    assert [p["picture_order"] for p in body["data"][0]["pictures"]] == [0, 1, 2]
+    assert len(body["data"][0]["ticket_types"]) == 3
+    assert cached_resp.json() == body
+    assert len(statements) == 1
+
+    resp = await client.get("/v1/events", params={"category": CATEGORY, "page_size": 20, "page": 3})
+    assert resp.json()["total_count"] == EVENTS
+    assert resp.json()["data"] == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_event_list_cache_benchmark(
+    session_factory: async_sessionmaker[AsyncSession],
+    redis_client: FakeAsyncRedis,
+    event_ids: list[int],
+):
+    params = BasicQueryParams(page_size=20)
+
+    async with session_factory() as session:
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            await query_event_list(session=session, params=params, category=CATEGORY)
+            session.expunge_all()
+        uncached_rate = REQUESTS / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            await get_event_list(
+                session=session, redis_client=redis_client, params=params, category=CATEGORY
+            )
+        cached_rate = REQUESTS / (time.perf_counter() - start)
+
+    print(f"\nevent list pages/sec: uncached {uncached_rate:.0f}, cached {cached_rate:.0f}")
+    assert cached_rate > uncached_rate
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_event_list_cursor_pagination(
+    client: AsyncClient, redis_client: FakeAsyncRedis, event_ids: list[int]
+):
+    params = {"category": CATEGORY, "page_size": 7, "order_by": "asc"}
+
+    resp = await client.get("/v1/events", params={**params, "page_size": EVENTS})
+    offset_ids = [e["event_id"] for e in resp.json()["data"]]
+
+    cursor_ids = []
+    body = (await client.get("/v1/events", params={**params, "pagination": "cursor"})).json()
+    assert body["total_count"] is None
+    while True:
+        cursor_ids += [e["event_id"] for e in body["data"]]
+        if body["next_cursor"] is None:
+            break
+        body = (
+            await client.get("/v1/events", params={**params, "cursor": body["next_cursor"]})
+        ).json()
+
+    assert cursor_ids == offset_ids == sorted(event_ids)
+
+    resp = await client.get(
+        "/v1/events", params={**params, "pagination": "cursor", "count": "estimated"}
+    )
+    assert resp.json()["total_count"] >= 1
+
+    resp = await client.get("/v1/events", params={**params, "cursor": "not-a-cursor"})
+    assert resp.status_code == 400
+
+    # A cursor only fits the sort it was made for
+    first = (await client.get("/v1/events", params={**params, "pagination": "cursor"})).json()
+    resp = await client.get(
+        "/v1/events", params={**params, "order_by": "desc", "cursor": first["next_cursor"]}
+    )
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_admin_changes_invalidate_cache(
+    client: AsyncClient, redis_client: FakeAsyncRedis, event_ids: list[int]
+):
+    event_id = event_ids[0]
+
+    resp = await client.get(f"/v1/events/{event_id}")
+    assert resp.json()["data"]["event_name"] == "test_catalogue_event_0"
+    ticket_type_id = resp.json()["data"]["ticket_types"][0]["ticket_type_id"]
+
+    resp = await client.patch(f"/v1/events/{event_id}", json={"event_name": "renamed"})
+    assert resp.status_code == 200
+
+    resp = await client.get(f"/v1/events/{event_id}")
+    assert resp.json()["data"]["event_name"] == "renamed"
+
+    resp = await client.patch(
+        f"/v1/events/{event_id}/ticket-types/{ticket_type_id}", json={"price": 4200}
+    )
+    assert resp.status_code == 200
+
+    resp = await client.get(f"/v1/events/{event_id}")
+    assert resp.json()["data"]["ticket_types"][0]["price"] == 4200
+
+    resp = await client.patch(f"/v1/events/{event_id}", json={"is_deleted": True})
+    assert resp.status_code == 200
+    assert (await client.get(f"/v1/events/{event_id}")).status_code == 404
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cache_is_invalidated_after_commit_only(
+    client: AsyncClient, redis_client: FakeAsyncRedis, event_ids: list[int]
+):
+    _, version_key = get_namespace_keys(EVENT_DETAIL_CACHE_PREFIX)
+    version = await redis_client.get(version_key)
+
+    # Nothing committed, nothing to invalidate
+    resp = await client.patch("/v1/events/0", json={"event_name": "missing"})
+    assert resp.status_code == 404
+    assert await redis_client.get(version_key) == version
+
+    # Committed while Redis is down, the change is not reported as failed
+    app.dependency_overrides[get_redis_client] = lambda: FakeAsyncRedis(connected=False)
+    try:
+        resp = await client.patch(f"/v1/events/{event_ids[1]}", json={"event_name": "renamed"})
+    finally:
+        app.dependency_overrides[get_redis_client] = lambda: redis_client
+
+    assert resp.status_code == 200
+    assert resp.json()["data"]["event_name"] == "renamed"
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_estimated_count_of_any_category(client: AsyncClient, redis_client: FakeAsyncRedis):
+    # The category looks like a bind parameter once rendered into the SQL
+    resp = await client.get(
+        "/v1/events", params={"category": "a :b", "pagination": "cursor", "count": "estimated"}
+    )
+    assert resp.status_code == 200
+    assert resp.json()["total_count"] >= 0
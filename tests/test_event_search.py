@@ -0,0 +1,182 @@
+import time
+from datetime import date, datetime
+from datetime import time as dt_time
+
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from httpx import AsyncClient
+from sqlalchemy import delete, event, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from src.database import engine as app_engine
+from src.event.service import is_trigram_available, query_event_search, search_events
+from src.models import Event
+
+ROWS = 500_000
+SEARCHES = 50
+CATEGORY = "test_search"
+
+
+def make_event(event_name: str, organizer: str, location: str, description: str) -> Event:
+    return Event(
+        event_name=event_name,
+        description=description,
+        event_date=date(2030, 1, 1),
+        event_time=dt_time(19, 30),
+        sale_time=datetime(2029, 12, 1),
+        location=location,
+        address="Taipei",
+        organizer=organizer,
+        category=CATEGORY,
+        on_sale=True,
+    )
+
+
+@pytest_asyncio.fixture(loop_scope="session", scope="module")
+async def events(db_engine: AsyncEngine, session_factory: async_sessionmaker[AsyncSession]):
+    async with session_factory() as session:
+        await session.execute(
+            text(
+                "INSERT INTO events (event_name, description, event_date, event_time, sale_time, "
+                "location, address, organizer, category, on_sale, is_deleted) "
+                "SELECT (ARRAY['rock', 'jazz', 'pop', 'indie', 'metal', 'folk', 'opera'])"
+                "[1 + i % 7] || ' night ' || i, "
+                "'An evening of live music with guests from all over the island', "
+                "DATE '2030-01-01', TIME '19:30', TIMESTAMP '2029-12-01', "
+                "(ARRAY['Taipei Arena', 'Kaohsiung Arena', 'Legacy Taichung'])[1 + i % 3], "
+                "'Taiwan', 'Organizer ' || i % 1000, :category, true, false "
+                "FROM generate_series(1, :rows) AS i"
+            ),
+            {"category": CATEGORY, "rows": ROWS},
+        )
+        session.add_all(
+            [
+                make_event(
+                    "Mayday Fly to 2030 Live",
+                    "B'in Music",
+                    "Taipei Dome",
+                    "The band plays every album, Mayday fans sing along",
+                ),
+                make_event(
+                    "Jazz by the River",
+                    "Mayday Productions",
+                    "Dadaocheng Wharf",
+                    "Open air jazz",
+                ),
+            ]
+        )
+        await session.commit()
+
+    async with db_engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE events"))
+
+    yield
+
+    async with session_factory() as session:
+        await session.execute(delete(Event).where(Event.category == CATEGORY))
+        await session.commit()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_search_ranks_and_highlights(
+    client: AsyncClient, redis_client: FakeAsyncRedis, events
+):
+    resp = await client.get("/v1/events/search", params={"q": "MAYDAY", "category": CATEGORY})
+
+    assert resp.status_code == 200
+    results = resp.json()["data"]
+    # A match in the name outranks one in the organizer
+    assert [r["event_name"] for r in results] == ["Mayday Fly to 2030 Live", "Jazz by the River"]
+    assert results[0]["name_headline"] == "<mark>Mayday</mark> Fly to 2030 Live"
+    assert "<mark>Mayday</mark> fans" in results[0]["description_headline"]
+    assert results[0]["rank"] > results[1]["rank"]
+
+    # Every word must match, the last one as a prefix
+    resp = await client.get("/v1/events/search", params={"q": "mayday  riv", "category": CATEGORY})
+    assert [r["event_name"] for r in resp.json()["data"]] == ["Jazz by the River"]
+    resp = await client.get("/v1/events/search", params={"q": "riv mayday", "category": CATEGORY})
+    assert resp.json()["data"] == []
+
+    resp = await client.get("/v1/events/search", params={"q": "!!!"})
+    assert resp.json()["data"] == []
+
+    # Served from the cache the second time
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args)
+
+    event.listen(app_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        cached = await client.get("/v1/events/search", params={"q": "mayday", "category": CATEGORY})
+    finally:
+        event.remove(app_engine.sync_engine, "before_cursor_execute", count_statement)
+    assert cached.json()["data"] == results
+    assert statements == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_fuzzy_search(session_factory: async_sessionmaker[AsyncSession], events):
+    async with session_factory() as session:
+        if not await is_trigram_available(session):
+            pytest.skip("pg_trgm is not installed")
+
+        body = await query_event_search(session, q="mayda fly", page=1, page_size=10)
+
+    assert body["data"][0]["event_name"] == "Mayday Fly to 2030 Live"
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_search_benchmark(
+    session_factory: async_sessionmaker[AsyncSession], redis_client: FakeAsyncRedis, events
+):
+    queries = ["mayday", "folk night 4242", "river jazz", "organizer 17 kaohsiung"]
+
+    async with session_factory() as session:
+        start = time.perf_counter()
+        for i in range(SEARCHES):
+            # What the LIKE version does: every word somewhere in the searched columns
+            like_query = (
+                select(Event)
+                .where(
+                    Event.is_deleted.is_(False),
+                    *(
+                        or_(
+                            *(
+                                column.ilike(f"%{word}%")
+                                for column in (
+                                    Event.event_name,
+                                    Event.organizer,
+                                    Event.location,
+                                    Event.description,
+                                )
+                            )
+                        )
+                        for word in queries[i % len(queries)].split()
+                    ),
+                )
+                .limit(10)
+            )
+            (await session.execute(like_query)).all()
+            session.expunge_all()
+        like_rate = SEARCHES / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(SEARCHES):
+            await query_event_search(session, q=queries[i % len(queries)], page=1, page_size=10)
+            session.expunge_all()
+        search_rate = SEARCHES / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(SEARCHES):
+            await search_events(session, redis_client, q=queries[i % len(queries)])
+        cached_rate = SEARCHES / (time.perf_counter() - start)
+
+    print(
+        f"\nsearches/sec over {ROWS} events: ILIKE {like_rate:.0f}, "
+        f"full-text {search_rate:.0f}, cached {cached_rate:.0f}"
+    )
+    assert search_rate > like_rate
+    assert cached_rate > search_rate
@@ -0,0 +1,146 @@
+import asyncio
+import socket
+import time
+
+import httpx
+import pytest
+import pytest_asyncio
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+
+from src.amego.invoice import InvoiceAPIClient
+from src.amego.schemas import AmegoTaxType, CreateAmegoInvoiceRequest, ProductDetail
+from src.http_client import create_http_client
+from src.mitake_sms.service import MitakeSMS
+from src.mypay.service import StoreOrder
+from src.order.schemas import MyPayOrderItem
+
+REQUESTS = 200
+
+stub_app = FastAPI()
+client_ports: set[int] = set()
+
+
+@stub_app.middleware("http")
+async def record_client_port(request: Request, call_next):
+    client_ports.add(request.client.port)
+    return await call_next(request)
+
+
+@stub_app.post("/mypay")
+async def mypay(request: Request):
+    form = await request.form()
+    return {"code": "200", "fields": sorted(form.keys())}
+
+
+@stub_app.post("/amego/json/f0401")
+async def amego():
+    return {"code": 0, "msg": ""}
+
+
+@stub_app.post("/mitake/send")
+async def mitake_send():
+    return PlainTextResponse("[1]\nmsgid=1\nstatuscode=1\nAccountPoint=99")
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def stub_url():
+    sock = socket.socket()
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(stub_app, log_level="warning"))
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    server.should_exit = True
+    await task
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def http_client():
+    http_client = create_http_client(timeout=5, max_connections=10)
+
+    yield http_client
+
+    await http_client.aclose()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_providers_use_shared_client(
+    stub_url: str, http_client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(StoreOrder, "store_key", b"0" * 32)
+    monkeypatch.setattr(StoreOrder, "url", f"{stub_url}/mypay")
+    store_order = StoreOrder(http_client=http_client)
+    item = MyPayOrderItem(id="1", name="一般票", cost="2800", amount="2", total="5600")
+
+    result = await store_order.run(cost="5600", user_id="1000", order_id="A001", items=[item])
+    assert result == {"code": "200", "fields": ["encry_data", "service", "store_uid"]}
+
+    invoice_client = InvoiceAPIClient(
+        api_base_url=f"{stub_url}/amego",
+        api_key="key",
+        api_tax_id="12345678",
+        http_client=http_client,
+    )
+    invoice = CreateAmegoInvoiceRequest(
+        OrderId="A001",
+        BuyerEmailAddress="test@example.com",
+        ProductItem=[
+            ProductDetail(
+                Description="一般票",
+                Quantity="2",
+                UnitPrice="2800",
+                Amount="5600",
+                TaxType=AmegoTaxType.TAXABLE,
+            )
+        ],
+        SalesAmount="5600",
+        FreeTaxSalesAmount="0",
+        ZeroTaxSalesAmount="0",
+        TaxType=AmegoTaxType.TAXABLE,
+        TaxRate="0.05",
+        TaxAmount="0",
+        TotalAmount="5600",
+    )
+    assert (await invoice_client.create_invoice(invoice))["code"] == 0
+
+    sms = MitakeSMS(
+        api_url=f"{stub_url}/mitake/send",
+        check_point_url=f"{stub_url}/mitake/points",
+        username="user",
+        password="password",
+        http_client=http_client,
+    )
+    await sms.send_sms_code(phone="0912345678", sms_message="驗證碼 123456")
+    assert sms.points == 99
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_connection_reuse_latency(stub_url: str, http_client: httpx.AsyncClient):
+    url = f"{stub_url}/amego/json/f0401"
+
+    async def per_call_client():
+        async with httpx.AsyncClient() as client:
+            await client.post(url)
+
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await per_call_client()
+    per_call_ms = (time.perf_counter() - start) / REQUESTS * 1000
+
+    await http_client.post(url)
+    client_ports.clear()
+
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await http_client.post(url)
+    shared_ms = (time.perf_counter() - start) / REQUESTS * 1000
+
+    print(f"\nrequest latency ms: client per call {per_call_ms:.2f}, shared client {shared_ms:.2f}")
+    assert len(client_ports) == 1
+    assert shared_ms < per_call_ms
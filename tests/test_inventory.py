@@ -0,0 +1,291 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.config import settings
+from src.constants import ACTIVE_RESERVATION_STATUSES
+from src.inventory.service import (
+    RedisInventory,
+    close_event_inventory,
+    flush_inventory,
+    open_event_inventory,
+)
+from src.models import EventTicketType, TicketReservation, User
+from src.reservation.service import (
+    release_expired_reservations,
+    release_reservation,
+    reserve_tickets,
+)
+
+STOCK = 500
+ATTEMPTS = 2000
+CONCURRENCY = 20
+
+
+@pytest.fixture
+def inventory(redis_client) -> RedisInventory:
+    return RedisInventory(redis_client)
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def event_ticket_type(session_factory: async_sessionmaker[AsyncSession], create_event):
+    async with session_factory() as session:
+        await session.merge(User(user_id=1001, account="test_user", password="1234"))
+        await session.commit()
+
+    event = await create_event(
+        event_name="test_inventory_event",
+        ticket_types=[EventTicketType(ticket_name="一般票", price=1000, stock=STOCK)],
+    )
+
+    return event.event_id, event.ticket_types[0].ticket_type_id
+
+
+async def get_db_state(
+    session_factory: async_sessionmaker[AsyncSession], ticket_type_id: int
+) -> tuple[int, int]:
+    """(stock column, stock column minus reservations not written behind yet)"""
+    async with session_factory() as session:
+        stock = await session.scalar(
+            select(EventTicketType.stock).where(EventTicketType.ticket_type_id == ticket_type_id)
+        )
+        active = await session.scalar(
+            select(func.coalesce(func.sum(TicketReservation.quantity), 0)).where(
+                TicketReservation.ticket_type_id == ticket_type_id,
+                TicketReservation.status.in_(ACTIVE_RESERVATION_STATUSES),
+            )
+        )
+
+    return stock, STOCK - active
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_inventory_counts_reconcile(
+    session_factory: async_sessionmaker[AsyncSession],
+    inventory: RedisInventory,
+    event_ticket_type: tuple[int, int],
+):
+    event_id, ticket_type_id = event_ticket_type
+
+    async with session_factory() as session:
+        assert await open_event_inventory(session, inventory, event_id) == [ticket_type_id]
+
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def attempt() -> bool:
+        async with semaphore, session_factory() as session:
+            try:
+                await reserve_tickets(
+                    session=session,
+                    user_id=1000,
+                    ticket_type_id=ticket_type_id,
+                    quantity=1,
+                    inventory=inventory,
+                )
+                return True
+            except HTTPException as exc:
+                assert exc.status_code == 409
+                return False
+
+    results = await asyncio.gather(*(attempt() for _ in range(ATTEMPTS)))
+
+    assert sum(results) == STOCK
+    assert await inventory.get_stock(ticket_type_id) == 0
+    # Nothing has been written behind yet, the hot row was never touched
+    assert await get_db_state(session_factory, ticket_type_id) == (STOCK, 0)
+
+    async with session_factory() as session:
+        assert await flush_inventory(session) == STOCK
+        assert await flush_inventory(session) == 0
+
+    assert await get_db_state(session_factory, ticket_type_id) == (0, 0)
+
+    # Expired reservations go back to both Redis and the stock column
+    async with session_factory() as session:
+        expired_ids = select(TicketReservation.reservation_id).limit(100).scalar_subquery()
+        await session.execute(
+            update(TicketReservation)
+            .where(TicketReservation.reservation_id.in_(expired_ids))
+            .values(expires_at=func.now())
+        )
+        await session.commit()
+
+        assert await release_expired_reservations(session, inventory=inventory) == 100
+
+    assert await inventory.get_stock(ticket_type_id) == 100
+    assert await get_db_state(session_factory, ticket_type_id) == (100, 100)
+
+    async with session_factory() as session:
+        await close_event_inventory(session, inventory, event_id)
+
+    assert await inventory.get_stock(ticket_type_id) is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_inventory_rebuilds_after_redis_loss(
+    session_factory: async_sessionmaker[AsyncSession],
+    inventory: RedisInventory,
+    event_ticket_type: tuple[int, int],
+):
+    event_id, ticket_type_id = event_ticket_type
+
+    async with session_factory() as session:
+        await session.execute(
+            update(EventTicketType)
+            .where(EventTicketType.ticket_type_id == ticket_type_id)
+            .values(max_purchase_limit=4)
+        )
+        await session.commit()
+
+        await open_event_inventory(session, inventory, event_id)
+
+        for _ in range(2):
+            await reserve_tickets(
+                session=session,
+                user_id=1000,
+                ticket_type_id=ticket_type_id,
+                quantity=2,
+                inventory=inventory,
+            )
+        await flush_inventory(session)
+
+        await reserve_tickets(
+            session=session,
+            user_id=1001,
+            ticket_type_id=ticket_type_id,
+            quantity=3,
+            inventory=inventory,
+        )
+
+    # Redis loses everything, one reservation is still waiting to be written behind
+    await inventory.redis_client.flushall()
+
+    async with session_factory() as session:
+        assert await inventory.reconcile(session) == [ticket_type_id]
+
+        assert await inventory.get_stock(ticket_type_id) == STOCK - 7
+        with pytest.raises(HTTPException) as exc_info:
+            await reserve_tickets(
+                session=session,
+                user_id=1000,
+                ticket_type_id=ticket_type_id,
+                quantity=1,
+                inventory=inventory,
+            )
+        assert exc_info.value.detail == "Purchase limit exceeded"
+
+        await flush_inventory(session)
+
+    assert await get_db_state(session_factory, ticket_type_id) == (STOCK - 7, STOCK - 7)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_reconcile_repairs_crash_drift(
+    session_factory: async_sessionmaker[AsyncSession],
+    inventory: RedisInventory,
+    event_ticket_type: tuple[int, int],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    event_id, ticket_type_id = event_ticket_type
+
+    async with session_factory() as session:
+        await session.execute(
+            update(EventTicketType)
+            .where(EventTicketType.ticket_type_id == ticket_type_id)
+            .values(max_purchase_limit=4)
+        )
+        await session.commit()
+        await open_event_inventory(session, inventory, event_id)
+
+        # Crashed after taking 3 tickets in Redis, before inserting the reservation
+        await inventory.acquire(ticket_type_id, user_id=1000, quantity=3)
+
+        # Crashed after committing a release, before giving the tickets back in Redis
+        reservation = await reserve_tickets(
+            session=session,
+            user_id=1001,
+            ticket_type_id=ticket_type_id,
+            quantity=2,
+            inventory=inventory,
+        )
+
+        async def crash(ticket_type_id: int, token: str) -> int:
+            return 0
+
+        with monkeypatch.context() as patch:
+            patch.setattr(inventory, "release", crash)
+            assert await release_reservation(session, reservation.reservation_id, 1001, inventory)
+
+        assert await inventory.get_stock(ticket_type_id) == STOCK - 5
+
+        # Could still be in flight: nothing is given back yet
+        assert await inventory.reconcile(session) == [ticket_type_id]
+        assert await inventory.get_stock(ticket_type_id) == STOCK - 5
+
+        # Past the timeout they are known to be dead
+        monkeypatch.setattr(settings, "INVENTORY_PENDING_TIMEOUT_SECONDS", 0)
+        assert await inventory.reconcile(session) == [ticket_type_id]
+        assert await inventory.get_stock(ticket_type_id) == STOCK
+
+        # The 3 tickets no longer count towards the purchase limit
+        await reserve_tickets(
+            session=session,
+            user_id=1000,
+            ticket_type_id=ticket_type_id,
+            quantity=4,
+            inventory=inventory,
+        )
+
+    assert await inventory.get_stock(ticket_type_id) == STOCK - 4
+    assert await get_db_state(session_factory, ticket_type_id) == (STOCK, STOCK - 4)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_reconcile_during_sale_never_oversells(
+    session_factory: async_sessionmaker[AsyncSession],
+    inventory: RedisInventory,
+    event_ticket_type: tuple[int, int],
+):
+    event_id, ticket_type_id = event_ticket_type
+
+    async with session_factory() as session:
+        await open_event_inventory(session, inventory, event_id)
+
+    semaphore = asyncio.Semaphore(CONCURRENCY - 1)
+
+    async def attempt() -> bool:
+        async with semaphore, session_factory() as session:
+            try:
+                await reserve_tickets(
+                    session=session,
+                    user_id=1000,
+                    ticket_type_id=ticket_type_id,
+                    quantity=1,
+                    inventory=inventory,
+                )
+                return True
+            except HTTPException as exc:
+                assert exc.status_code == 409
+                return False
+
+    async def reconcile_continuously():
+        async with session_factory() as session:
+            while True:
+                await inventory.reconcile(session, [ticket_type_id])
+                await asyncio.sleep(0)
+
+    reconciler = asyncio.create_task(reconcile_continuously())
+    results = await asyncio.gather(*(attempt() for _ in range(ATTEMPTS)))
+    reconciler.cancel()
+
+    assert sum(results) == STOCK
+
+    async with session_factory() as session:
+        await inventory.reconcile(session, [ticket_type_id])
+
+    assert await inventory.get_stock(ticket_type_id) == 0
+    assert await get_db_state(session_factory, ticket_type_id) == (STOCK, 0)
@@ -0,0 +1,221 @@
+import asyncio
+import socket
+import time
+from collections import Counter
+
+import orjson
+import pytest
+import pytest_asyncio
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.amego.invoice import InvoiceAPIClient
+from src.amego.schemas import AmegoTaxType, CreateAmegoInvoiceRequest, ProductDetail
+from src.amego.service import enqueue_invoice, process_invoice_jobs
+from src.config import settings
+from src.constants import InvoiceJobStatus
+from src.http_client import create_http_client
+from src.models import InvoiceJob
+
+JOBS = 100
+AMEGO_LATENCY_SECONDS = 0.02
+ORDER_PREFIX = "test_invoice_"
+
+fake_amego = FastAPI()
+issued: Counter[str] = Counter()
+calls: Counter[str] = Counter()
+
+
+@fake_amego.post("/json/f0401")
+async def f0401(request: Request):
+    form = await request.form()
+    order_id = orjson.loads(form["data"])["OrderId"]
+    calls[order_id] += 1
+    await asyncio.sleep(AMEGO_LATENCY_SECONDS)
+
+    if "flaky" in order_id and calls[order_id] == 1 or "down" in order_id:
+        return PlainTextResponse("Service Unavailable", status_code=503)
+    if "rejected" in order_id or issued[order_id]:
+        return {"code": 1002, "msg": "OrderId 重複"}
+
+    issued[order_id] += 1
+    return {"code": 0, "msg": "", "invoice_number": f"AB{len(issued):08d}"}
+
+
+def make_invoice(order_id: str) -> CreateAmegoInvoiceRequest:
+    return CreateAmegoInvoiceRequest(
+        OrderId=order_id,
+        BuyerEmailAddress="test@example.com",
+        ProductItem=[
+            ProductDetail(
+                Description="一般票",
+                Quantity="1",
+                UnitPrice="2800",
+                Amount="2800",
+                TaxType=AmegoTaxType.TAXABLE,
+            )
+        ],
+        SalesAmount="2800",
+        FreeTaxSalesAmount="0",
+        ZeroTaxSalesAmount="0",
+        TaxType=AmegoTaxType.TAXABLE,
+        TaxRate="0.05",
+        TaxAmount="0",
+        TotalAmount="2800",
+    )
+
+
+async def enqueue(session_factory: async_sessionmaker[AsyncSession], *order_ids: str):
+    async with session_factory() as session:
+        for order_id in order_ids:
+            await enqueue_invoice(session, make_invoice(order_id))
+        await session.commit()
+
+
+async def get_jobs(session_factory: async_sessionmaker[AsyncSession]) -> dict[str, InvoiceJob]:
+    async with session_factory() as session:
+        jobs = await session.scalars(
+            select(InvoiceJob).where(InvoiceJob.order_id.startswith(ORDER_PREFIX))
+        )
+        return {job.order_id: job for job in jobs}
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def invoice_client():
+    sock = socket.socket()
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(fake_amego, log_level="warning"))
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+    http_client = create_http_client(timeout=5, max_connections=20)
+
+    yield InvoiceAPIClient(
+        api_base_url=f"http://127.0.0.1:{sock.getsockname()[1]}",
+        api_key="key",
+        api_tax_id="12345678",
+        http_client=http_client,
+    )
+
+    await http_client.aclose()
+    server.should_exit = True
+    await task
+
+
+@pytest_asyncio.fixture(loop_scope="session", autouse=True)
+async def clean_jobs(session_factory: async_sessionmaker[AsyncSession]):
+    yield
+
+    async with session_factory() as session:
+        await session.execute(
+            delete(InvoiceJob).where(InvoiceJob.order_id.startswith(ORDER_PREFIX))
+        )
+        await session.commit()
+    issued.clear()
+    calls.clear()
+
+
+async def drain(
+    session_factory: async_sessionmaker[AsyncSession],
+    invoice_client: InvoiceAPIClient,
+    concurrency: int,
+) -> None:
+    async with session_factory() as session:
+        while await process_invoice_jobs(
+            session=session, invoice_client=invoice_client, batch_size=50, concurrency=concurrency
+        ):
+            pass
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_enqueue_is_idempotent_by_order_id(session_factory: async_sessionmaker[AsyncSession]):
+    async with session_factory() as session:
+        assert await enqueue_invoice(session, make_invoice(f"{ORDER_PREFIX}A001"))
+        assert not await enqueue_invoice(session, make_invoice(f"{ORDER_PREFIX}A001"))
+        await session.commit()
+
+    # Not committed with the order: no job
+    async with session_factory() as session:
+        await enqueue_invoice(session, make_invoice(f"{ORDER_PREFIX}A002"))
+        await session.rollback()
+
+    assert list(await get_jobs(session_factory)) == [f"{ORDER_PREFIX}A001"]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_invoice_worker_throughput(
+    session_factory: async_sessionmaker[AsyncSession], invoice_client: InvoiceAPIClient
+):
+    rates = {}
+    for concurrency in (1, 10):
+        order_ids = [f"{ORDER_PREFIX}c{concurrency}_{i}" for i in range(JOBS)]
+        await enqueue(session_factory, *order_ids)
+
+        start = time.perf_counter()
+        await drain(session_factory, invoice_client, concurrency=concurrency)
+        rates[concurrency] = JOBS / (time.perf_counter() - start)
+
+    jobs = await get_jobs(session_factory)
+    assert len(jobs) == JOBS * 2
+    assert all(job.status == InvoiceJobStatus.ISSUED.value for job in jobs.values())
+    assert all(job.result["code"] == 0 for job in jobs.values())
+    assert all(count == 1 for count in issued.values())
+
+    print(f"\ninvoices/sec: concurrency 1 {rates[1]:.0f}, concurrency 10 {rates[10]:.0f}")
+    assert rates[10] > rates[1] * 3
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_retry_and_dead_letter(
+    session_factory: async_sessionmaker[AsyncSession],
+    invoice_client: InvoiceAPIClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "AMEGO_INVOICE_RETRY_BASE_SECONDS", 0)
+    monkeypatch.setattr(settings, "AMEGO_INVOICE_MAX_ATTEMPTS", 3)
+    flaky, rejected, down = (f"{ORDER_PREFIX}{name}" for name in ("flaky", "rejected", "down"))
+    await enqueue(session_factory, flaky, rejected, down)
+
+    await drain(session_factory, invoice_client, concurrency=5)
+
+    jobs = await get_jobs(session_factory)
+    assert jobs[flaky].status == InvoiceJobStatus.ISSUED.value
+    assert jobs[flaky].attempts == 2
+    assert jobs[flaky].last_error is None
+    assert jobs[rejected].status == InvoiceJobStatus.DEAD.value
+    assert jobs[rejected].attempts == 1
+    assert "1002" in jobs[rejected].last_error
+    assert jobs[down].status == InvoiceJobStatus.DEAD.value
+    assert jobs[down].attempts == 3
+    assert calls[down] == 3
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_expired_lease_is_reclaimed(
+    session_factory: async_sessionmaker[AsyncSession],
+    invoice_client: InvoiceAPIClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    order_id = f"{ORDER_PREFIX}lease"
+    await enqueue(session_factory, order_id)
+
+    # A worker dies after claiming the job
+    failing_client = InvoiceAPIClient(
+        api_base_url="http://127.0.0.1:9", api_key="key", api_tax_id="12345678"
+    )
+    monkeypatch.setattr(settings, "AMEGO_INVOICE_LEASE_SECONDS", 0)
+    monkeypatch.setattr(failing_client, "create_invoice", lambda invoice: asyncio.Event().wait())
+    crashed_worker = asyncio.create_task(drain(session_factory, failing_client, concurrency=1))
+    await asyncio.sleep(0.1)
+    crashed_worker.cancel()
+    assert (await get_jobs(session_factory))[order_id].status == InvoiceJobStatus.PROCESSING.value
+
+    await drain(session_factory, invoice_client, concurrency=1)
+
+    job = (await get_jobs(session_factory))[order_id]
+    assert job.status == InvoiceJobStatus.ISSUED.value
+    assert job.attempts == 2
@@ -0,0 +1,162 @@
+import asyncio
+import io
+import logging
+import statistics
+import time
+
+import orjson
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+
+import src.logger
+from src.logger import LogFormatter, configure_logging, logger
+from src.middleware import RequestMiddleware, bind_request_state
+
+SECONDS = 1
+LOGS_PER_TICK = 20  # Every 1-2 ms, about 10k logs/sec
+
+
+class StallingStream(io.StringIO):
+    """A stdout or disk that stalls for 5 ms every 200 writes."""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        self.writes += 1
+        if self.writes % 200 == 0:
+            time.sleep(0.005)
+        return super().write(text)
+
+
+@pytest.fixture
+def log_to():
+    """Send the logs to a stream through their own queue and writer thread during the test.
+
+    Returns the queue handler and a function that flushes and parses what was written.
+    """
+    configured = []
+
+    def configure(stream: io.StringIO):
+        handler, listener = configure_logging(stream=stream)
+        configured.append((handler, listener))
+
+        def read() -> list[dict]:
+            # The writer thread writes asynchronously, stop it to flush everything
+            listener.stop()
+            return [orjson.loads(line) for line in stream.getvalue().splitlines()]
+
+        return handler, read
+
+    yield configure
+
+    root = logging.getLogger()
+    for handler, listener in configured:
+        if listener._thread is not None:
+            listener.stop()
+        root.removeHandler(handler)
+    root.addHandler(src.logger.log_handler)
+
+
+async def measure_loop_lag() -> list[float]:
+    """Emit about 10k logs/sec for SECONDS and return how late 1 ms timers fired meanwhile."""
+    lags = []
+
+    async def probe():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start - 0.001)
+
+    probe_task = asyncio.create_task(probe())
+    deadline = time.perf_counter() + SECONDS
+    while time.perf_counter() < deadline:
+        for i in range(LOGS_PER_TICK):
+            logger.info("Ticket reserved", event_id=1, ticket_type_id=i, quantity=2)
+        await asyncio.sleep(0.001)
+    probe_task.cancel()
+
+    return lags
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_request_context_is_logged(log_to):
+    _, read_logs = log_to(io.StringIO())
+    test_app = FastAPI()
+    test_app.add_middleware(RequestMiddleware)
+
+    async def authenticate():
+        bind_request_state(user_id=42)
+
+    @test_app.get("/v1/orders/{order_id}", dependencies=[Depends(authenticate)])
+    async def read_order(order_id: int):
+        logger.info("Order read", order_id=order_id)
+        return {}
+
+    async with AsyncClient(transport=ASGITransport(app=test_app), base_url="http://test") as client:
+        await client.get("/v1/orders/7", headers={"X-Request-ID": "req-1"})
+
+    try:
+        raise ZeroDivisionError("division by zero")
+    except ZeroDivisionError:
+        logger.exception("Outside of a request")
+
+    order_read, outside = read_logs()
+    assert order_read["event"] == "Order read"
+    assert order_read["order_id"] == 7
+    assert order_read["request_id"] == "req-1"
+    assert order_read["route"] == "/v1/orders/{order_id}"
+    assert order_read["user_id"] == 42
+    assert order_read["level"] == "info"
+    assert "timestamp" in order_read
+
+    assert "request_id" not in outside
+    assert outside["level"] == "error"
+    assert "ZeroDivisionError" in outside["exception"]
+
+
+def test_sampling(log_to):
+    _, read_logs = log_to(io.StringIO())
+    for _ in range(10000):
+        logger.info("Duplicate notification", sample=0.1)
+    logger.warning("Never sampled", sample=0.1)
+
+    lines = read_logs()
+    kept = [line for line in lines if line["event"] == "Duplicate notification"]
+    assert 700 < len(kept) < 1300
+    assert all(line["sample_rate"] == 0.1 for line in kept)
+    assert lines[-1]["event"] == "Never sampled"
+    assert "sample_rate" not in lines[-1]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_event_loop_latency_benchmark(log_to):
+    root = logging.getLogger()
+    queue_handler, read_logs = log_to(StallingStream())
+
+    # Before: rendered and written on the event loop
+    stream_handler = logging.StreamHandler(StallingStream())
+    stream_handler.setFormatter(LogFormatter("json"))
+    root.removeHandler(queue_handler)
+    root.addHandler(stream_handler)
+    try:
+        sync_lags = await measure_loop_lag()
+    finally:
+        root.removeHandler(stream_handler)
+        root.addHandler(queue_handler)
+
+    # After: rendered and enqueued on the event loop, written by the writer thread
+    queued_lags = await measure_loop_lag()
+    logged = len(read_logs())
+
+    sync_p99 = statistics.quantiles(sync_lags, n=100)[98]
+    queued_p99 = statistics.quantiles(queued_lags, n=100)[98]
+    print(
+        f"\nevent loop lag at {logged / SECONDS:.0f} logs/sec, p99 ms: "
+        f"on the loop {sync_p99 * 1000:.2f}, queued {queued_p99 * 1000:.2f} "
+        f"({logged} written, {queue_handler.dropped} dropped)"
+    )
+    assert queued_p99 < sync_p99
+    assert queue_handler.dropped == 0
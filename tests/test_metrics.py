@@ -0,0 +1,179 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+from prometheus_client.parser import text_string_to_metric_families
+
+from src.auth.dependencies import get_current_user
+from src.constants import Role
+from src.database import InstrumentedRedis, get_redis_client
+from src.event.service import EVENT_DETAIL_CACHE_PREFIX
+from src.main import app
+from src.middleware import RequestMiddleware
+from src.models import User
+
+REQUESTS = 20000
+
+# Each worker records some requests in its own process, a third one renders /metrics
+WORKER_SCRIPT = """
+import asyncio, sys
+from src.middleware import RequestMiddleware
+from src.models import User
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+async def main():
+    middleware = RequestMiddleware(app)
+    async def noop(message):
+        pass
+    for _ in range(int(sys.argv[1])):
+        await middleware({"type": "http", "method": "GET", "headers": []}, None, noop)
+
+asyncio.run(main())
+"""
+RENDER_SCRIPT = """
+import sys
+from src.metrics import render_metrics
+sys.stdout.write(render_metrics()[0].decode())
+"""
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def instrumented_redis(redis_client: FakeAsyncRedis) -> InstrumentedRedis:
+    instrumented_redis = InstrumentedRedis(connection_pool=redis_client.connection_pool)
+    app.dependency_overrides[get_redis_client] = lambda: instrumented_redis
+
+    return instrumented_redis
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_metrics_endpoint(client: AsyncClient, instrumented_redis: InstrumentedRedis):
+    route = "/v1/events/{event_id}"
+    before = {
+        "requests": sample("http_requests_total", method="GET", route=route, status="404"),
+        "queries": sample("db_query_duration_seconds_count", engine="primary", operation="SELECT"),
+        "checkouts": sample("db_pool_checkout_seconds_count", engine="primary"),
+        "redis": sample("redis_command_duration_seconds_count", command="EVALSHA"),
+        "misses": sample(
+            "cache_requests_total", cache=EVENT_DETAIL_CACHE_PREFIX, tier="local", result="miss"
+        ),
+    }
+
+    for _ in range(3):
+        resp = await client.get("/v1/events/999999999")
+        assert resp.status_code == 404
+    assert "X-Process-Time" not in resp.headers
+    assert (await client.get("/no-such-route")).status_code == 404
+
+    assert sample("http_requests_total", method="GET", route=route, status="404") == (
+        before["requests"] + 3
+    )
+    assert sample("http_requests_total", method="GET", route="unmatched", status="404") >= 1
+    assert sample("http_requests_in_progress", method="GET") == 0
+    assert (
+        sample("db_query_duration_seconds_count", engine="primary", operation="SELECT")
+        > before["queries"]
+    )
+    assert sample("db_pool_checkout_seconds_count", engine="primary") > before["checkouts"]
+    assert sample("db_pool_checked_out", engine="primary") == 0
+    assert sample("redis_command_duration_seconds_count", command="EVALSHA") > before["redis"]
+    assert (
+        sample("cache_requests_total", cache=EVENT_DETAIL_CACHE_PREFIX, tier="local", result="miss")
+        == before["misses"] + 3
+    )
+
+    resp = await client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    names = {family.name for family in text_string_to_metric_families(resp.text)}
+    assert {
+        "http_requests",
+        "http_request_duration_seconds",
+        "http_requests_in_progress",
+        "db_pool_checkout_seconds",
+        "db_pool_checked_out",
+        "db_query_duration_seconds",
+        "redis_command_duration_seconds",
+        "cache_requests",
+    } <= names
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_internal_endpoints_require_admin(client: AsyncClient):
+    paths = ["/metrics", "/health/redis", "/health/database", "/health/cache", "/health/providers"]
+    override = app.dependency_overrides[get_current_user]
+    app.dependency_overrides[get_current_user] = lambda: User(
+        user_id=1001, account="test_user_override", password="1234", role=Role.USER.value
+    )
+    try:
+        for path in paths:
+            assert (await client.get(path)).status_code == 403
+        assert (await client.get("/health")).status_code == 200
+    finally:
+        app.dependency_overrides[get_current_user] = override
+
+    # No token at all
+    app.dependency_overrides.pop(get_current_user)
+    try:
+        for path in paths:
+            assert (await client.get(path)).status_code == 401
+    finally:
+        app.dependency_overrides[get_current_user] = override
+
+
+def test_multiprocess_metrics(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    workers = [
+        subprocess.Popen([sys.executable, "-c", WORKER_SCRIPT, str(count)], env=env)
+        for count in (3, 4)
+    ]
+    assert [worker.wait(timeout=60) for worker in workers] == [0, 0]
+
+    output = subprocess.run(
+        [sys.executable, "-c", RENDER_SCRIPT], env=env, capture_output=True, check=True
+    ).stdout.decode()
+    samples = {
+        (s.name, tuple(sorted(s.labels.items()))): s.value
+        for family in text_string_to_metric_families(output)
+        for s in family.samples
+    }
+
+    labels = (("method", "GET"), ("route", "unmatched"), ("status", "200"))
+    assert samples[("http_requests_total", labels)] == 7
+    # The in-flight gauge is summed over the workers too
+    assert samples.get(("http_requests_in_progress", (("method", "GET"),)), 0) == 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_middleware_overhead():
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def noop(message):
+        pass
+
+    async def run(asgi_app) -> float:
+        scope = {"type": "http", "method": "GET", "headers": []}
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            await asgi_app(dict(scope), None, noop)
+        return (time.perf_counter() - start) / REQUESTS
+
+    bare = await run(endpoint)
+    measured = await run(RequestMiddleware(endpoint))
+
+    overhead_us = (measured - bare) * 1_000_000
+    print(f"\nrequest middleware overhead: {overhead_us:.1f} us/request")
+    assert overhead_us < 50
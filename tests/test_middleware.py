@@ -0,0 +1,161 @@
+import asyncio
+import statistics
+import time
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from httpx import ASGITransport, AsyncClient
+
+from src.main import app
+from src.middleware import RequestMiddleware, request_id_var
+
+REQUESTS = 3000
+
+
+def create_app() -> FastAPI:
+    test_app = FastAPI()
+    test_app.add_middleware(RequestMiddleware)
+
+    @test_app.get("/request-id")
+    async def read_request_id(request: Request):
+        return {"state": request.state.request_id, "context": request_id_var.get()}
+
+    return test_app
+
+
+def create_baseline_app() -> FastAPI:
+    """The stack main.py had before: CORS plus a BaseHTTPMiddleware timing header."""
+    baseline_app = FastAPI()
+    baseline_app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    @baseline_app.middleware("http")
+    async def add_process_time_header(request: Request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        response.headers["X-Process-Time"] = str(time.time() - start_time)
+        return response
+
+    @baseline_app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return baseline_app
+
+
+async def benchmark(asgi_app, path: str) -> tuple[float, float]:
+    """(requests/sec, p99 seconds) of sequential GETs on `path`, straight through ASGI."""
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    latencies = []
+    for _ in range(REQUESTS):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"test"), (b"origin", b"https://example.com")],
+            "client": ("127.0.0.1", 8000),
+            "server": ("test", 80),
+        }
+        start = time.perf_counter()
+        await asgi_app(scope, receive, send)
+        latencies.append(time.perf_counter() - start)
+
+    return len(latencies) / sum(latencies), statistics.quantiles(latencies, n=100)[98]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_request_id():
+    async with AsyncClient(
+        transport=ASGITransport(app=create_app()), base_url="http://test"
+    ) as client:
+        resp = await client.get("/request-id", headers={"X-Request-ID": "abc-123"})
+        assert resp.headers["x-request-id"] == "abc-123"
+        assert resp.json() == {"state": "abc-123", "context": "abc-123"}
+        assert resp.headers["server-timing"].startswith("app;dur=")
+
+        resp = await client.get("/request-id")
+        generated = resp.headers["x-request-id"]
+        assert len(generated) == 32
+        assert resp.json() == {"state": generated, "context": generated}
+
+        resp = await client.get("/request-id", headers={"X-Request-ID": "x" * 500})
+        assert len(resp.headers["x-request-id"]) == 32
+
+    assert request_id_var.get() is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_streaming_keeps_backpressure():
+    streaming_app = FastAPI()
+    streaming_app.add_middleware(RequestMiddleware)
+    first_chunk_sent = asyncio.Event()
+
+    @streaming_app.get("/stream")
+    async def stream():
+        async def chunks():
+            yield b"first"
+            # Only reached once the server took the first chunk
+            await first_chunk_sent.wait()
+            yield b"second"
+
+        return StreamingResponse(chunks())
+
+    chunks = []
+
+    async def receive():
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks.append(message["body"])
+            first_chunk_sent.set()
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/stream",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+    }
+    async with asyncio.timeout(5):
+        await streaming_app(scope, receive, send)
+
+    assert chunks == [b"first", b"second"]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_health_benchmark():
+    baseline_app = create_baseline_app()
+    # Warm up both stacks, the middleware stack is built on the first request
+    await benchmark(baseline_app, "/health")
+    await benchmark(app, "/health")
+
+    baseline_rate, baseline_p99 = await benchmark(baseline_app, "/health")
+    rate, p99 = await benchmark(app, "/health")
+
+    print(
+        f"\n/health: BaseHTTPMiddleware {baseline_rate:.0f} req/s, p99 {baseline_p99 * 1000:.3f} ms"
+        f"\n/health: pure ASGI {rate:.0f} req/s, p99 {p99 * 1000:.3f} ms"
+    )
+    assert rate > baseline_rate
@@ -0,0 +1,96 @@
+import base64
+import json
+import time
+
+import orjson
+import pytest
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+from Crypto.Util import Padding
+
+from src.config import settings
+from src.mypay.service import StoreOrder
+
+ORDERS = 5000
+KEY = b"0" * 32
+
+
+def decrypt(data: str, key: bytes = KEY):
+    raw = base64.b64decode(data)
+    cipher = AES.new(key, AES.MODE_CBC, raw[: AES.block_size])
+    return orjson.loads(Padding.unpad(cipher.decrypt(raw[AES.block_size :]), AES.block_size))
+
+
+def encrypt_previous(fields, key):
+    """The previous implementation"""
+    data = json.dumps(fields, separators=(",", ":"))
+    data = Padding.pad(data.encode("utf-8"), AES.block_size)
+    iv = get_random_bytes(AES.block_size)
+    cipher = AES.new(key, AES.MODE_CBC, iv)
+    return base64.b64encode(iv + cipher.encrypt(data)).decode("utf-8")
+
+
+def make_order(i: int) -> dict:
+    return {
+        "cost": "5600",
+        "user_id": "1000",
+        "order_id": f"T94{i:016d}",
+        "items": [
+            {"id": "1", "name": "搖滾區一般票", "cost": "2800", "amount": "2", "total": "5600"}
+        ],
+    }
+
+
+@pytest.fixture
+def store_order(monkeypatch: pytest.MonkeyPatch) -> StoreOrder:
+    monkeypatch.setattr(StoreOrder, "store_key", KEY)
+    monkeypatch.setattr(StoreOrder, "store_uid", "398800730001")
+    return StoreOrder()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_post_data_round_trip(store_order: StoreOrder, monkeypatch: pytest.MonkeyPatch):
+    order = make_order(1)
+    post_data = await store_order.build_post_data(**order)
+
+    assert post_data["store_uid"] == "398800730001"
+    assert decrypt(post_data["service"]) == {"service_name": "api", "cmd": "api/orders"}
+    assert decrypt(post_data["encry_data"]) == store_order.get_raw_data(**order)
+
+    # Large batches are encrypted on the CPU executor, with the same result
+    monkeypatch.setattr(settings, "MYPAY_ENCRYPT_OFFLOAD_BYTES", 0)
+    batch = await store_order.build_post_data_batch([make_order(i) for i in range(3)])
+
+    assert [decrypt(data["encry_data"])["order_id"] for data in batch] == [
+        make_order(i)["order_id"] for i in range(3)
+    ]
+    assert all(data["service"] == post_data["service"] for data in batch)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_post_data_throughput(store_order: StoreOrder):
+    orders = [make_order(i) for i in range(ORDERS)]
+
+    start = time.perf_counter()
+    for order in orders:
+        {
+            "store_uid": store_order.store_uid,
+            "service": encrypt_previous(store_order.get_service(), KEY),
+            "encry_data": encrypt_previous(store_order.get_raw_data(**order), KEY),
+        }
+    previous_rate = ORDERS / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for order in orders:
+        store_order.get_post_data(**order)
+    single_rate = ORDERS / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await store_order.build_post_data_batch(orders)
+    batch_rate = ORDERS / (time.perf_counter() - start)
+
+    print(
+        f"\nMyPay orders/sec: previous {previous_rate:.0f}, "
+        f"one by one {single_rate:.0f}, batch {batch_rate:.0f}"
+    )
+    assert single_rate > previous_rate
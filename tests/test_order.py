@@ -0,0 +1,265 @@
+import asyncio
+import base64
+from urllib.parse import parse_qsl
+
+import httpx
+import orjson
+import pytest
+import pytest_asyncio
+from Crypto.Cipher import AES
+from Crypto.Util import Padding
+from fakeredis import FakeAsyncRedis
+from httpx import AsyncClient
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.config import settings
+from src.constants import MYPAY_NOTIFY_ACK, OrderStatus, ReservationStatus
+from src.models import (
+    EventTicketType,
+    InvoiceJob,
+    Order,
+    PaymentNotification,
+    TicketReservation,
+)
+from src.mypay.service import StoreOrder, mypay_query_order, mypay_store_order
+from src.reservation.service import reserve_tickets
+
+KEY = b"0" * 32
+
+mypay_requests: list[httpx.Request] = []
+# Transactions MyPay knows of, by uid
+mypay_transactions: dict[str, dict] = {}
+
+
+def decrypt(data: str) -> dict:
+    raw = base64.b64decode(data)
+    cipher = AES.new(KEY, AES.MODE_CBC, raw[: AES.block_size])
+    return orjson.loads(Padding.unpad(cipher.decrypt(raw[AES.block_size :]), AES.block_size))
+
+
+async def fake_mypay(request: httpx.Request) -> httpx.Response:
+    form = dict(parse_qsl(request.content.decode()))
+    if decrypt(form["service"])["cmd"] == "api/queryorder":
+        uid = decrypt(form["encry_data"])["uid"]
+        return httpx.Response(200, json=mypay_transactions.get(uid, {"uid": uid, "prc": "-1"}))
+
+    mypay_requests.append(request)
+    await asyncio.sleep(0.05)
+    return httpx.Response(200, json={"code": "200", "msg": "", "url": "https://mypay.test/pay"})
+
+
+@pytest_asyncio.fixture(loop_scope="session", autouse=True)
+async def mypay(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(StoreOrder, "store_key", KEY)
+    monkeypatch.setattr(StoreOrder, "url", "https://mypay.test/api/init")
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(fake_mypay))
+    monkeypatch.setattr(mypay_store_order, "http_client", http_client)
+    monkeypatch.setattr(mypay_query_order, "http_client", http_client)
+
+    yield
+
+    mypay_requests.clear()
+    mypay_transactions.clear()
+    await http_client.aclose()
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def reservation_id(session_factory: async_sessionmaker[AsyncSession], create_event):
+    event = await create_event(
+        event_name="test_order_event",
+        on_sale=True,
+        ticket_types=[EventTicketType(ticket_name="一般票", price=2800, stock=10)],
+    )
+
+    async with session_factory() as session:
+        reservation = await reserve_tickets(
+            session=session,
+            user_id=1000,
+            ticket_type_id=event.ticket_types[0].ticket_type_id,
+            quantity=2,
+        )
+
+    yield reservation.reservation_id
+
+    # Deleting the event takes its reservations and orders along, but not what refers to them
+    async with session_factory() as session:
+        order_nos = select(Order.order_no).where(Order.reservation_id == reservation.reservation_id)
+        await session.execute(delete(InvoiceJob).where(InvoiceJob.order_id.in_(order_nos)))
+        await session.execute(
+            delete(PaymentNotification).where(PaymentNotification.order_no.in_(order_nos))
+        )
+        await session.commit()
+
+
+async def count_orders(
+    session_factory: async_sessionmaker[AsyncSession], reservation_id: int
+) -> int:
+    async with session_factory() as session:
+        return await session.scalar(
+            select(func.count()).where(Order.reservation_id == reservation_id)
+        )
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_double_submit_creates_one_order(
+    session_factory: async_sessionmaker[AsyncSession],
+    client: AsyncClient,
+    redis_client: FakeAsyncRedis,
+    reservation_id: int,
+):
+    body = {"reservation_id": reservation_id, "buyer_email": "buyer@example.com"}
+    headers = {"Idempotency-Key": "checkout-1"}
+
+    responses = await asyncio.gather(
+        *(client.post("/v1/orders", json=body, headers=headers) for _ in range(5))
+    )
+
+    created = [resp for resp in responses if resp.status_code == 201]
+    assert {resp.status_code for resp in responses} <= {201, 409}
+    assert len({resp.json()["data"]["order_id"] for resp in created}) == 1
+    assert await count_orders(session_factory, reservation_id) == 1
+    assert len(mypay_requests) == 1
+
+    order = created[0].json()["data"]
+    assert order["amount"] == 5600
+    assert order["payment_url"] == "https://mypay.test/pay"
+
+    # Replayed from Redis
+    resp = await client.post("/v1/orders", json=body, headers=headers)
+    assert resp.status_code == 201
+    assert resp.headers["Idempotent-Replayed"] == "true"
+    assert resp.json()["data"] == order
+
+    # Redis lost the entry: replayed from Postgres
+    await redis_client.flushall()
+    resp = await client.post("/v1/orders", json=body, headers=headers)
+    assert resp.headers["Idempotent-Replayed"] == "true"
+    assert resp.json()["data"] == order
+
+    # Same key, different request
+    resp = await client.post("/v1/orders", json={"reservation_id": reservation_id}, headers=headers)
+    assert resp.status_code == 422
+
+    # Another key for the same reservation: still the same order
+    resp = await client.post("/v1/orders", json=body, headers={"Idempotency-Key": "checkout-2"})
+    assert resp.json()["data"]["order_id"] == order["order_id"]
+    assert len(mypay_requests) == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_mypay_notify_is_processed_once(
+    session_factory: async_sessionmaker[AsyncSession],
+    client: AsyncClient,
+    redis_client: FakeAsyncRedis,
+    reservation_id: int,
+):
+    resp = await client.post(
+        "/v1/orders", json={"reservation_id": reservation_id, "buyer_email": "buyer@example.com"}
+    )
+    assert resp.status_code == 201
+
+    async with session_factory() as session:
+        order = await session.scalar(select(Order).where(Order.reservation_id == reservation_id))
+
+    notification = {
+        "uid": "MP0001",
+        "order_id": order.order_no,
+        "prc": "250",
+        "cost": "5600",
+        "key": "test",
+    }
+
+    mypay_transactions["MP0001"] = {**notification, "key": ""}
+    mypay_transactions["MP0000"] = {**notification, "uid": "MP0000", "cost": "1", "key": ""}
+
+    # Not a transaction MyPay knows of: refused, not recorded
+    resp = await client.post("/v1/orders/mypay/notify", data={**notification, "uid": "MP9999"})
+    assert resp.status_code == 403
+
+    # Wrong amount according to MyPay: recorded, not applied
+    resp = await client.post("/v1/orders/mypay/notify", data={**notification, "uid": "MP0000"})
+    assert resp.text == MYPAY_NOTIFY_ACK
+
+    responses = await asyncio.gather(
+        *(client.post("/v1/orders/mypay/notify", data=notification) for _ in range(5))
+    )
+    assert all(resp.text == MYPAY_NOTIFY_ACK for resp in responses)
+
+    async with session_factory() as session:
+        order = await session.get(Order, order.order_id)
+        reservation = await session.get(TicketReservation, reservation_id)
+        notifications = await session.scalar(
+            select(func.count()).where(PaymentNotification.order_no == order.order_no)
+        )
+        invoice_jobs = await session.scalar(
+            select(func.count()).where(InvoiceJob.order_id == order.order_no)
+        )
+
+    assert order.status == OrderStatus.PAID.value
+    assert order.provider_transaction_id == "MP0001"
+    assert reservation.status == ReservationStatus.CONFIRMED.value
+    assert notifications == 2
+    assert invoice_jobs == 1
+
+    resp = await client.get(f"/v1/orders/{order.order_id}")
+    assert resp.json()["data"]["status"] == OrderStatus.PAID.value
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_mypay_notify_source_is_checked(client: AsyncClient, monkeypatch: pytest.MonkeyPatch):
+    # The test client connects from 127.0.0.1, an empty notification gets past the check as a 400
+    monkeypatch.setattr(settings, "MODE", "prod")
+    resp = await client.post("/v1/orders/mypay/notify")
+    assert resp.status_code == 403
+
+    monkeypatch.setattr(settings, "MYPAY_NOTIFY_ALLOWED_IPS", ["203.0.113.7"])
+    headers = {"X-Forwarded-For": "203.0.113.7"}
+    resp = await client.post("/v1/orders/mypay/notify", headers=headers)
+    assert resp.status_code == 403
+
+    monkeypatch.setattr(settings, "TRUSTED_PROXY_IPS", ["127.0.0.0/8"])
+    resp = await client.post("/v1/orders/mypay/notify", headers=headers)
+    assert resp.status_code == 400
+
+    # Hops before the last untrusted one are the caller's own
+    headers = {"X-Forwarded-For": "203.0.113.7, 198.51.100.1"}
+    resp = await client.post("/v1/orders/mypay/notify", headers=headers)
+    assert resp.status_code == 403
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_order_is_not_locked_while_mypay_is_called(
+    session_factory: async_sessionmaker[AsyncSession],
+    client: AsyncClient,
+    reservation_id: int,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    locked_during_call = []
+
+    async def lock_order(request: httpx.Request) -> httpx.Response:
+        order_no = decrypt(dict(parse_qsl(request.content.decode()))["encry_data"])["order_id"]
+        async with session_factory() as session:
+            try:
+                await session.execute(
+                    select(Order).where(Order.order_no == order_no).with_for_update(nowait=True)
+                )
+                locked_during_call.append(False)
+            except DBAPIError:
+                locked_during_call.append(True)
+        return await fake_mypay(request)
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(lock_order))
+    monkeypatch.setattr(mypay_store_order, "http_client", http_client)
+
+    body = {"reservation_id": reservation_id}
+    try:
+        responses = await asyncio.gather(*(client.post("/v1/orders", json=body) for _ in range(3)))
+    finally:
+        await http_client.aclose()
+
+    # The others came in while the payment page was being prepared
+    assert sorted(resp.status_code for resp in responses) == [201, 409, 409]
+    assert locked_during_call == [False]
+    assert len(mypay_requests) == 1
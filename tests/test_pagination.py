@@ -0,0 +1,103 @@
+import time
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from src.event.service import query_event_list
+from src.models import Event
+from src.pagination import encode_cursor
+from src.schemas import BasicQueryParams
+
+ROWS = 1_000_000
+PAGE_SIZE = 100
+PAGES = 20
+CATEGORY = "test_pagination"
+
+
+@pytest_asyncio.fixture(loop_scope="session", scope="module")
+async def events(db_engine: AsyncEngine, session_factory: async_sessionmaker[AsyncSession]):
+    async with session_factory() as session:
+        await session.execute(
+            text(
+                "INSERT INTO events (event_name, event_date, event_time, sale_time, location, "
+                "address, organizer, category, on_sale, is_deleted, created_at, updated_at) "
+                "SELECT 'event ' || i, DATE '2030-01-01', TIME '19:30', TIMESTAMP '2029-12-01', "
+                "'Taipei Arena', 'Taipei', 'test', :category, true, false, "
+                "TIMESTAMP '2026-01-01' + i * INTERVAL '1 second', now() "
+                "FROM generate_series(1, :rows) AS i"
+            ),
+            {"category": CATEGORY, "rows": ROWS},
+        )
+        await session.commit()
+
+    async with db_engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE events"))
+
+    yield
+
+    async with session_factory() as session:
+        await session.execute(delete(Event).where(Event.category == CATEGORY))
+        await session.commit()
+
+
+async def list_page(session: AsyncSession, params: BasicQueryParams) -> dict:
+    page = await query_event_list(session=session, params=params, category=CATEGORY)
+    session.expunge_all()
+    return page
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_deep_pages(session_factory: async_sessionmaker[AsyncSession], events):
+    first_page = ROWS // PAGE_SIZE - PAGES + 1
+
+    async with session_factory() as session:
+        # Start the cursor walk where the offset walk starts
+        start_row = await session.scalar(
+            select(Event)
+            .where(Event.category == CATEGORY)
+            .order_by(Event.created_at.desc(), Event.event_id.desc())
+            .offset((first_page - 1) * PAGE_SIZE - 1)
+            .limit(1)
+        )
+        params = BasicQueryParams(page_size=PAGE_SIZE, pagination="cursor")
+        cursor = encode_cursor(params, start_row.created_at, start_row.event_id)
+
+        start = time.perf_counter()
+        offset_ids = []
+        for page in range(first_page, first_page + PAGES):
+            params = BasicQueryParams(page_size=PAGE_SIZE, page=page, count="estimated")
+            offset_ids += [e["event_id"] for e in (await list_page(session, params))["data"]]
+        offset_seconds = (time.perf_counter() - start) / PAGES
+
+        start = time.perf_counter()
+        cursor_ids = []
+        while cursor is not None:
+            params = BasicQueryParams(page_size=PAGE_SIZE, cursor=cursor)
+            body = await list_page(session, params)
+            cursor_ids += [e["event_id"] for e in body["data"]]
+            cursor = body["next_cursor"]
+        cursor_seconds = (time.perf_counter() - start) / PAGES
+
+        start = time.perf_counter()
+        exact = (await list_page(session, BasicQueryParams(page_size=1)))["total_count"]
+        exact_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        params = BasicQueryParams(page_size=1, count="estimated")
+        estimated = (await list_page(session, params))["total_count"]
+        estimated_seconds = time.perf_counter() - start
+
+    print(
+        f"\nlast {PAGES} pages of {ROWS} rows, ms/page: offset {offset_seconds * 1000:.1f}, "
+        f"cursor {cursor_seconds * 1000:.1f}"
+        f"\ncount ms: exact {exact_seconds * 1000:.1f} ({exact}), "
+        f"estimated {estimated_seconds * 1000:.1f} ({estimated})"
+    )
+    assert cursor_ids == offset_ids
+    assert len(cursor_ids) == PAGES * PAGE_SIZE
+    assert exact == ROWS
+    assert abs(estimated - ROWS) < ROWS * 0.1
+    assert cursor_seconds * 10 < offset_seconds
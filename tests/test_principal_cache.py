@@ -0,0 +1,186 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from src.auth.dependencies import get_current_active_user, get_current_user, get_token_verifier
+from src.auth.service import PrincipalCache, create_access_token, update_user_access
+from src.cache import (
+    INVALIDATION_CHANNEL,
+    local_caches,
+    register_local_cache,
+    run_cache_invalidation_listener,
+)
+from src.constants import Role
+from src.models import User
+
+REQUESTS = 1000
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def token(session_factory: async_sessionmaker[AsyncSession]):
+    async with session_factory() as session:
+        await session.merge(
+            User(user_id=1001, account="test_user", password="1234", role=Role.USER.value)
+        )
+        await session.commit()
+
+    return await create_access_token(data={"sub": "test_user"})
+
+
+@pytest.fixture
+def statements(db_engine: AsyncEngine):
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", count_statement)
+    yield statements
+    event.remove(db_engine.sync_engine, "before_cursor_execute", count_statement)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cached_principal_skips_database(
+    session_factory: async_sessionmaker[AsyncSession],
+    token: str,
+    redis_client: FakeAsyncRedis,
+    statements: list,
+):
+    principal_cache = PrincipalCache(redis_client)
+
+    async with session_factory() as session:
+        for _ in range(REQUESTS):
+            user = await get_current_user(
+                token=token,
+                session=session,
+                principal_cache=principal_cache,
+                token_verifier=get_token_verifier(),
+            )
+            assert user.user_id == 1001
+
+    print(f"\nDB queries for {REQUESTS} authenticated requests: {len(statements)}")
+    assert len(statements) == 1
+    assert principal_cache.get_stats()["local"]["hits"] == REQUESTS - 1
+
+    # Another worker finds the principal in Redis
+    other_worker_cache = PrincipalCache(redis_client)
+
+    async with session_factory() as session:
+        await get_current_user(
+            token=token,
+            session=session,
+            principal_cache=other_worker_cache,
+            token_verifier=get_token_verifier(),
+        )
+
+    assert len(statements) == 1
+    assert other_worker_cache.get_stats()["redis_hits"] == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_disabling_user_invalidates_principal(
+    session_factory: async_sessionmaker[AsyncSession], token: str, redis_client: FakeAsyncRedis
+):
+    principal_cache = PrincipalCache(redis_client)
+
+    async with session_factory() as session:
+        user = await get_current_user(
+            token=token,
+            session=session,
+            principal_cache=principal_cache,
+            token_verifier=get_token_verifier(),
+        )
+        assert user.is_disabled is False
+
+        await update_user_access(
+            session=session, user_id=1001, principal_cache=principal_cache, is_disabled=True
+        )
+
+        user = await get_current_user(
+            token=token,
+            session=session,
+            principal_cache=principal_cache,
+            token_verifier=get_token_verifier(),
+        )
+        assert user.is_disabled is True
+        with pytest.raises(HTTPException) as exc_info:
+            await get_current_active_user(current_user=user)
+        assert exc_info.value.status_code == 403
+
+        await update_user_access(
+            session=session, user_id=1001, principal_cache=principal_cache, role=Role.ADMIN.value
+        )
+
+        user = await get_current_user(
+            token=token,
+            session=session,
+            principal_cache=principal_cache,
+            token_verifier=get_token_verifier(),
+        )
+        assert user.role == Role.ADMIN.value
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_invalidation_is_broadcast_without_redis_storage(redis_client: FakeAsyncRedis):
+    # The default setup: principals only in each worker's L1
+    principal_cache = PrincipalCache(redis_client, store_in_redis=False)
+    await principal_cache.set(User(user_id=1001, account="test_user", role=Role.USER.value))
+    assert await redis_client.keys() == []
+
+    pubsub = redis_client.pubsub()
+    await pubsub.subscribe(INVALIDATION_CHANNEL)
+    await pubsub.get_message(timeout=1)  # The subscribe confirmation
+
+    await principal_cache.invalidate("test_user")
+
+    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1)
+    await pubsub.aclose()
+
+    assert message["data"] == f"{PrincipalCache.namespace} test_user"
+    assert await principal_cache.get("test_user") is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_invalidation_reaches_other_workers(
+    session_factory: async_sessionmaker[AsyncSession], token: str, redis_client: FakeAsyncRedis
+):
+    this_worker_cache = PrincipalCache(redis_client)
+    register_local_cache(PrincipalCache.namespace, this_worker_cache.local)
+    other_worker_cache = PrincipalCache(redis_client)
+    listener = asyncio.create_task(run_cache_invalidation_listener(redis_client))
+    try:
+        await asyncio.sleep(0.1)
+
+        async with session_factory() as session:
+            await get_current_user(
+                token=token,
+                session=session,
+                principal_cache=this_worker_cache,
+                token_verifier=get_token_verifier(),
+            )
+            assert "test_user" in this_worker_cache.local.data
+
+            await update_user_access(
+                session=session, user_id=1001, principal_cache=other_worker_cache, is_disabled=True
+            )
+            await asyncio.sleep(0.1)
+
+            assert "test_user" not in this_worker_cache.local.data
+
+            # The change is committed even though Redis can't be told about it
+            unreachable_cache = PrincipalCache(FakeAsyncRedis(connected=False))
+            user = await update_user_access(
+                session=session,
+                user_id=1001,
+                principal_cache=unreachable_cache,
+                is_disabled=False,
+            )
+            assert user.is_disabled is False
+    finally:
+        listener.cancel()
+        local_caches.pop(PrincipalCache.namespace)
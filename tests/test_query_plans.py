@@ -0,0 +1,87 @@
+import orjson
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.event.service import event_catalogue_query, event_list_query
+from src.models import Event
+from src.schemas import BasicQueryParams
+
+CATALOGUE_INDEXES = {"ix_event_pictures_event_id_picture_order", "ix_event_ticket_types_event_id"}
+
+
+def get_scans(plan: dict) -> set[str]:
+    """Index names and `Seq Scan on <table>` of every node of a plan."""
+    scans = set()
+    if "Index Name" in plan:
+        scans.add(plan["Index Name"])
+    if plan["Node Type"] == "Seq Scan":
+        scans.add(f"Seq Scan on {plan['Relation Name']}")
+    for child in plan.get("Plans", []):
+        scans |= get_scans(child)
+    return scans
+
+
+async def explain(session_factory: async_sessionmaker[AsyncSession], query) -> set[str]:
+    """Scans in the plan of `query`.
+
+    Test tables are too small for the planner to bother with an index, so sequential scans and
+    sorts are priced out: a query no index can answer in order still shows up as a sequential
+    scan or an index that doesn't match.
+    """
+    compiled = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    async with session_factory() as session:
+        await session.execute(text("SET LOCAL enable_seqscan = off"))
+        await session.execute(text("SET LOCAL enable_sort = off"))
+        plan = (await session.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))).scalar()
+        await session.rollback()
+
+    if isinstance(plan, str):
+        plan = orjson.loads(plan)
+    return get_scans(plan[0]["Plan"])
+
+
+@pytest.mark.parametrize(
+    ("params", "category", "index_name"),
+    [
+        (BasicQueryParams(), "concert", "ix_events_category_created_at_event_id"),
+        (
+            BasicQueryParams(pagination="cursor", sort_by="updated_at", order_by="asc"),
+            "concert",
+            "ix_events_category_updated_at_event_id",
+        ),
+        (BasicQueryParams(pagination="cursor"), None, "ix_events_created_at_event_id"),
+        (
+            BasicQueryParams(pagination="cursor", sort_by="updated_at"),
+            None,
+            "ix_events_updated_at_event_id",
+        ),
+    ],
+)
+@pytest.mark.asyncio(loop_scope="session")
+async def test_event_list_uses_indexes(
+    session_factory: async_sessionmaker[AsyncSession],
+    params: BasicQueryParams,
+    category,
+    index_name: str,
+):
+    scans = await explain(session_factory, event_list_query(params, category=category))
+
+    assert index_name in scans
+    assert CATALOGUE_INDEXES <= scans
+    assert not any(scan.startswith("Seq Scan") for scan in scans)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_on_sale_and_detail_queries_use_indexes(
+    session_factory: async_sessionmaker[AsyncSession],
+):
+    on_sale = await explain(
+        session_factory, event_list_query(BasicQueryParams(), category="concert", on_sale=True)
+    )
+    detail = await explain(session_factory, event_catalogue_query().where(Event.event_id == 1))
+
+    for scans in (on_sale, detail):
+        assert CATALOGUE_INDEXES <= scans
+        assert not any(scan.startswith("Seq Scan") for scan in scans)
@@ -0,0 +1,114 @@
+from typing import Annotated
+
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import src.database
+from src.cache import clear_local_cache
+from src.config import settings
+from src.database import READ_PRIMARY_COOKIE, ReplicaPool, get_read_db_session, primary_only
+from src.event.service import EVENT_DETAIL_CACHE_PREFIX
+
+# Nothing listens there
+UNREACHABLE_URL = settings.DATABASE_URL.rsplit("@", 1)[0] + "@127.0.0.1:1/replica"
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def replica_pool(redis_client: FakeAsyncRedis, monkeypatch: pytest.MonkeyPatch):
+    # Two replicas that are really the primary, and one that is down
+    replica_pool = ReplicaPool(
+        [settings.DATABASE_URL, settings.DATABASE_URL, UNREACHABLE_URL], max_lag=10
+    )
+    monkeypatch.setattr(src.database, "replica_pool", replica_pool)
+
+    yield replica_pool
+
+    await replica_pool.dispose()
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def event_id(create_event) -> int:
+    replica_event = await create_event(event_name="test_replica_event", category="test_replica")
+    return replica_event.event_id
+
+
+def count_replica_statements(replica_pool: ReplicaPool) -> list:
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args)
+
+    for replica in replica_pool.engines:
+        event.listen(replica.sync_engine, "before_cursor_execute", count_statement)
+
+    return statements
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_round_robin_skips_unhealthy_replicas(replica_pool: ReplicaPool):
+    await replica_pool.check_health(timeout=1)
+
+    assert replica_pool.healthy == [True, True, False]
+    picked = [replica_pool.get_engine() for _ in range(4)]
+    assert picked == [replica_pool.engines[0], replica_pool.engines[1]] * 2
+
+    replica_pool.healthy = [False, False, False]
+    assert replica_pool.get_engine() is None
+    assert replica_pool.get_stats()["fallbacks_to_primary"] == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_reads_after_own_write_go_to_primary(
+    client: AsyncClient, redis_client: FakeAsyncRedis, replica_pool: ReplicaPool, event_id: int
+):
+    replica_pool.healthy = [True, True, False]
+    statements = count_replica_statements(replica_pool)
+
+    resp = await client.get(f"/v1/events/{event_id}")
+    assert resp.status_code == 200
+    assert len(statements) == 1
+
+    # The write pins this client's reads to the primary for a while
+    resp = await client.patch(f"/v1/events/{event_id}", json={"event_name": "renamed"})
+    assert resp.status_code == 200
+    assert READ_PRIMARY_COOKIE in resp.cookies
+
+    resp = await client.get(f"/v1/events/{event_id}")
+    assert resp.json()["data"]["event_name"] == "renamed"
+    assert len(statements) == 1
+
+    # Another client, or the same one once the window is over, reads from a replica again
+    client.cookies.clear()
+    clear_local_cache(EVENT_DETAIL_CACHE_PREFIX)
+    await redis_client.flushall()
+    resp = await client.get(f"/v1/events/{event_id}")
+    assert resp.json()["data"]["event_name"] == "renamed"
+    assert len(statements) == 2
+
+    # Reads alone don't pin anything
+    assert READ_PRIMARY_COOKIE not in resp.cookies
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_primary_only_route(replica_pool: ReplicaPool):
+    replica_pool.healthy = [True, True, False]
+    route_app = FastAPI()
+
+    @route_app.get("/replica")
+    async def replica_route(session: Annotated[AsyncSession, Depends(get_read_db_session)]):
+        return {"replica": session.bind in replica_pool.engines}
+
+    @route_app.get("/primary", dependencies=[Depends(primary_only)])
+    async def primary_route(session: Annotated[AsyncSession, Depends(get_read_db_session)]):
+        return {"replica": session.bind in replica_pool.engines}
+
+    async with AsyncClient(
+        transport=ASGITransport(app=route_app), base_url="http://test"
+    ) as route_client:
+        assert (await route_client.get("/replica")).json() == {"replica": True}
+        assert (await route_client.get("/primary")).json() == {"replica": False}
@@ -0,0 +1,43 @@
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeConnection
+from httpx import AsyncClient
+
+import src.database
+from src.database import InstrumentedConnectionPool, close_redis_pool
+from src.waiting_room.service import WaitingRoom, create_queue_ticket
+
+EVENT_ID = 999_002
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_redis_connections_are_reused_across_requests(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+):
+    pool = InstrumentedConnectionPool(
+        max_connections=10,
+        connection_class=FakeConnection,
+        server=FakeServer(),
+        decode_responses=True,
+    )
+    monkeypatch.setattr(src.database, "redis_pool", pool)
+
+    ticket_id = await WaitingRoom(await src.database.get_redis_client()).join(EVENT_ID, "user0")
+    queue_ticket = create_queue_ticket("user0", EVENT_ID, ticket_id)
+
+    for _ in range(20):
+        resp = await client.get(
+            f"/v1/events/{EVENT_ID}/waiting-room/status", headers={"X-Queue-Ticket": queue_ticket}
+        )
+        assert resp.status_code == 200
+
+    stats = (await client.get("/health/redis")).json()["pool"]
+
+    assert stats["created"] == 1
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 1
+    assert stats["wait_count"] > 20
+
+    await close_redis_pool()
+
+    assert src.database.redis_pool is None
@@ -0,0 +1,172 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.constants import ReservationStatus
+from src.models import EventTicketType, TicketReservation, User
+from src.reservation.service import release_expired_reservations, reserve_tickets
+
+STOCK = 1000
+ATTEMPTS = 10_000
+CONCURRENCY = 40
+# Buyers of the benchmark: one user's requests queue on its advisory lock, many users' requests
+# contend on the stock row
+USER_IDS = range(2000, 2000 + ATTEMPTS // 10)
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def ticket_type_id(create_event) -> int:
+    event = await create_event(
+        event_name="test_reservation_event",
+        on_sale=True,
+        ticket_types=[EventTicketType(ticket_name="一般票", price=1000, stock=STOCK)],
+    )
+
+    return event.ticket_types[0].ticket_type_id
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def user_ids(session_factory: async_sessionmaker[AsyncSession]):
+    async with session_factory() as session:
+        await session.execute(
+            insert(User),
+            [
+                {"user_id": user_id, "account": f"test_buyer_{user_id}", "password": "1234"}
+                for user_id in USER_IDS
+            ],
+        )
+        await session.commit()
+
+    yield USER_IDS
+
+    # Their reservations go with them
+    async with session_factory() as session:
+        await session.execute(delete(User).where(User.user_id.in_(USER_IDS)))
+        await session.commit()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrent_reservations_never_oversell(
+    session_factory: async_sessionmaker[AsyncSession], ticket_type_id: int, user_ids: range
+):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def attempt(user_id: int) -> bool:
+        async with semaphore, session_factory() as session:
+            try:
+                await reserve_tickets(
+                    session=session, user_id=user_id, ticket_type_id=ticket_type_id, quantity=1
+                )
+                return True
+            except HTTPException as exc:
+                assert exc.status_code == 409
+                return False
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(attempt(user_ids[i % len(user_ids)]) for i in range(ATTEMPTS)))
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{ATTEMPTS} reservation attempts in {elapsed:.2f}s ({ATTEMPTS / elapsed:.0f}/s)")
+
+    async with session_factory() as session:
+        stock = await session.scalar(
+            select(EventTicketType.stock).where(EventTicketType.ticket_type_id == ticket_type_id)
+        )
+        reserved = await session.scalar(
+            select(func.sum(TicketReservation.quantity)).where(
+                TicketReservation.ticket_type_id == ticket_type_id
+            )
+        )
+
+    assert sum(results) == STOCK
+    assert stock == 0
+    assert reserved == STOCK
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrent_reservations_of_one_user_respect_purchase_limit(
+    session_factory: async_sessionmaker[AsyncSession], ticket_type_id: int
+):
+    async with session_factory() as session:
+        await session.execute(
+            update(EventTicketType)
+            .where(EventTicketType.ticket_type_id == ticket_type_id)
+            .values(max_purchase_limit=4)
+        )
+        await session.commit()
+
+    # A double-click, many times over
+    async def attempt() -> bool:
+        async with session_factory() as session:
+            try:
+                await reserve_tickets(
+                    session=session, user_id=1000, ticket_type_id=ticket_type_id, quantity=2
+                )
+                return True
+            except HTTPException as exc:
+                assert exc.detail == "Purchase limit exceeded"
+                return False
+
+    results = await asyncio.gather(*(attempt() for _ in range(CONCURRENCY)))
+
+    async with session_factory() as session:
+        reserved = await session.scalar(
+            select(func.sum(TicketReservation.quantity)).where(
+                TicketReservation.ticket_type_id == ticket_type_id
+            )
+        )
+
+    assert sum(results) == 2
+    assert reserved == 4
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_expired_reservations_are_released(
+    session_factory: async_sessionmaker[AsyncSession], ticket_type_id: int
+):
+    async with session_factory() as session:
+        await session.execute(
+            update(EventTicketType)
+            .where(EventTicketType.ticket_type_id == ticket_type_id)
+            .values(max_purchase_limit=2)
+        )
+        await session.commit()
+
+        await reserve_tickets(
+            session=session, user_id=1000, ticket_type_id=ticket_type_id, quantity=2, ttl_seconds=1
+        )
+
+        with pytest.raises(HTTPException) as exc_info:
+            await reserve_tickets(
+                session=session, user_id=1000, ticket_type_id=ticket_type_id, quantity=1
+            )
+        assert exc_info.value.detail == "Purchase limit exceeded"
+
+        await session.execute(
+            update(TicketReservation)
+            .where(TicketReservation.ticket_type_id == ticket_type_id)
+            .values(expires_at=func.now())
+        )
+        await session.commit()
+
+        assert await release_expired_reservations(session=session) == 2
+
+        statuses = await session.scalars(
+            select(TicketReservation.status).where(
+                TicketReservation.ticket_type_id == ticket_type_id
+            )
+        )
+        assert set(statuses) == {ReservationStatus.RELEASED.value}
+        assert (
+            await session.scalar(
+                select(EventTicketType.stock).where(
+                    EventTicketType.ticket_type_id == ticket_type_id
+                )
+            )
+            == STOCK
+        )
@@ -0,0 +1,172 @@
+import asyncio
+import socket
+import time
+
+import httpx
+import pytest
+import pytest_asyncio
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from httpx import AsyncClient
+
+from src.http_client import create_http_client
+from src.resilience import CLOSED, HALF_OPEN, OPEN, ProviderPolicy, get_provider_policy
+
+stub_app = FastAPI()
+stub_state = {"calls": 0, "fail": False, "delay": 0.0, "slow_every": 0}
+
+
+@stub_app.get("/query")
+async def query():
+    stub_state["calls"] += 1
+    delay = stub_state["delay"]
+    if stub_state["slow_every"] and stub_state["calls"] % stub_state["slow_every"] == 0:
+        delay = 0.3
+    await asyncio.sleep(delay)
+    if stub_state["fail"]:
+        raise HTTPException(status_code=502, detail="Bad gateway")
+    return {"calls": stub_state["calls"]}
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def stub_url():
+    sock = socket.socket()
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(stub_app, log_level="warning"))
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}/query"
+
+    server.should_exit = True
+    await task
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def http_client():
+    http_client = create_http_client(timeout=5, max_connections=20)
+    stub_state.update(calls=0, fail=False, delay=0.0, slow_every=0)
+
+    yield http_client
+
+    await http_client.aclose()
+
+
+def make_policy(**kwargs) -> ProviderPolicy:
+    options = {
+        "name": "stub",
+        "max_in_flight": 20,
+        "max_timeout": 5,
+        "min_timeout": 0.05,
+        "failure_threshold": 3,
+        "reset_timeout": 0.2,
+        "min_samples": 10,
+    }
+    return ProviderPolicy(**{**options, **kwargs})
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_circuit_breaker(stub_url: str, http_client: httpx.AsyncClient):
+    policy = make_policy()
+    stub_state["fail"] = True
+
+    for _ in range(3):
+        with pytest.raises(httpx.HTTPStatusError):
+            await policy.request(http_client, "GET", stub_url)
+    assert policy.breaker.get_state() == OPEN
+
+    # Open: rejected without calling the provider
+    calls = stub_state["calls"]
+    with pytest.raises(HTTPException) as exc_info:
+        await policy.request(http_client, "GET", stub_url)
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == "1"
+    assert stub_state["calls"] == calls
+
+    # Half-open: one failed trial opens it again, one successful trial closes it
+    await asyncio.sleep(0.2)
+    assert policy.breaker.get_state() == HALF_OPEN
+    with pytest.raises(httpx.HTTPStatusError):
+        await policy.request(http_client, "GET", stub_url)
+    assert policy.breaker.get_state() == OPEN
+
+    stub_state["fail"] = False
+    await asyncio.sleep(0.2)
+    await policy.request(http_client, "GET", stub_url)
+    assert policy.breaker.get_state() == CLOSED
+    assert policy.get_stats()["opened"] == 2
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_bulkhead(stub_url: str, http_client: httpx.AsyncClient):
+    policy = make_policy(max_in_flight=2)
+    stub_state["delay"] = 0.1
+
+    results = await asyncio.gather(
+        *(policy.request(http_client, "GET", stub_url) for _ in range(5)), return_exceptions=True
+    )
+    stub_state["delay"] = 0.0
+
+    assert sum(isinstance(result, httpx.Response) for result in results) == 2
+    assert sum(isinstance(result, HTTPException) for result in results) == 3
+    assert policy.breaker.get_state() == CLOSED
+    assert policy.get_stats()["rejected"] == 3
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_adaptive_timeout(stub_url: str, http_client: httpx.AsyncClient):
+    fixed = make_policy(min_samples=1000)
+    adaptive = make_policy()
+    for _ in range(10):
+        await adaptive.request(http_client, "GET", stub_url)
+    assert adaptive.get_timeout() == 0.05
+
+    # Provider stalls: the adaptive timeout gives up after 50 ms instead of the full 5 s
+    stub_state["delay"] = 1.0
+    timings = {}
+    for name, policy in (("fixed", fixed), ("adaptive", adaptive)):
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            async with asyncio.timeout(0.8 if name == "fixed" else None):
+                await policy.request(http_client, "GET", stub_url)
+        timings[name] = time.perf_counter() - start
+    stub_state["delay"] = 0.0
+
+    print(
+        f"\nstalled call seconds: fixed {timings['fixed']:.3f}, adaptive {timings['adaptive']:.3f}"
+    )
+    assert timings["adaptive"] < 0.2
+    assert adaptive.get_stats()["timeouts"] == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_hedging_cuts_tail_latency(stub_url: str, http_client: httpx.AsyncClient):
+    # 1 in 25 calls is slow, under the 5% the hedge percentile leaves out
+    stub_state["slow_every"] = 25
+    worst = {}
+    for hedge in (False, True):
+        policy = make_policy(min_timeout=1)
+        latencies = []
+        for _ in range(100):
+            start = time.perf_counter()
+            await policy.request(http_client, "GET", stub_url, hedge=hedge)
+            latencies.append(time.perf_counter() - start)
+        worst[hedge] = max(latencies[50:])
+    stub_state["slow_every"] = 0
+
+    print(f"\nworst latency seconds: unhedged {worst[False]:.3f}, hedged {worst[True]:.3f}")
+    assert worst[False] >= 0.3
+    assert worst[True] < 0.2
+    assert policy.get_stats()["hedges"] >= 2
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_provider_stats(client: AsyncClient):
+    get_provider_policy("amego")
+
+    resp = await client.get("/health/providers")
+
+    assert resp.status_code == 200
+    assert resp.json()["providers"]["amego"]["state"] == CLOSED
@@ -0,0 +1,127 @@
+import statistics
+import time
+
+import orjson
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from src.event.schemas import Event
+from src.schemas import PaginatedDataResponse
+
+REQUESTS = 300
+PAGE_SIZE = 100
+
+
+def make_page() -> dict:
+    """A full catalogue page as `query_event_list` returns it."""
+    return {
+        "total_count": 10000,
+        "total_pages": 10000 // PAGE_SIZE,
+        "current_page": 1,
+        "data": [
+            {
+                "event_id": i,
+                "event_name": f"2030 跨年演唱會 {i}",
+                "description": "An evening of live music with guests from all over the island " * 5,
+                "event_date": "2030-12-31",
+                "event_time": "19:30:00",
+                "sale_time": "2030-11-01T12:00:00",
+                "sale_end_time": None,
+                "location": "Taipei Arena",
+                "address": "No. 2, Section 4, Nanjing East Road, Songshan District, Taipei",
+                "organizer": "B'in Music",
+                "category": "concert",
+                "on_sale": True,
+                "pictures": [
+                    {
+                        "picture_id": i * 10 + j,
+                        "picture_url": f"https://example.com/{i}/{j}.jpg",
+                        "picture_order": j,
+                    }
+                    for j in range(3)
+                ],
+                "ticket_types": [
+                    {
+                        "ticket_type_id": i * 10 + j,
+                        "ticket_name": name,
+                        "price": price,
+                        "max_purchase_limit": 4,
+                    }
+                    for j, (name, price) in enumerate(
+                        (("VIP", 5000.0), ("一般票", 2800.0), ("身障票", 1400.0))
+                    )
+                ],
+            }
+            for i in range(PAGE_SIZE)
+        ],
+    }
+
+
+def create_app(response_class: type[Response]) -> FastAPI:
+    page = make_page()
+    body = orjson.dumps(page)
+    bench_app = FastAPI(default_response_class=response_class)
+
+    @bench_app.get("/validated", response_model=PaginatedDataResponse[Event])
+    async def validated():
+        return page
+
+    @bench_app.get("/cached", response_model=PaginatedDataResponse[Event])
+    async def cached():
+        return Response(content=body, media_type="application/json")
+
+    return bench_app
+
+
+async def benchmark(asgi_app, path: str) -> tuple[float, float, bytes]:
+    """(requests/sec, p99 seconds, body) of sequential GETs on `path`, straight through ASGI."""
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message["body"])
+
+    latencies = []
+    for _ in range(REQUESTS):
+        body.clear()
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "root_path": "",
+            "query_string": b"",
+            "headers": [],
+        }
+        start = time.perf_counter()
+        await asgi_app(scope, receive, send)
+        latencies.append(time.perf_counter() - start)
+
+    return (
+        len(latencies) / sum(latencies),
+        statistics.quantiles(latencies, n=100)[98],
+        b"".join(body),
+    )
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_large_page_benchmark():
+    json_app = create_app(JSONResponse)
+    orjson_app = create_app(ORJSONResponse)
+
+    json_rate, json_p99, json_body = await benchmark(json_app, "/validated")
+    orjson_rate, orjson_p99, orjson_body = await benchmark(orjson_app, "/validated")
+    cached_rate, cached_p99, cached_body = await benchmark(orjson_app, "/cached")
+
+    print(
+        f"\n{PAGE_SIZE} events ({len(cached_body)} bytes) pages/sec, p99 ms:"
+        f"\n  validated, JSONResponse   {json_rate:.0f}, {json_p99 * 1000:.2f}"
+        f"\n  validated, ORJSONResponse {orjson_rate:.0f}, {orjson_p99 * 1000:.2f}"
+        f"\n  cached bytes              {cached_rate:.0f}, {cached_p99 * 1000:.2f}"
+    )
+    assert orjson.loads(json_body) == orjson.loads(orjson_body) == orjson.loads(cached_body)
+    assert orjson_rate > json_rate
+    assert cached_rate > orjson_rate * 5
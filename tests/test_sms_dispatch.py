@@ -0,0 +1,244 @@
+import asyncio
+import socket
+import time
+from collections import Counter
+
+import pytest
+import pytest_asyncio
+import uvicorn
+from fakeredis import FakeAsyncRedis
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.config import settings
+from src.constants import SmsStatus
+from src.http_client import create_http_client
+from src.mitake_sms.service import SMS_POINTS_KEY, MitakeSMS, dispatch_sms, enqueue_sms
+from src.models import SmsMessage
+from src.rate_limiter import RedisRateLimiter
+
+MESSAGES = 2000
+SINGLE_MESSAGES = 100
+MITAKE_LATENCY_SECONDS = 0.02
+CAMPAIGN = "test_sms"
+INVALID_PHONE = "0900000000"
+
+fake_mitake = FastAPI()
+calls: Counter[str] = Counter()
+received: Counter[str] = Counter()
+bulk_sizes: list[int] = []
+mitake_state = {"points": 100_000, "down": False}
+
+
+@fake_mitake.post("/send")
+async def send():
+    calls["send"] += 1
+    await asyncio.sleep(MITAKE_LATENCY_SECONDS)
+    mitake_state["points"] -= 1
+    return PlainTextResponse(f"[1]\nmsgid=1\nstatuscode=1\nAccountPoint={mitake_state['points']}")
+
+
+@fake_mitake.post("/bulk")
+async def bulk(request: Request):
+    calls["bulk"] += 1
+    await asyncio.sleep(MITAKE_LATENCY_SECONDS)
+    if mitake_state["down"]:
+        return PlainTextResponse("Service Unavailable", status_code=503)
+
+    lines = (await request.body()).decode("utf-8").split("\r\n")
+    bulk_sizes.append(len(lines))
+    blocks = []
+    for line in lines:
+        client_id, phone, *_ = line.split("$$")
+        received[phone] += 1
+        if phone == INVALID_PHONE:
+            blocks.append(f"[{client_id}]\nstatuscode=k")
+        else:
+            mitake_state["points"] -= 1
+            blocks.append(
+                f"[{client_id}]\nmsgid=M{client_id}\nstatuscode=1\n"
+                f"AccountPoint={mitake_state['points']}"
+            )
+    return PlainTextResponse("\r\n".join(blocks))
+
+
+@fake_mitake.post("/points")
+async def points():
+    calls["points"] += 1
+    return PlainTextResponse(f"AccountPoint={mitake_state['points']}")
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def mitake_sms():
+    sock = socket.socket()
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(fake_mitake, log_level="warning"))
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+    http_client = create_http_client(timeout=5, max_connections=10)
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    yield MitakeSMS(
+        api_url=f"{url}/send",
+        check_point_url=f"{url}/points",
+        username="user",
+        password="password",
+        http_client=http_client,
+        bulk_api_url=f"{url}/bulk",
+    )
+
+    await http_client.aclose()
+    server.should_exit = True
+    await task
+
+
+@pytest_asyncio.fixture(loop_scope="session", autouse=True)
+async def clean_messages(session_factory: async_sessionmaker[AsyncSession]):
+    yield
+
+    async with session_factory() as session:
+        await session.execute(delete(SmsMessage).where(SmsMessage.campaign.startswith(CAMPAIGN)))
+        await session.commit()
+    calls.clear()
+    received.clear()
+    bulk_sizes.clear()
+    mitake_state.update(points=100_000, down=False)
+
+
+async def enqueue(
+    session_factory: async_sessionmaker[AsyncSession], campaign: str, phones: list[str]
+) -> int:
+    async with session_factory() as session:
+        queued = await enqueue_sms(session, campaign, phones, "活動提醒\n記得準時入場")
+        await session.commit()
+    return queued
+
+
+async def get_messages(
+    session_factory: async_sessionmaker[AsyncSession], campaign: str
+) -> dict[str, SmsMessage]:
+    async with session_factory() as session:
+        messages = await session.scalars(select(SmsMessage).where(SmsMessage.campaign == campaign))
+        return {message.phone: message for message in messages}
+
+
+async def drain(
+    session_factory: async_sessionmaker[AsyncSession],
+    mitake_sms: MitakeSMS,
+    redis_client: FakeAsyncRedis,
+    rate_limiter=None,
+):
+    rate_limiter = rate_limiter or RedisRateLimiter(
+        redis_client, key=f"test_{time.monotonic()}", rate=1_000_000, burst=500
+    )
+    async with session_factory() as session:
+        while await dispatch_sms(
+            session=session,
+            mitake_sms=mitake_sms,
+            redis_client=redis_client,
+            rate_limiter=rate_limiter,
+        ):
+            pass
+
+
+def make_phones(count: int) -> list[str]:
+    return [f"09{i:08d}" for i in range(1, count + 1)]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_enqueue_deduplicates_recipients(session_factory: async_sessionmaker[AsyncSession]):
+    phones = ["0912-345-678", "+886 912 345 678", "0912345678", "0987654321"]
+
+    assert await enqueue(session_factory, CAMPAIGN, phones) == 2
+    assert await enqueue(session_factory, CAMPAIGN, ["0912345678", "0911111111"]) == 1
+    assert await enqueue(session_factory, f"{CAMPAIGN}_other", ["0912345678"]) == 1
+
+    assert sorted(await get_messages(session_factory, CAMPAIGN)) == [
+        "0911111111",
+        "0912345678",
+        "0987654321",
+    ]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_bulk_dispatch_throughput(
+    session_factory: async_sessionmaker[AsyncSession],
+    mitake_sms: MitakeSMS,
+    redis_client: FakeAsyncRedis,
+):
+    start = time.perf_counter()
+    for phone in make_phones(SINGLE_MESSAGES):
+        await mitake_sms.send_sms_code(phone=phone, sms_message="活動提醒")
+    single_rate = SINGLE_MESSAGES / (time.perf_counter() - start)
+
+    await enqueue(session_factory, CAMPAIGN, [*make_phones(MESSAGES), INVALID_PHONE])
+
+    start = time.perf_counter()
+    await drain(session_factory, mitake_sms, redis_client)
+    bulk_rate = MESSAGES / (time.perf_counter() - start)
+
+    messages = await get_messages(session_factory, CAMPAIGN)
+    assert messages.pop(INVALID_PHONE).status == SmsStatus.FAILED.value
+    assert all(m.status == SmsStatus.SENT.value for m in messages.values())
+    assert all(m.provider_msgid == f"M{m.message_id}" for m in messages.values())
+    assert all(count == 1 for phone, count in received.items())
+    assert max(bulk_sizes) == settings.MITAKE_SMS_BULK_SIZE
+    assert calls["points"] == 1
+    assert int(await redis_client.get(SMS_POINTS_KEY)) == mitake_state["points"]
+
+    print(f"\nSMS/sec: one per call {single_rate:.0f}, bulk {bulk_rate:.0f}")
+    assert bulk_rate > single_rate * 10
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_rate_limit_is_shared(redis_client: FakeAsyncRedis):
+    limiters = [
+        RedisRateLimiter(redis_client, key="test_shared", rate=1000, burst=100) for _ in range(2)
+    ]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limiter.acquire(100) for limiter in limiters for _ in range(3)))
+    elapsed = time.perf_counter() - start
+
+    # 600 tokens, 100 up front and 500 refilled at 1000/s
+    assert elapsed >= 0.45
+    with pytest.raises(ValueError):
+        await limiters[0].acquire(101)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_retry_and_out_of_points(
+    session_factory: async_sessionmaker[AsyncSession],
+    mitake_sms: MitakeSMS,
+    redis_client: FakeAsyncRedis,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "MITAKE_SMS_RETRY_BASE_SECONDS", 0)
+    await redis_client.delete(SMS_POINTS_KEY)
+    await enqueue(session_factory, CAMPAIGN, make_phones(10))
+
+    # Provider down: everything goes back to pending
+    mitake_state["down"] = True
+    async with session_factory() as session:
+        await dispatch_sms(
+            session=session,
+            mitake_sms=mitake_sms,
+            redis_client=redis_client,
+            rate_limiter=RedisRateLimiter(redis_client, key="test_retry", rate=1000, burst=500),
+        )
+    messages = await get_messages(session_factory, CAMPAIGN)
+    assert all(m.status == SmsStatus.PENDING.value for m in messages.values())
+    assert all("503" in m.last_error for m in messages.values())
+
+    # Back up, but with only 4 points left: only what the balance pays for is sent
+    mitake_state.update(down=False, points=4)
+    await redis_client.delete(SMS_POINTS_KEY)
+    await drain(session_factory, mitake_sms, redis_client)
+
+    statuses = Counter(m.status for m in (await get_messages(session_factory, CAMPAIGN)).values())
+    assert statuses == {SmsStatus.SENT.value: 4, SmsStatus.PENDING.value: 6}
+    assert int(await redis_client.get(SMS_POINTS_KEY)) == 0
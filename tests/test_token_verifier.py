@@ -0,0 +1,127 @@
+import time
+from datetime import UTC, datetime, timedelta
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import ExpiredSignatureError, JWTError, jwt
+
+from src.auth.token import JoseBackend, JWKSKeySet, TokenVerifier
+from src.config import settings
+
+ITERATIONS = 2000
+
+
+def create_rsa_key() -> str:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+
+
+def create_claims(minutes: int = 30) -> dict:
+    return {"sub": "test_user", "exp": datetime.now(UTC) + timedelta(minutes=minutes)}
+
+
+def measure_us_per_op(func) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func()
+    return (time.perf_counter() - start) / ITERATIONS * 1_000_000
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_memoized_verification_benchmark():
+    backend = JoseBackend()
+    verifier = TokenVerifier(
+        backend=backend,
+        algorithm=settings.ALGORITHM,
+        key=backend.prepare_key(settings.SECRET_KEY, settings.ALGORITHM),
+    )
+    token = jwt.encode(create_claims(), settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+    uncached_us = measure_us_per_op(
+        lambda: jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    )
+
+    assert (await verifier.verify(token))["sub"] == "test_user"
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        await verifier.verify(token)
+    cached_us = (time.perf_counter() - start) / ITERATIONS * 1_000_000
+
+    print(f"\nverify us/op: jose.jwt.decode {uncached_us:.1f}, memoized {cached_us:.1f}")
+    assert cached_us < uncached_us
+    assert verifier.get_stats()["hits"] == ITERATIONS
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_rejected_tokens_are_not_memoized():
+    backend = JoseBackend()
+    verifier = TokenVerifier(backend=backend, algorithm=settings.ALGORITHM, key=settings.SECRET_KEY)
+
+    expired = jwt.encode(create_claims(-1), settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    forged = jwt.encode(create_claims(), "not the secret", algorithm=settings.ALGORITHM)
+
+    for _ in range(2):
+        with pytest.raises(ExpiredSignatureError):
+            await verifier.verify(expired)
+        with pytest.raises(JWTError):
+            await verifier.verify(forged)
+
+    assert verifier.get_stats()["size"] == 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_asymmetric_keys_from_cached_jwks():
+    backend = JoseBackend()
+    private_keys = {"key-1": create_rsa_key(), "key-2": create_rsa_key()}
+    published = ["key-1"]
+
+    def serve_jwks(request: httpx.Request) -> httpx.Response:
+        keys = []
+        for kid in published:
+            key_data = backend.prepare_key(private_keys[kid], "RS256").public_key().to_dict()
+            keys.append({**key_data, "kid": kid, "use": "sig"})
+        return httpx.Response(200, json={"keys": keys})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(serve_jwks)) as http_client:
+        key_set = JWKSKeySet(
+            url="https://auth.example.com/.well-known/jwks.json",
+            backend=backend,
+            min_refresh_seconds=0,
+            http_client=http_client,
+        )
+        verifier = TokenVerifier(backend=backend, algorithm="RS256", key_set=key_set)
+
+        for _ in range(50):
+            token = jwt.encode(
+                {**create_claims(), "jti": str(_)},
+                private_keys["key-1"],
+                algorithm="RS256",
+                headers={"kid": "key-1"},
+            )
+            assert (await verifier.verify(token))["sub"] == "test_user"
+
+        assert key_set.fetch_count == 1
+
+        # Key rotation: an unknown kid refetches the set once
+        published.append("key-2")
+        token = jwt.encode(
+            create_claims(), private_keys["key-2"], algorithm="RS256", headers={"kid": "key-2"}
+        )
+        assert (await verifier.verify(token))["sub"] == "test_user"
+        assert key_set.fetch_count == 2
+
+        with pytest.raises(JWTError):
+            await verifier.verify(
+                jwt.encode(
+                    create_claims(),
+                    private_keys["key-1"],
+                    algorithm="RS256",
+                    headers={"kid": "key-3"},
+                )
+            )
@@ -0,0 +1,192 @@
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from fakeredis import FakeAsyncRedis
+from fastapi import HTTPException
+from httpx import AsyncClient
+from sqlalchemy import event
+
+from src.auth.dependencies import get_current_user, get_token_verifier
+from src.auth.service import PrincipalCache, create_access_token
+from src.config import settings
+from src.database import engine
+from src.main import app
+from src.waiting_room.dependencies import get_waiting_room
+from src.waiting_room.service import (
+    ACTIVE_EVENTS_KEY,
+    WaitingRoom,
+    create_queue_ticket,
+    verify_queue_ticket,
+)
+
+EVENT_ID = 999_001
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_admission_follows_token_bucket(redis_client: FakeAsyncRedis):
+    waiting_room = WaitingRoom(redis_client)
+
+    ticket_ids = [await waiting_room.join(EVENT_ID, f"user{i}@example.com") for i in range(10)]
+
+    assert await waiting_room.join(EVENT_ID, "user3@example.com") == ticket_ids[3]
+    assert await waiting_room.get_status(EVENT_ID, ticket_ids[9]) == (False, 10)
+
+    await waiting_room.set_rate(EVENT_ID, rate=0.001, burst=3)
+
+    assert await waiting_room.admit_all() == 3
+    assert await waiting_room.admit_all() == 0
+    admitted = [await waiting_room.is_admitted(EVENT_ID, ticket_id) for ticket_id in ticket_ids]
+    assert admitted == [True] * 3 + [False] * 7
+
+    # All state is in Redis, so a restarted app picks the queue up where it was
+    restarted_waiting_room = WaitingRoom(redis_client)
+
+    assert await restarted_waiting_room.get_status(EVENT_ID, ticket_ids[3]) == (False, 1)
+    assert await restarted_waiting_room.get_rate(EVENT_ID) == (0.001, 3)
+
+    await restarted_waiting_room.close(EVENT_ID)
+
+    assert await restarted_waiting_room.get_status(EVENT_ID, ticket_ids[0]) == (False, None)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_only_events_on_sale_have_a_waiting_room(
+    client: AsyncClient, redis_client: FakeAsyncRedis, create_event
+):
+    waiting_room = WaitingRoom(redis_client)
+    app.dependency_overrides[get_waiting_room] = lambda: waiting_room
+    try:
+        event_id = (await create_event(event_name="test_waiting_room_event")).event_id
+
+        # Made up, or not on sale
+        assert (await client.post(f"/v1/events/{EVENT_ID}/waiting-room")).status_code == 404
+        assert (await client.post(f"/v1/events/{event_id}/waiting-room")).status_code == 404
+        assert await redis_client.zcard(ACTIVE_EVENTS_KEY) == 0
+
+        resp = await client.patch(f"/v1/events/{event_id}", json={"on_sale": True})
+        assert resp.status_code == 200
+        assert (await client.post(f"/v1/events/{event_id}/waiting-room")).status_code == 200
+        assert await redis_client.zcard(ACTIVE_EVENTS_KEY) == 1
+
+        # The admitter drops an event once its queue has drained, a join brings it back
+        await waiting_room.admit_all()
+        assert await redis_client.zcard(ACTIVE_EVENTS_KEY) == 0
+
+        joined = await client.post(f"/v1/events/{event_id}/waiting-room")
+        assert joined.json()["admitted"] is True
+        ticket_id = verify_queue_ticket(joined.json()["queue_ticket"])["tid"]
+        await waiting_room.join(event_id, "user1@example.com")
+        assert await redis_client.zcard(ACTIVE_EVENTS_KEY) == 1
+
+        # Closing the sale closes the waiting room
+        resp = await client.patch(f"/v1/events/{event_id}", json={"on_sale": False})
+        assert resp.status_code == 200
+        assert await redis_client.zcard(ACTIVE_EVENTS_KEY) == 0
+        assert await waiting_room.get_status(event_id, ticket_id) == (False, None)
+    finally:
+        app.dependency_overrides.pop(get_waiting_room)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_status_polling_skips_database(client: AsyncClient, redis_client: FakeAsyncRedis):
+    waiting_room = WaitingRoom(redis_client)
+    app.dependency_overrides[get_waiting_room] = lambda: waiting_room
+
+    ticket_id = await waiting_room.join(EVENT_ID, "user0@example.com")
+    queue_ticket = create_queue_ticket("user0@example.com", EVENT_ID, ticket_id)
+
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        resp = await client.get(
+            f"/v1/events/{EVENT_ID}/waiting-room/status", headers={"X-Queue-Ticket": queue_ticket}
+        )
+        forged = await client.get(
+            f"/v1/events/{EVENT_ID}/waiting-room/status", headers={"X-Queue-Ticket": "forged"}
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+        app.dependency_overrides.pop(get_waiting_room)
+        await waiting_room.close(EVENT_ID)
+
+    assert resp.status_code == 200
+    assert resp.json()["position"] == 1
+    assert forged.status_code == 403
+    assert statements == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_queue_tickets_and_access_tokens_are_not_interchangeable(
+    client: AsyncClient, redis_client: FakeAsyncRedis, monkeypatch: pytest.MonkeyPatch
+):
+    waiting_room = WaitingRoom(redis_client)
+    ticket_id = await waiting_room.join(EVENT_ID, "test_admin_override")
+    queue_ticket = create_queue_ticket("test_admin_override", EVENT_ID, ticket_id)
+    access_token = await create_access_token(data={"sub": "test_admin_override"})
+
+    # A queue ticket is not a bearer token, rejected before any lookup
+    with pytest.raises(HTTPException) as exc_info:
+        await get_current_user(
+            token=queue_ticket,
+            session=None,
+            principal_cache=PrincipalCache(None),
+            token_verifier=get_token_verifier(),
+        )
+    assert exc_info.value.status_code == 401
+
+    # And an access token is not a queue ticket
+    monkeypatch.setattr(settings, "WAITING_ROOM_ENABLED", True)
+    app.dependency_overrides[get_waiting_room] = lambda: waiting_room
+    try:
+        reservation = await client.post(
+            "/v1/reservations",
+            json={"ticket_type_id": 1, "quantity": 1},
+            headers={"X-Queue-Ticket": access_token},
+        )
+        status = await client.get(
+            f"/v1/events/{EVENT_ID}/waiting-room/status",
+            headers={"X-Queue-Ticket": access_token},
+        )
+    finally:
+        app.dependency_overrides.pop(get_waiting_room)
+        await waiting_room.close(EVENT_ID)
+
+    assert reservation.status_code == 403
+    assert status.status_code == 403
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_queue_tickets_with_asymmetric_access_tokens(
+    client: AsyncClient,
+    redis_client: FakeAsyncRedis,
+    create_event,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    event_id = (await create_event(event_name="test_waiting_room_event", on_sale=True)).event_id
+    # Access tokens on ES256, queue tickets keep their own HMAC key
+    private_key = ec.generate_private_key(ec.SECP256R1()).private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    monkeypatch.setattr(settings, "ALGORITHM", "ES256")
+    monkeypatch.setattr(settings, "JWT_PRIVATE_KEY", private_key.decode())
+    waiting_room = WaitingRoom(redis_client)
+    app.dependency_overrides[get_waiting_room] = lambda: waiting_room
+    try:
+        joined = await client.post(f"/v1/events/{event_id}/waiting-room")
+        resp = await client.get(
+            f"/v1/events/{event_id}/waiting-room/status",
+            headers={"X-Queue-Ticket": joined.json()["queue_ticket"]},
+        )
+    finally:
+        app.dependency_overrides.pop(get_waiting_room)
+        await waiting_room.close(event_id)
+
+    assert joined.status_code == 200
+    assert resp.status_code == 200
+    assert resp.json()["position"] == 1